@@ -0,0 +1,100 @@
+"""Bench commands."""
+import json
+
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.command("whatsapp-replay-webhooks")
+@click.option("--source", type=click.Choice(["synthetic", "stored"]), default="synthetic",
+    help="Replay logged webhook payloads or generate synthetic ones")
+@click.option("--count", type=int, default=1000, help="Number of payloads to send")
+@click.option("--kinds", default=None,
+    help="Comma separated synthetic payload kinds, e.g. text,button,delivered,read")
+@click.option("--rate", type=float, default=None, help="Target payloads per second (default: unpaced)")
+@click.option("--concurrency", type=int, default=1, help="Number of concurrent workers")
+@click.option("--rollback", is_flag=True, default=False, help="Roll back every payload instead of committing")
+@click.option("--cleanup", is_flag=True, default=False, help="Delete rows created by synthetic payloads afterwards")
+@click.option("--json", "as_json", is_flag=True, default=False, help="Print the report as JSON")
+@pass_context
+def replay_webhooks(context, source, count, kinds, rate, concurrency, rollback, cleanup, as_json):
+    """Replay WhatsApp webhook payloads against the local site and report ingest performance."""
+    from frappe_whatsapp.utils import webhook_benchmark
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        if source == "stored":
+            payloads = webhook_benchmark.load_stored_payloads(limit=count)
+        else:
+            kind_list = [k.strip() for k in kinds.split(",")] if kinds else None
+            payloads = webhook_benchmark.build_synthetic_payloads(count, kind_list)
+
+        if not payloads:
+            click.echo("No payloads to replay")
+            return
+
+        report = webhook_benchmark.run_benchmark(
+            site, payloads, rate=rate, concurrency=concurrency, rollback=rollback
+        )
+        if cleanup:
+            webhook_benchmark.cleanup()
+
+        if as_json:
+            click.echo(json.dumps(report, indent=2))
+        else:
+            click.echo(webhook_benchmark.format_report(report))
+    finally:
+        frappe.destroy()
+
+
+@click.command("whatsapp-graph-simulator")
+@click.option("--host", default="127.0.0.1", help="Interface to listen on")
+@click.option("--port", type=int, default=8765, help="Port to listen on")
+@click.option("--latency", type=float, default=0.0, help="Seconds added to every response")
+@click.option("--jitter", type=float, default=0.0, help="Random +/- seconds around the latency")
+@click.option("--error-rate", type=float, default=0.0, help="Fraction of requests failed with a 500")
+@click.option("--throttle-rate", type=float, default=0.0, help="Fraction of requests throttled with a 429")
+@click.option("--rate-limit", type=int, default=0, help="Messages per second allowed per phone_id before 429s")
+@click.option("--status-delay", type=float, default=1.0, help="Seconds between the sent, delivered and read webhooks")
+@click.option("--no-webhooks", is_flag=True, default=False, help="Do not post status webhooks to the site")
+@click.option("--templates", type=int, default=0, help="Number of approved templates to serve")
+@click.option("--seed", type=int, default=None, help="Random seed for reproducible error injection")
+@pass_context
+def graph_simulator(context, host, port, latency, jitter, error_rate, throttle_rate, rate_limit,
+        status_delay, no_webhooks, templates, seed):
+    """Run a local WhatsApp Graph API stand-in that posts status webhooks back to the site."""
+    from frappe_whatsapp.utils import graph_simulator
+
+    webhook_url = None
+    if not no_webhooks:
+        site = get_site(context)
+        frappe.init(site=site)
+        frappe.connect()
+        try:
+            webhook_url = frappe.utils.get_url("/api/method/frappe_whatsapp.utils.webhook.webhook")
+        finally:
+            frappe.destroy()
+
+    click.echo(f"Set the URL in WhatsApp Settings to http://{host}:{port} to send through the simulator")
+    if webhook_url:
+        click.echo(f"Posting status webhooks to {webhook_url}")
+
+    graph_simulator.serve(
+        host,
+        port,
+        latency=latency,
+        jitter=jitter,
+        error_rate=error_rate,
+        throttle_rate=throttle_rate,
+        rate_limit=rate_limit,
+        webhook_url=webhook_url,
+        status_delay=status_delay,
+        templates=templates,
+        seed=seed,
+    )
+
+
+commands = [replay_webhooks, graph_simulator]
@@ -53,6 +53,38 @@ frappe.ui.form.on('Bulk WhatsApp Message', {
                     }
                 });
             }).addClass('btn-danger');
+
+            let control = function(method, confirm_message) {
+                frappe.confirm(confirm_message, function() {
+                    frappe.call({
+                        method: 'frappe_whatsapp.utils.bulk_messaging.' + method,
+                        args: {
+                            name: frm.doc.name
+                        },
+                        callback: function() {
+                            frm.reload_doc();
+                        }
+                    });
+                });
+            };
+
+            if(['Scheduled', 'Queued', 'In Progress'].includes(frm.doc.status)) {
+                frm.add_custom_button(__('Pause'), function() {
+                    control('pause_campaign', __('Pause sending this campaign?'));
+                }, __('Campaign'));
+            }
+
+            if(frm.doc.status === 'Paused') {
+                frm.add_custom_button(__('Resume'), function() {
+                    control('resume_campaign', __('Resume sending from where it stopped?'));
+                }, __('Campaign'));
+            }
+
+            if(['Scheduled', 'Queued', 'In Progress', 'Paused'].includes(frm.doc.status)) {
+                frm.add_custom_button(__('Cancel Sending'), function() {
+                    control('cancel_campaign', __('Stop sending the remaining messages? This cannot be undone.'));
+                }, __('Campaign'));
+            }
         }
     },
     validate: function(frm) {
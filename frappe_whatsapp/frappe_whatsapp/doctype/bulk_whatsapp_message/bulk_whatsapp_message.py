@@ -3,10 +3,25 @@
 
 import frappe
 from frappe import _
-import json
-from frappe.utils import cint, get_datetime, now
+from frappe.utils import get_datetime, now
 from frappe.model.document import Document
 from frappe.model.naming import make_autoname
+from frappe_whatsapp.utils.campaign import (
+    cancel_campaign,
+    get_campaign_context,
+    get_progress,
+    pause_campaign,
+    queue_campaign,
+    record_processed,
+    resume_campaign,
+    seed_counters,
+    send_to_recipient,
+)
+from frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_recipient_list.whatsapp_recipient_list import (
+    count_segment,
+    get_segment,
+    is_importing,
+)
 
 # Add these files to your frappe_whatsapp app
 
@@ -32,7 +47,14 @@ class BulkWhatsAppMessage(Document):
         
         # If recipient list is provided, count recipients
         if self.recipient_type == 'Recipient List' and self.recipient_list:
-            recipient_count = frappe.db.count("WhatsApp Recipient", {"parent": self.recipient_list})
+            if is_importing(self.recipient_list):
+                frappe.throw(_("Selected recipient list is still being imported"))
+            segment = get_segment(self.recipient_list)
+            if segment:
+                # estimate, fixed when the campaign is released
+                recipient_count = count_segment(segment)
+            else:
+                recipient_count = frappe.db.count("WhatsApp Recipient", {"parent": self.recipient_list})
             if recipient_count == 0:
                 frappe.throw(_("Selected recipient list has no recipients"))
             self.recipient_count = recipient_count
@@ -43,76 +65,48 @@ class BulkWhatsAppMessage(Document):
     def on_submit(self):
         self.db_set("status", "Queued")
         self.queue_messages()
+
+    def on_cancel(self):
+        cancel_campaign(self)
+
+    def pause(self):
+        """Pause sending; already running chunks stop within a few recipients"""
+        if self.status not in ("Scheduled", "Queued", "In Progress"):
+            frappe.throw(_("Only scheduled or running campaigns can be paused"))
+        pause_campaign(self)
+
+    def resume(self):
+        """Continue a paused campaign from where it stopped"""
+        if self.status != "Paused":
+            frappe.throw(_("Only paused campaigns can be resumed"))
+        resume_campaign(self)
+
+    def cancel_sending(self):
+        """Stop sending the remaining messages of this campaign"""
+        if self.status not in ("Scheduled", "Queued", "In Progress", "Paused"):
+            frappe.throw(_("Only scheduled, running or paused campaigns can be cancelled"))
+        cancel_campaign(self)
     
-    def queue_messages(self):
-        """Queue messages for sending"""
+    def get_recipient_source(self):
+        """Get the (parenttype, parent) holding this campaign's WhatsApp Recipient rows."""
         if self.recipient_type == 'Recipient List' and self.recipient_list:
-            # Fetch recipients from the recipient list
-            recipients = frappe.get_all(
-                "WhatsApp Recipient", 
-                filters={"parent": self.recipient_list},
-                fields=["mobile_number", "name", "recipient_name", "recipient_data"]
-            )
-            
-            for recipient in recipients:
-                frappe.enqueue_doc(
-                    self.doctype, self.name,
-                    "create_single_message",
-                    "long", 4000,
-                    recipient=recipient
-                )
-        else:
-            # Use recipients from the current document
-            for recipient in self.recipients:
-                frappe.enqueue_doc(
-                    self.doctype, self.name,
-                    "create_single_message",
-                    "long", 4000,
-                    recipient=recipient
-                )
-    
+            return "WhatsApp Recipient List", self.recipient_list
+        return self.doctype, self.name
+
+    def queue_messages(self):
+        """Queue one background job per chunk of recipients"""
+        queue_campaign(self)
+
     def create_single_message(self, recipient):
-        """Create a single message in the queue"""
-        # message_content = self.message_content
-        
-        # Replace variables in the message if any
-        self.status == "In Progress"
-        if recipient.get("recipient_data"):
-            try:
-                variables = json.loads(recipient.get("recipient_data", "{}"))
-                # for var_name, var_value in variables.items():
-                #     message_content = message_content.replace(f"{{{{{var_name}}}}}", str(var_value))
-            except Exception as e:
-                frappe.log_error(f"Error parsing recipient data: {str(e)}", "WhatsApp Bulk Messaging")
-        
-        # Create WhatsApp message
-        wa_message = frappe.new_doc("WhatsApp Message")
-        # wa_message.from_number = self.from_number
-        wa_message.to = recipient.get("mobile_number")
-        wa_message.message_type = "Text"
-        # wa_message.message = message_content
-        wa_message.flags.custom_ref_doc = json.loads(recipient.get("recipient_data", "{}"))
-        wa_message.bulk_message_reference = self.name
-        
-        # If template is being used
-        if self.use_template:
-            wa_message.template = self.template
-            wa_message.message_type = 'Template'
-            wa_message.use_template = self.use_template
-            # Handle template variables if needed
-            if self.template_variables:
-                wa_message.template_variables = self.template_variables
-        
-        # Set status to queued
-        wa_message.status = "Queued"
-        try:
-            wa_message.insert(ignore_permissions=True)
-        except Exception:
-            self.db_set("status", "Partially Failed")
-        # Update message count
-        self.db_set("sent_count", cint(self.sent_count) + 1)
-        if self.recipient_count == self.sent_count:
-            self.db_set("status", "Completed")
+        """Create a single message in the queue (jobs queued before chunking)"""
+        context = frappe._dict(get_campaign_context(self))
+        seed_counters(self.name)
+        message = send_to_recipient(context, recipient)
+        if message is None:
+            record_processed(context, 0, 0, 1)
+        else:
+            sent = 1 if message else 0
+            record_processed(context, sent, 1 - sent)
 
     def retry_failed(self):
         """Retry failed messages"""
@@ -136,24 +130,4 @@ class BulkWhatsAppMessage(Document):
         
     def get_progress(self):
         """Get sending progress for this bulk message"""
-        total = self.recipient_count
-        sent = frappe.db.count("WhatsApp Message", {
-            "bulk_message_reference": self.name,
-            "status": ["in", ["sent","delivered", "Success", "read"]]
-        })
-        failed = frappe.db.count("WhatsApp Message", {
-            "bulk_message_reference": self.name,
-            "status": "Failed"
-        })
-        queued = frappe.db.count("WhatsApp Message", {
-            "bulk_message_reference": self.name,
-            "status": "Queued"
-        })
-        
-        return {
-            "total": total,
-            "sent": sent,
-            "failed": failed,
-            "queued": queued,
-            "percent": (sent / total * 100) if total else 0
-        }
+        return get_progress(self.name, self.recipient_count)
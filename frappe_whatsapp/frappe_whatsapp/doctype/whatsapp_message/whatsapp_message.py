@@ -5,6 +5,9 @@ import frappe
 from frappe.model.document import Document
 from frappe.integrations.utils import make_post_request
 from ...utils.button_utils import get_template_buttons_with_dynamic_values
+from frappe_whatsapp.utils.phone import format_number
+from frappe_whatsapp.utils.suppression import is_suppressed
+from frappe_whatsapp.utils.template_compiler import get_compiled_template
 
 
 class WhatsAppMessage(Document):
@@ -52,63 +55,29 @@ class WhatsAppMessage(Document):
 
     def send_template(self):
         """Send template."""
-        template = frappe.get_doc("WhatsApp Templates", self.template)
-        data = {
-            "messaging_product": "whatsapp",
-            "to": self.format_number(self.to),
-            "type": "template",
-            "template": {
-                "name": template.actual_name or template.template_name,
-                "language": {"code": template.language_code},
-                "components": [],
-            },
-        }
-
-        if template.sample_values:
-            field_names = template.field_names.split(",") if template.field_names else template.sample_values.split(",")
-            parameters = []
-            template_parameters = []
+        template = get_compiled_template(self.template)
+        data = template.new_payload(
+            self.format_number(self.to),
+            name=template.actual_name or template.template_name,
+        )
 
+        if template.body_fields:
             if self.flags.custom_ref_doc:
                 custom_values = self.flags.custom_ref_doc
-                for field_name in field_names:
-                    value = custom_values.get(field_name.strip())
-                    parameters.append({"type": "text", "text": value})
-                    template_parameters.append(value)                    
-
+                template_parameters = [custom_values.get(field) for field in template.body_fields]
             else:
                 ref_doc = frappe.get_doc(self.reference_doctype, self.reference_name)
-                for field_name in field_names:
-                    value = ref_doc.get_formatted(field_name.strip())
-
-                    parameters.append({"type": "text", "text": value})
-                    template_parameters.append(value)
-
+                template_parameters = [ref_doc.get_formatted(field) for field in template.body_fields]
 
             self.template_parameters = json.dumps(template_parameters)
 
             data["template"]["components"].append(
-                {
-                    "type": "body",
-                    "parameters": parameters,
-                }
+                template.body_component(template_parameters)
             )
 
-        if template.header_type and template.sample:
-            if template.header_type == 'IMAGE':
-                if template.sample.startswith("http"):
-                    url = f'{template.sample}'
-                else:
-                    url = f'{frappe.utils.get_url()}{template.sample}'
-                data['template']['components'].append({
-                    "type": "header",
-                    "parameters": [{
-                        "type": "image",
-                        "image": {
-                            "link": url
-                        }
-                    }]
-                })
+        header_component = template.sample_header_component()
+        if header_component:
+            data['template']['components'].append(header_component)
 
         # Add buttons if template has them
         if template.buttons:
@@ -132,7 +101,7 @@ class WhatsAppMessage(Document):
         }
         try:
             response = make_post_request(
-                f"{settings.url}/{settings.version}/{settings.phone_id}/messages",
+                f"{settings.url}/{settings.version}/{self.flags.phone_id or settings.phone_id}/messages",
                 headers=headers,
                 data=json.dumps(data),
             )
@@ -153,52 +122,61 @@ class WhatsAppMessage(Document):
 
     def format_number(self, number):
         """Format number."""
-        if number.startswith("+"):
-            number = number[1 : len(number)]
+        formatted = format_number(number)
+        if not formatted:
+            frappe.throw(f"{number} is not a valid WhatsApp number")
+        if is_suppressed(formatted):
+            frappe.throw(f"{number} has opted out of WhatsApp messages or cannot receive them")
 
-        return number
+        return formatted
 
     def get_template_buttons_component(self, template):
         """Get buttons component for template message."""
-        if not template.buttons or len(template.buttons) > 10:
-            return None
-            
-        buttons = []
-        for button in template.buttons:
-            button_data = {
-                "type": button.button_type,
-                "text": button.button_text
-            }
-            
-            # According to WhatsApp API docs, when sending template messages:
-            # - QUICK_REPLY buttons should include the payload
-            # - URL buttons should include the URL
-            # - PHONE_NUMBER buttons should include the phone_number
-            # - COPY_CODE buttons should include the example
-            
-            if button.button_type == "QUICK_REPLY" and button.payload:
-                button_data["payload"] = button.payload
-            elif button.button_type == "URL" and button.url:
-                button_data["url"] = button.url
-            elif button.button_type == "PHONE_NUMBER" and button.phone_number:
-                button_data["phone_number"] = button.phone_number
-            elif button.button_type == "COPY_CODE" and button.copy_code_example:
-                button_data["example"] = [button.copy_code_example]
-            elif button.button_type == "FLOW" and button.flow_id:
-                # For FLOW buttons, we need flow_token from notification parameters
-                # The flow_id is already configured in the template
-                pass
-                
-            buttons.append(button_data)
-            
-        return {
-            "type": "BUTTONS",
-            "buttons": buttons
+        return get_template_buttons_component(template)
+
+
+def get_template_buttons_component(template):
+    """Get buttons component for template message."""
+    if not template.buttons or len(template.buttons) > 10:
+        return None
+        
+    buttons = []
+    for button in template.buttons:
+        button_data = {
+            "type": button.button_type,
+            "text": button.button_text
         }
+        
+        # According to WhatsApp API docs, when sending template messages:
+        # - QUICK_REPLY buttons should include the payload
+        # - URL buttons should include the URL
+        # - PHONE_NUMBER buttons should include the phone_number
+        # - COPY_CODE buttons should include the example
+        
+        if button.button_type == "QUICK_REPLY" and button.payload:
+            button_data["payload"] = button.payload
+        elif button.button_type == "URL" and button.url:
+            button_data["url"] = button.url
+        elif button.button_type == "PHONE_NUMBER" and button.phone_number:
+            button_data["phone_number"] = button.phone_number
+        elif button.button_type == "COPY_CODE" and button.copy_code_example:
+            button_data["example"] = [button.copy_code_example]
+        elif button.button_type == "FLOW" and button.flow_id:
+            # For FLOW buttons, we need flow_token from notification parameters
+            # The flow_id is already configured in the template
+            pass
+            
+        buttons.append(button_data)
+        
+    return {
+        "type": "BUTTONS",
+        "buttons": buttons
+    }
 
 
 def on_doctype_update():
     frappe.db.add_index("WhatsApp Message", ["reference_doctype", "reference_name"])
+    frappe.db.add_index("WhatsApp Message", ["bulk_message_reference", "status"])
 
 
 @frappe.whitelist()
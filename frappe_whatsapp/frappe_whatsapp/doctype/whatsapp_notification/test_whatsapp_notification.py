@@ -1,9 +1,205 @@
 # Copyright (c) 2022, Shridhar Patil and Contributors
 # See license.txt
 
-# import frappe
+from datetime import datetime, time
+from unittest.mock import MagicMock, patch
+from zoneinfo import ZoneInfo
+
+import frappe
 from frappe.tests import UnitTestCase
 
+from frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_notification import whatsapp_notification
+from frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_notification.whatsapp_notification import (
+	compile_condition,
+	get_condition_fields,
+	prefetch_documents,
+)
+from frappe_whatsapp.utils.dispatch_window import get_dispatch_offset, next_local_time
+
 
 class TestWhatsAppNotification(UnitTestCase):
-	pass
+	def test_compile_condition(self):
+		filters, or_filters = compile_condition(
+			'doc.status == "Unpaid" and doc.get("grand_total") >= 100 and 0 < doc.qty <= 5'
+		)
+		self.assertEqual(
+			filters,
+			[["status", "=", "Unpaid"], ["grand_total", ">=", 100], ["qty", ">", 0], ["qty", "<=", 5]],
+		)
+		self.assertEqual(or_filters, [])
+
+	def test_compile_condition_in_or_and_none(self):
+		filters, or_filters = compile_condition(
+			'doc.territory in ("North", "South") and (doc.customer_group == "Retail" or doc.email is None)'
+		)
+		self.assertEqual(filters, [["territory", "in", ["North", "South"]]])
+		self.assertEqual(or_filters, [["customer_group", "=", "Retail"], ["email", "is", "not set"]])
+
+	def test_compile_condition_leaves_out_what_it_cannot_translate(self):
+		filters, or_filters = compile_condition(
+			'doc.status == "Open" and len(doc.items) > 2 and (doc.a == 1 or frappe.utils.cint(doc.b))'
+		)
+		self.assertEqual(filters, [["status", "=", "Open"]])
+		self.assertEqual(or_filters, [])
+		self.assertEqual(compile_condition("doc.status ==="), ([], []))
+
+	def test_compile_condition_leaves_out_narrowing_operands(self):
+		# SQL would drop NULL / "" / 0 rows, or rows differing only in case, that Python accepts
+		for condition in (
+			"doc.x != None",
+			"doc.x is not None",
+			'doc.x != ""',
+			"doc.qty != 0",
+			'doc.status != "Open"',
+			'doc.status not in ("Open", "Closed")',
+			'doc.status > "Open"',
+		):
+			self.assertEqual(compile_condition(condition), ([], []), condition)
+
+		self.assertEqual(
+			compile_condition('doc.qty != 0 and doc.status == "Open"'),
+			([["status", "=", "Open"]], []),
+		)
+		# one unsafe disjunct keeps the whole group out
+		self.assertEqual(compile_condition('doc.a == 1 or doc.b != ""'), ([], []))
+
+	def test_condition_fields(self):
+		self.assertEqual(get_condition_fields('doc.status == "Open" and doc["qty"] > 1'), {"status", "qty"})
+		self.assertIsNone(get_condition_fields("len(doc) > 1"))
+
+	def test_dispatch_offset_is_stable_and_spread(self):
+		offsets = [get_dispatch_offset("Reminder", str(919800000000 + i), 7200) for i in range(6000)]
+		self.assertEqual(offsets[0], get_dispatch_offset("Reminder", "919800000000", 7200))
+		self.assertTrue(all(0 <= offset < 7200 for offset in offsets))
+		# every 10 minute slot of the 2 hour window gets about 500
+		slots = [0] * 12
+		for offset in offsets:
+			slots[offset // 600] += 1
+		self.assertLess(max(slots) - min(slots), 200)
+
+	def test_next_local_time(self):
+		zone = ZoneInfo("Asia/Kolkata")
+		timestamp = datetime(2026, 10, 19, 22, 0, tzinfo=zone).timestamp()
+		self.assertEqual(
+			datetime.fromtimestamp(next_local_time(timestamp, time(9, 0), zone), zone),
+			datetime(2026, 10, 20, 9, 0, tzinfo=zone),
+		)
+		self.assertEqual(
+			datetime.fromtimestamp(next_local_time(timestamp, time(23, 0), zone), zone),
+			datetime(2026, 10, 19, 23, 0, tzinfo=zone),
+		)
+
+	def make_notification(self, **values):
+		doc = frappe.new_doc("WhatsApp Notification")
+		doc.update({
+			"reference_doctype": "Sales Invoice",
+			"doctype_event": "Days Before",
+			"date_changed": "due_date",
+			"days_in_advance": 2,
+			**values,
+		})
+		return doc
+
+	def iter_due_records(self, doc, fields, pages):
+		pages = iter(pages)
+		with (
+			patch.object(whatsapp_notification, "nowdate", return_value="2026-10-19"),
+			patch.object(doc, "get_condition_filters", return_value=([["status", "=", "Unpaid"]], [])),
+			patch.object(doc, "get_required_fields", return_value=fields),
+			patch.object(frappe, "get_all", side_effect=lambda *args, **kwargs: next(pages)) as get_all,
+			patch.object(frappe, "get_doc", side_effect=lambda doctype, name: frappe._dict(doctype=doctype, name=name)),
+		):
+			batches = list(doc.iter_due_records(batch_size=2))
+		return batches, get_all
+
+	def test_due_records_are_projected_and_paged_by_name(self):
+		doc = self.make_notification()
+		pages = [
+			[frappe._dict(name="SINV-1", mobile_no="1"), frappe._dict(name="SINV-2", mobile_no="2")],
+			[frappe._dict(name="SINV-3", mobile_no="3")],
+		]
+		batches, get_all = self.iter_due_records(doc, ["mobile_no", "name"], pages)
+
+		self.assertEqual([[record.name for record in batch] for batch in batches], [["SINV-1", "SINV-2"], ["SINV-3"]])
+		self.assertTrue(all(record.doctype == "Sales Invoice" for batch in batches for record in batch))
+		first, second = (c.kwargs for c in get_all.call_args_list)
+		self.assertEqual(first["fields"], ["mobile_no", "name"])
+		self.assertEqual(first["filters"], [
+			["due_date", ">=", "2026-10-21 00:00:00.000000"],
+			["due_date", "<=", "2026-10-21 23:59:59.000000"],
+			["status", "=", "Unpaid"],
+		])
+		self.assertEqual(second["filters"][-1], ["name", ">", "SINV-2"])
+
+	def test_due_records_load_documents_when_fields_are_unknown(self):
+		doc = self.make_notification(doctype_event="Days After")
+		batches, get_all = self.iter_due_records(doc, None, [[frappe._dict(name="SINV-1")]])
+
+		self.assertEqual(batches, [[frappe._dict(doctype="Sales Invoice", name="SINV-1")]])
+		self.assertEqual(get_all.call_args.kwargs["fields"], ["name"])
+		self.assertEqual(get_all.call_args.kwargs["filters"][0], ["due_date", ">=", "2026-10-17 00:00:00.000000"])
+
+	def test_prefetch_projected_fields_in_one_query(self):
+		rows = [frappe._dict(name="SINV-1", mobile_no="1"), frappe._dict(name="SINV-2", mobile_no="2")]
+		with patch.object(frappe, "get_all", return_value=rows) as get_all:
+			docs = prefetch_documents("Sales Invoice", ["SINV-1", "SINV-2", "SINV-9"], ["name", "mobile_no"])
+
+		get_all.assert_called_once()
+		self.assertEqual(get_all.call_args.kwargs["filters"], {"name": ("in", ["SINV-1", "SINV-2", "SINV-9"])})
+		self.assertEqual(list(docs), ["SINV-1", "SINV-2"])
+		self.assertEqual(docs["SINV-1"].doctype, "Sales Invoice")
+		self.assertEqual(prefetch_documents("Sales Invoice", []), {})
+
+	def test_prefetch_documents_with_one_query_per_child_table(self):
+		items = frappe._dict(fieldname="items", options="Sales Invoice Item")
+		results = {
+			"Sales Invoice": [frappe._dict(name="SINV-1"), frappe._dict(name="SINV-2")],
+			"Sales Invoice Item": [
+				frappe._dict(parent="SINV-1", item_code="A"),
+				frappe._dict(parent="SINV-1", item_code="B"),
+			],
+		}
+		meta = MagicMock()
+		meta.get_table_fields.return_value = [items]
+		with (
+			patch.object(frappe, "get_all", side_effect=lambda doctype, **kwargs: results[doctype]) as get_all,
+			patch.object(frappe, "get_meta", return_value=meta),
+			patch.object(frappe, "get_doc", side_effect=frappe._dict),
+		):
+			docs = prefetch_documents("Sales Invoice", ["SINV-1", "SINV-2"])
+
+		self.assertEqual(get_all.call_count, 2)
+		self.assertEqual([item.item_code for item in docs["SINV-1"]["items"]], ["A", "B"])
+		self.assertEqual(docs["SINV-2"]["items"], [])
+		self.assertEqual(docs["SINV-2"]["doctype"], "Sales Invoice")
+
+	def test_send_batch_builds_payloads_and_delivers_them_together(self):
+		doc = self.make_notification(name="Reminder")
+		records = [
+			(frappe._dict(name="SINV-1", status="Unpaid"), None),
+			(frappe._dict(name="SINV-2", status="Paid"), None),
+			(frappe._dict(name="SINV-3", status="Unpaid"), "919800000003"),
+		]
+
+		def build_template_payload(template, record, doc_data, phone_no=None):
+			if doc_data.name == "SINV-3":
+				raise ValueError("missing parameter")
+			return {"to": "919800000001"}
+
+		with (
+			patch.object(doc, "check_condition", side_effect=lambda doc_data: doc_data.status == "Unpaid"),
+			patch.object(doc, "build_template_payload", side_effect=build_template_payload),
+			patch.object(doc, "deliver") as deliver,
+			patch.object(frappe, "log_error"),
+		):
+			results = doc.send_batch(records, MagicMock(), MagicMock())
+
+		# a delivered message keeps its status until record_batch sets it
+		self.assertEqual(
+			[(result.name, result.status) for result in results],
+			[("SINV-1", "Skipped"), ("SINV-2", "Skipped"), ("SINV-3", "Failed")],
+		)
+		self.assertEqual(results[2].error, "missing parameter")
+		(messages, _dispatcher), _kwargs = deliver.call_args
+		self.assertEqual([(doc_data.name, data["to"]) for doc_data, data, _result in messages], [("SINV-1", "919800000001")])
+		self.assertEqual(results[0].to, "919800000001")
@@ -1,6 +1,8 @@
 """Notification."""
 
+import ast
 import json
+import re
 import frappe
 
 from frappe import _dict, _
@@ -8,8 +10,36 @@ from frappe.model.document import Document
 from frappe.utils.safe_exec import get_safe_globals, safe_exec
 from frappe.integrations.utils import make_post_request
 from frappe.desk.form.utils import get_pdf_link
-from frappe.utils import add_to_date, nowdate, datetime
+from frappe.model import default_fields, no_value_fields, table_fields
+from frappe.utils import add_to_date, cint, now, nowdate
 from ...utils.button_utils import get_template_buttons_with_dynamic_values, process_dynamic_payload
+from frappe_whatsapp.utils.campaign import get_messages_endpoint
+from frappe_whatsapp.utils.dispatch import Dispatcher
+from frappe_whatsapp.utils.dispatch_window import park_messages, spreads_dispatch
+from frappe_whatsapp.utils.phone import format_number
+from frappe_whatsapp.utils.suppression import handle_error_code, is_suppressed
+from frappe_whatsapp.utils.template_compiler import get_compiled_template
+
+# reference documents read and sent per batch by the Days Before/After run
+NOTIFICATION_BATCH_SIZE = 500
+NOTIFICATION_TIMEOUT = 4 * 60 * 60
+
+NOTIFICATION_MESSAGE_FIELDS = [
+    "name", "creation", "modified", "owner", "modified_by", "docstatus", "idx",
+    "type", "to", "status", "message", "message_type", "content_type", "message_id",
+    "reference_doctype", "reference_name",
+]
+
+# {{field}} placeholders in button parameters
+PLACEHOLDER = re.compile(r"\{\{([^}]+)\}\}")
+
+# dynamic value of each button type, as returned by get_template_buttons_with_dynamic_values
+BUTTON_VALUE_FIELDS = {
+    "QUICK_REPLY": "payload",
+    "URL": "url",
+    "PHONE_NUMBER": "phone_number",
+    "FLOW": "flow_token",
+}
 
 
 class WhatsAppNotification(Document):
@@ -33,6 +63,18 @@ class WhatsAppNotification(Document):
                     frappe.bold(_("Attach from field")),
                 ))
 
+        if self.local_send_time and self.timezone_field:
+            if not frappe.get_meta(self.reference_doctype).get_field(self.timezone_field):
+                frappe.throw(_("Field {0} not found on DocType {1}").format(
+                    self.timezone_field,
+                    self.reference_doctype,
+                ))
+
+        if self.local_send_time and self.event_frequency in ("All", "Hourly", "Hourly Long"):
+            frappe.throw(_("{0} needs a daily or less frequent schedule").format(
+                frappe.bold(_("Send at Local Time")),
+            ))
+
         if self.set_property_after_alert:
             meta = frappe.get_meta(self.reference_doctype)
             if not meta.get_field(self.set_property_after_alert):
@@ -42,45 +84,43 @@ class WhatsAppNotification(Document):
                 ))
 
 
-    def send_scheduled_message(self) -> dict:
-        """Specific to API endpoint Server Scripts."""
+    def send_scheduled_message(self) -> list:
+        """Specific to API endpoint Server Scripts.
+
+        Returns a result per ``_contact_list`` or ``_data_list`` entry, also
+        left on the notification as ``_results``.
+        """
         safe_exec(
             self.condition, get_safe_globals(), dict(doc=self)
         )
 
-        template = frappe.get_doc(
-            "WhatsApp Templates", self.template
-        )
+        template = get_compiled_template(self.template)
+        results = []
 
         if template and template.language_code:
             if self.get("_contact_list"):
                 # send simple template without a doc to get field data.
-                self.send_simple_template(template)
+                results = self.send_simple_template(template)
             elif self.get("_data_list"):
                 # allow send a dynamic template using schedule event config
                 # _doc_list shoud be [{"name": "xxx", "phone_no": "123"}]
-                for data in self._data_list:
-                    doc = frappe.get_doc(self.reference_doctype, data.get("name"))
+                results = self.send_data_list(template)
 
-                    self.send_template_message(doc, data.get("phone_no"), template, True)
-        # return _globals.frappe.flags
+        self._results = results
+        return results
 
 
     def send_simple_template(self, template):
         """ send simple template without a doc to get field data """
+        messages, results = [], []
         for contact in self._contact_list:
-            data = {
-                "messaging_product": "whatsapp",
-                "to": self.format_number(contact),
-                "type": "template",
-                "template": {
-                    "name": template.actual_name,
-                    "language": {
-                        "code": template.language_code
-                    },
-                    "components": []
-                }
-            }
+            result = _dict(to=contact, status="Skipped")
+            results.append(result)
+            to = self.format_number(contact)
+            if not to:
+                continue
+
+            data = template.new_payload(to)
             self.content_type = template.get("header_type", "text").lower()
             
             # Add buttons if template has them and notification has button parameters
@@ -88,8 +128,48 @@ class WhatsAppNotification(Document):
                 button_component = self.get_template_buttons_component(template)
                 if button_component:
                     data["template"]["components"].append(button_component)
-                    
-            self.notify(data)
+
+            result.to = to
+            messages.append((None, data, result))
+
+        url, headers = get_messages_endpoint()
+        with Dispatcher(url, headers) as dispatcher:
+            for start in range(0, len(messages), NOTIFICATION_BATCH_SIZE):
+                self.deliver(messages[start:start + NOTIFICATION_BATCH_SIZE], dispatcher)
+                frappe.db.commit()
+
+        return results
+
+    def send_data_list(self, template):
+        """Send to every ``_data_list`` entry, prefetching its documents batch by batch."""
+        fields = self.get_required_fields(include_condition=False)
+        results = []
+
+        url, headers = get_messages_endpoint()
+        with Dispatcher(url, headers) as dispatcher:
+            for start in range(0, len(self._data_list), NOTIFICATION_BATCH_SIZE):
+                entries = self._data_list[start:start + NOTIFICATION_BATCH_SIZE]
+                docs = prefetch_documents(
+                    self.reference_doctype, list({entry.get("name") for entry in entries}), fields
+                )
+                records = [
+                    (docs[entry.get("name")], entry.get("phone_no"))
+                    for entry in entries
+                    if entry.get("name") in docs
+                ]
+                sent = iter(self.send_batch(records, template, dispatcher, ignore_condition=True))
+                for entry in entries:
+                    if entry.get("name") in docs:
+                        results.append(next(sent))
+                    else:
+                        results.append(_dict(
+                            name=entry.get("name"),
+                            status="Failed",
+                            error=_("{0} {1} not found").format(self.reference_doctype, entry.get("name")),
+                        ))
+                frappe.db.commit()
+
+        return results
 
 
     def send_template_message(self, doc: Document, phone_no=None, default_template=None, ignore_condition=False):
@@ -97,135 +177,130 @@ class WhatsAppNotification(Document):
         if self.disabled:
             return
 
-        doc_data = doc.as_dict()
-        if self.condition and not ignore_condition:
-            # check if condition satisfies
-            if not frappe.safe_eval(
-                self.condition, get_safe_globals(), dict(doc=doc_data)
-            ):
-                return
+        doc_data = get_doc_data(doc)
+        if not ignore_condition and not self.check_condition(doc_data):
+            return
 
-        template = default_template or frappe.get_doc(
-            "WhatsApp Templates", self.template
-        )
+        template = default_template or get_compiled_template(self.template)
 
         if template:
-            if self.field_name:
-                phone_number = phone_no or doc_data[self.field_name]
-            else:
-                phone_number = phone_no
-
-            data = {
-                "messaging_product": "whatsapp",
-                "to": self.format_number(phone_number),
-                "type": "template",
-                "template": {
-                    "name": template.actual_name,
-                    "language": {
-                        "code": template.language_code
-                    },
-                    "components": []
-                }
-            }
+            data = self.build_template_payload(template, doc, doc_data, phone_no)
+            if data:
+                self.notify(data, doc_data)
+
+    def check_condition(self, doc_data):
+        """Whether the notification's condition holds for a document."""
+        if not self.condition:
+            return True
+        return frappe.safe_eval(self.condition, get_safe_globals(), dict(doc=doc_data))
+
+    def build_template_payload(self, template, doc, doc_data, phone_no=None):
+        """Template message payload for a document, or None when its number is not usable.
+
+        ``doc`` is a Document, or a dict of the fields the notification reads.
+        """
+        if self.field_name:
+            phone_number = phone_no or doc_data[self.field_name]
+        else:
+            phone_number = phone_no
+
+        to = self.format_number(phone_number)
+        if not to:
+            return None
 
-            # Pass parameter values
-            if self.fields:
-                parameters = []
-                for field in self.fields:
-                    if isinstance(doc, Document):
-                        # get field with prettier value.
-                        value = doc.get_formatted(field.field_name)
-                    else: 
-                        value = doc_data[field.field_name]
-                        if isinstance(doc_data[field.field_name], (datetime.date, datetime.datetime)):
-                            value = str(doc_data[field.field_name])
-
-                    parameters.append({
-                        "type": "text",
-                        "text": value
-                    })
-
-                data['template']["components"] = [{
-                    "type": "body",
-                    "parameters": parameters
-                }]
+        data = template.new_payload(to)
 
-            if self.attach_document_print:
-                # frappe.db.begin()
-                key = doc.get_document_share_key()  # noqa
-                frappe.db.commit()
-                print_format = "Standard"
-                doctype = frappe.get_doc("DocType", doc_data['doctype'])
-                if doctype.custom:
-                    if doctype.default_print_format:
-                        print_format = doctype.default_print_format
+        # Pass parameter values
+        if self.fields:
+            parameters = []
+            meta = frappe.get_meta(doc_data.doctype)
+            for field in self.fields:
+                if isinstance(doc, Document):
+                    # get field with prettier value.
+                    value = doc.get_formatted(field.field_name)
                 else:
-                    default_print_format = frappe.db.get_value(
-                        "Property Setter",
-                        filters={
-                            "doc_type": doc_data['doctype'],
-                            "property": "default_print_format"
-                        },
-                        fieldname="value"
-                    )
-                    print_format = default_print_format if default_print_format else print_format
-                link = get_pdf_link(
-                    doc_data['doctype'],
-                    doc_data['name'],
-                    print_format=print_format
+                    value = frappe.format_value(doc_data[field.field_name], meta.get_field(field.field_name), doc_data)
+
+                parameters.append(value)
+
+            data['template']["components"] = [template.body_component(parameters)]
+
+        if self.attach_document_print:
+            # frappe.db.begin()
+            key = doc.get_document_share_key()  # noqa
+            frappe.db.commit()
+            print_format = "Standard"
+            doctype = frappe.get_doc("DocType", doc_data['doctype'])
+            if doctype.custom:
+                if doctype.default_print_format:
+                    print_format = doctype.default_print_format
+            else:
+                default_print_format = frappe.db.get_value(
+                    "Property Setter",
+                    filters={
+                        "doc_type": doc_data['doctype'],
+                        "property": "default_print_format"
+                    },
+                    fieldname="value"
                 )
+                print_format = default_print_format if default_print_format else print_format
+            link = get_pdf_link(
+                doc_data['doctype'],
+                doc_data['name'],
+                print_format=print_format
+            )
 
-                filename = f'{doc_data["name"]}.pdf'
-                url = f'{frappe.utils.get_url()}{link}&key={key}'
+            filename = f'{doc_data["name"]}.pdf'
+            url = f'{frappe.utils.get_url()}{link}&key={key}'
 
-            elif self.custom_attachment:
-                filename = self.file_name
+        elif self.custom_attachment:
+            filename = self.file_name
 
-                if self.attach_from_field:
-                    file_url = doc_data[self.attach_from_field]
-                    if not file_url.startswith("http"):
-                        # get share key so that private files can be sent
-                        key = doc.get_document_share_key()
-                        file_url = f'{frappe.utils.get_url()}{file_url}&key={key}'
-                else:
-                    file_url = self.attach
+            if self.attach_from_field:
+                file_url = doc_data[self.attach_from_field]
+                if not file_url.startswith("http"):
+                    # get share key so that private files can be sent
+                    key = doc.get_document_share_key()
+                    file_url = f'{frappe.utils.get_url()}{file_url}&key={key}'
+            else:
+                file_url = self.attach
 
-                if file_url.startswith("http"):
-                    url = f'{file_url}'
-                else:
-                    url = f'{frappe.utils.get_url()}{file_url}'
-
-            if template.header_type == 'DOCUMENT':
-                data['template']['components'].append({
-                    "type": "header",
-                    "parameters": [{
-                        "type": "document",
-                        "document": {
-                            "link": url,
-                            "filename": filename
-                        }
-                    }]
-                })
-            elif template.header_type == 'IMAGE':
-                data['template']['components'].append({
-                    "type": "header",
-                    "parameters": [{
-                        "type": "image",
-                        "image": {
-                            "link": url
-                        }
-                    }]
-                })
-            self.content_type = template.header_type.lower()
+            if file_url.startswith("http"):
+                url = f'{file_url}'
+            else:
+                url = f'{frappe.utils.get_url()}{file_url}'
+
+        if template.header_type == 'DOCUMENT':
+            data['template']['components'].append({
+                "type": "header",
+                "parameters": [{
+                    "type": "document",
+                    "document": {
+                        "link": url,
+                        "filename": filename
+                    }
+                }]
+            })
+        elif template.header_type == 'IMAGE':
+            data['template']['components'].append({
+                "type": "header",
+                "parameters": [{
+                    "type": "image",
+                    "image": {
+                        "link": url
+                    }
+                }]
+            })
+        self.content_type = template.header_type.lower()
 
-            # Add buttons if template has them and notification has button parameters
-            if template.buttons and self.button_parameters:
-                button_components = self.get_template_buttons_component(template, doc, doc_data)
-                if button_components:
-                    for component in button_components:
-                        data["template"]["components"].append(component)
+        # Add buttons if template has them and notification has button parameters
+        if template.buttons and self.button_parameters:
+            button_components = self.get_template_buttons_component(template, doc, doc_data)
+            if button_components:
+                for component in button_components:
+                    data["template"]["components"].append(component)
 
-            self.notify(data, doc_data)
+        return data
 
     def notify(self, data, doc_data=None):
         """Notify."""
@@ -268,17 +343,8 @@ class WhatsAppNotification(Document):
 
             frappe.get_doc(new_doc).save(ignore_permissions=True)
 
-            if doc_data and self.set_property_after_alert and self.property_value:
-                if doc_data.doctype and doc_data.name:
-                    fieldname = self.set_property_after_alert
-                    value = self.property_value
-                    meta = frappe.get_meta(doc_data.get("doctype"))
-                    df = meta.get_field(fieldname)
-                    if df:
-                        if df.fieldtype in frappe.model.numeric_fieldtypes:
-                            value = frappe.utils.cint(value)
-
-                        frappe.db.set_value(doc_data.get("doctype"), doc_data.get("name"), fieldname, value)
+            if doc_data and doc_data.doctype and doc_data.name:
+                self.set_property_after_send(doc_data.doctype, doc_data.name)
 
             frappe.msgprint("WhatsApp Message Triggered", indicator="green", alert=True)
             success = True
@@ -316,17 +382,45 @@ class WhatsAppNotification(Document):
             }).insert(ignore_permissions=True)
 
 
+    def set_property_after_send(self, doctype, names):
+        """Set the configured property on the document(s) a message was sent for."""
+        if not (self.set_property_after_alert and self.property_value and names):
+            return
+
+        fieldname = self.set_property_after_alert
+        value = self.property_value
+        df = frappe.get_meta(doctype).get_field(fieldname)
+        if df:
+            if df.fieldtype in frappe.model.numeric_fieldtypes:
+                value = cint(value)
+
+            if isinstance(names, list):
+                names = {"name": ("in", names)}
+            frappe.db.set_value(doctype, names, fieldname, value)
+
     def on_trash(self):
         """On delete remove from schedule."""
         frappe.cache().delete_value("whatsapp_notification_map")
 
 
     def format_number(self, number):
-        """Format number."""
-        if (number.startswith("+")):
-            number = number[1:len(number)]
+        """Format number, logging and returning None when it is not valid or suppressed."""
+        formatted = format_number(number)
+        error = None
+        if not formatted:
+            error = f"{number} is not a valid WhatsApp number"
+        elif is_suppressed(formatted):
+            error = f"{number} is suppressed"
+            formatted = None
+
+        if error:
+            frappe.get_doc({
+                "doctype": "WhatsApp Notification Log",
+                "template": self.template,
+                "meta_data": {"error": error}
+            }).insert(ignore_permissions=True)
 
-        return number
+        return formatted
 
     def validate_button_parameters(self, template):
         """Validate button parameters before sending message."""
@@ -369,97 +463,407 @@ class WhatsAppNotification(Document):
         button_components = []
         
         for i, button in enumerate(buttons):
-            if button.get("type") == "QUICK_REPLY":
-                button_components.append({
-                    "type": "button",
-                    "sub_type": "quick_reply",
-                    "index": str(i),
-                    "parameters": [
-                        {
-                            "type": "payload",
-                            "payload": button.get("payload", "")
-                        }
-                    ]
-                })
-            elif button.get("type") == "URL":
-                button_components.append({
-                    "type": "button",
-                    "sub_type": "url",
-                    "index": str(i),
-                    "parameters": [
-                        {
-                            "type": "text",
-                            "text": button.get("url", "")
-                        }
-                    ]
-                })
-            elif button.get("type") == "PHONE_NUMBER":
-                button_components.append({
-                    "type": "button",
-                    "sub_type": "phone_number",
-                    "index": str(i),
-                    "parameters": [
-                        {
-                            "type": "text",
-                            "text": button.get("phone_number", "")
-                        }
-                    ]
-                })
-            elif button.get("type") == "COPY_CODE":
-                button_components.append({
-                    "type": "button",
-                    "sub_type": "copy_code",
-                    "index": str(i),
-                    "parameters": [
-                        {
-                            "type": "text",
-                            "text": button.get("example", [""])[0] if button.get("example") else ""
-                        }
-                    ]
-                })
-            elif button.get("type") == "FLOW":
-                button_components.append({
-                    "type": "button",
-                    "sub_type": "flow",
-                    "index": str(i),
-                    "parameters": [
-                        {
-                            "type": "action",
-                            "action": {
-                                "flow_token": button.get("flow_token", "")
-                            }
-                        }
-                    ]
-                })
+            if button.get("type") == "COPY_CODE":
+                value = button.get("example", [""])[0] if button.get("example") else ""
+            else:
+                value = button.get(BUTTON_VALUE_FIELDS.get(button.get("type")), "")
+
+            # sub_type follows the template's button layout, compiled once per template
+            component = template.button_component(i, value)
+            if component:
+                button_components.append(component)
         
         # Return all button components
         return button_components if button_components else None
 
     def get_documents_for_today(self):
-        """get list of documents that will be triggered today"""
-        docs = []
+        """Send to every document whose reference date is today.
+
+        Due documents are read in keyset-paginated batches of only the fields
+        the notification uses; each batch is sent concurrently and its
+        messages are recorded with one multi-row INSERT.
+        """
+        template = get_compiled_template(self.template)
+        if self.disabled or not template:
+            return
+
+        url, headers = get_messages_endpoint()
+        with Dispatcher(url, headers) as dispatcher:
+            for records in self.iter_due_records():
+                self.send_batch([(doc, None) for doc in records], template, dispatcher)
+                frappe.db.commit()
+
+    def get_required_fields(self, include_condition=True):
+        """Fields of the reference doctype a send reads, or None when it needs full documents."""
+        if self.attach_document_print or (self.custom_attachment and self.attach_from_field):
+            # share keys for attachments are made from the Document
+            return None
 
+        condition_fields = get_condition_fields(self.condition) if include_condition else set()
+        if condition_fields is None:
+            return None
+
+        fields = {"name", *condition_fields, *(field.field_name for field in self.fields)}
+        for fieldname in (self.field_name, self.local_send_time and self.timezone_field):
+            if fieldname:
+                fields.add(fieldname)
+        for param in self.button_parameters or []:
+            for value in (param.payload, param.url, param.phone_number, param.copy_code_example, param.flow_token):
+                fields.update(match.split(".")[0].strip() for match in PLACEHOLDER.findall(value or ""))
+
+        meta = frappe.get_meta(self.reference_doctype)
+        if any(df.fieldtype in table_fields for df in map(meta.get_field, fields) if df):
+            return None
+
+        columns = {field for field in fields if field != "doctype" and (field in default_fields or meta.has_field(field))}
+        if condition_fields - columns - {"doctype"}:
+            # the condition reads a property or method of the Document
+            return None
+        return sorted(columns)
+
+    def get_condition_filters(self):
+        """DB filters and or_filters compiled from the condition, on real columns only."""
+        filters, or_filters = compile_condition(self.condition)
+        meta = frappe.get_meta(self.reference_doctype)
+
+        def is_column(field):
+            if field in default_fields:
+                return field != "doctype"
+            df = meta.get_field(field)
+            return bool(df) and df.fieldtype not in no_value_fields
+
+        filters = [term for term in filters if is_column(term[0])]
+        if not all(is_column(term[0]) for term in or_filters):
+            or_filters = []
+        return filters, or_filters
+
+    def iter_due_records(self, batch_size=NOTIFICATION_BATCH_SIZE):
+        """Yield batches of due reference documents, as dicts of the required fields or as Documents."""
         diff_days = self.days_in_advance
         if self.doctype_event == "Days After":
             diff_days = -diff_days
 
         reference_date = add_to_date(nowdate(), days=diff_days)
-        reference_date_start = reference_date + " 00:00:00.000000"
-        reference_date_end = reference_date + " 23:59:59.000000"
+        # the condition is still evaluated on every row; these only let the DB skip rows it rejects
+        condition_filters, or_filters = self.get_condition_filters()
+        base_filters = [
+            [self.date_changed, ">=", reference_date + " 00:00:00.000000"],
+            [self.date_changed, "<=", reference_date + " 23:59:59.000000"],
+            *condition_filters,
+        ]
+        fields = self.get_required_fields()
+
+        last_name = None
+        while True:
+            filters = list(base_filters)
+            if last_name is not None:
+                filters.append(["name", ">", last_name])
+            records = frappe.get_all(
+                self.reference_doctype,
+                fields=fields or ["name"],
+                filters=filters,
+                or_filters=or_filters,
+                order_by="name asc",
+                limit_page_length=batch_size,
+            )
+            if not records:
+                return
 
-        doc_list = frappe.get_all(
-            self.reference_doctype,
-            fields="name",
-            filters=[
-                {self.date_changed: (">=", reference_date_start)},
-                {self.date_changed: ("<=", reference_date_end)},
-            ],
-        )
+            last_name = records[-1].name
+            if fields:
+                for record in records:
+                    record.doctype = self.reference_doctype
+                yield records
+            else:
+                yield [frappe.get_doc(self.reference_doctype, record.name) for record in records]
+
+            if len(records) < batch_size:
+                return
 
-        for d in doc_list:
-            doc = frappe.get_doc(self.reference_doctype, d.name)
-            self.send_template_message(doc)
-            # print(doc.name)
+    def send_batch(self, records, template, dispatcher, ignore_condition=False):
+        """Build, send and record the messages for a batch of ``(doc, phone_no)`` pairs.
+
+        Returns a result per pair.
+        """
+        messages, results = [], []
+        for doc, phone_no in records:
+            doc_data = get_doc_data(doc)
+            result = _dict(name=doc_data.name, status="Skipped")
+            results.append(result)
+            try:
+                if not ignore_condition and not self.check_condition(doc_data):
+                    continue
+                data = self.build_template_payload(template, doc, doc_data, phone_no)
+            except Exception as e:
+                frappe.log_error(
+                    title=f"WhatsApp Notification {self.name} failed for {doc_data.name}",
+                )
+                result.update(status="Failed", error=str(e))
+                continue
+            if data:
+                result.to = data["to"]
+                messages.append((doc_data, data, result))
+
+        if messages:
+            self.deliver(messages, dispatcher)
+        return results
+
+    def deliver(self, messages, dispatcher):
+        """Send a batch of ``(doc_data, payload, result)`` now, or park it on the timing wheel."""
+        if spreads_dispatch(self):
+            park_messages(self, messages)
+        else:
+            self.record_batch(messages, dispatcher.post_messages([data for _, data, _ in messages]))
+
+    def record_batch(self, messages, responses):
+        """Insert the sent WhatsApp Messages of a batch, fill in its results and log its errors.
+
+        ``messages`` are ``(doc_data, payload, result)``, ``doc_data`` None for a bare contact.
+        """
+        timestamp, user = now(), frappe.session.user
+        rows, errors, sent = [], [], []
+        for (doc_data, data, result), (message_id, error, error_code) in zip(messages, responses):
+            reference_doctype, reference_name = (doc_data.doctype, doc_data.name) if doc_data else (None, None)
+            if error:
+                handle_error_code(data["to"], error_code)
+                result.update(status="Failed", error=error)
+                errors.append({"to": data["to"], "reference_name": reference_name, "error": error})
+                continue
+
+            result.update(status="Sent", message_id=message_id)
+            if reference_name:
+                sent.append(reference_name)
+            rows.append((
+                frappe.generate_hash(length=10), timestamp, timestamp, user, user, 0, 0,
+                "Outgoing", data["to"], "Success", str(data["template"]), "Template",
+                self.content_type or "text", message_id, reference_doctype, reference_name,
+            ))
+
+        if rows:
+            frappe.db.bulk_insert("WhatsApp Message", NOTIFICATION_MESSAGE_FIELDS, rows)
+        if sent:
+            self.set_property_after_send(self.reference_doctype, sent)
+
+        frappe.get_doc({
+            "doctype": "WhatsApp Notification Log",
+            "template": self.template,
+            "meta_data": {"notification": self.name, "sent": len(rows), "errors": errors},
+        }).insert(ignore_permissions=True)
+
+
+def get_doc_data(doc):
+    """Field values of a Document, or of a dict of projected fields."""
+    if isinstance(doc, Document):
+        return doc.as_dict()
+    return _dict(doc)
+
+
+def prefetch_documents(doctype, names, fields=None):
+    """Load documents by name with one IN query, plus one per child table.
+
+    With ``fields``, returns dicts of just those fields instead of Documents.
+    Returns ``{name: document}``; names that do not exist are left out.
+    """
+    if not names:
+        return {}
+
+    rows = frappe.get_all(doctype, fields=fields or ["*"], filters={"name": ("in", names)}, limit_page_length=0)
+    if fields:
+        for row in rows:
+            row.doctype = doctype
+        return {row.name: row for row in rows}
+
+    child_tables = frappe.get_meta(doctype).get_table_fields()
+    children = {}
+    for df in child_tables:
+        for child in frappe.get_all(
+            df.options,
+            fields=["*"],
+            filters={"parenttype": doctype, "parentfield": df.fieldname, "parent": ("in", names)},
+            order_by="idx asc",
+            limit_page_length=0,
+        ):
+            children.setdefault((child.parent, df.fieldname), []).append(child)
+
+    docs = {}
+    for row in rows:
+        for df in child_tables:
+            row[df.fieldname] = children.get((row.name, df.fieldname), [])
+        docs[row.name] = frappe.get_doc(dict(row, doctype=doctype))
+    return docs
+
+
+def get_condition_fields(condition):
+    """Fields of ``doc`` a condition reads, or None when it uses ``doc`` in another way.
+
+    ``doc.field``, ``doc["field"]`` and ``doc.get("field")`` are understood;
+    passing ``doc`` itself anywhere needs the whole document.
+    """
+    if not condition:
+        return set()
+    try:
+        tree = ast.parse(condition.strip(), mode="eval")
+    except SyntaxError:
+        return None
+
+    fields, understood = set(), set()
+    for node in ast.walk(tree):
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and node.func.attr == "get"
+            and _is_doc(node.func.value)
+            and node.args
+            and _is_string(node.args[0])
+        ):
+            fields.add(node.args[0].value)
+            understood.add(id(node.func.value))
+        elif isinstance(node, ast.Attribute) and _is_doc(node.value) and node.attr != "get":
+            fields.add(node.attr)
+            understood.add(id(node.value))
+        elif isinstance(node, ast.Subscript) and _is_doc(node.value) and _is_string(node.slice):
+            fields.add(node.slice.value)
+            understood.add(id(node.value))
+
+    if any(_is_doc(node) and id(node) not in understood for node in ast.walk(tree)):
+        return None
+    return fields
+
+
+# comparison operator -> (filter operator, operator with the operands swapped)
+# Only operators whose SQL result is a superset of Python's are listed.
+# ``!=``, ``not in`` and ``is not None`` are left to the Python check: frappe
+# wraps them in ifnull(), dropping NULL and "" rows that Python accepts, and
+# case-insensitive collations treat "open" and "Open" as equal.
+COMPARISON_OPERATORS = {
+    ast.Eq: ("=", "="),
+    ast.Lt: ("<", ">"),
+    ast.LtE: ("<=", ">="),
+    ast.Gt: (">", "<"),
+    ast.GtE: (">=", "<="),
+}
+
+
+def compile_condition(condition):
+    """Translate the simple parts of a condition into ``frappe.get_all`` filters.
+
+    Returns ``(filters, or_filters)`` of ``[field, operator, value]`` terms.
+    ``==``, ``in`` and ``is None`` against literals and ``<``, ``<=``, ``>``,
+    ``>=`` against numbers on doc fields are understood, joined by ``and``
+    at the top level and by ``or`` inside at most one group. Anything else
+    is left out, so the filters return a superset of the matching rows and
+    the condition must still be evaluated on each one.
+    """
+    if not condition:
+        return [], []
+    try:
+        tree = ast.parse(condition.strip(), mode="eval").body
+    except SyntaxError:
+        return [], []
+
+    terms = tree.values if isinstance(tree, ast.BoolOp) and isinstance(tree.op, ast.And) else [tree]
+    filters, or_filters = [], []
+    for term in terms:
+        if isinstance(term, ast.BoolOp) and isinstance(term.op, ast.Or):
+            if or_filters:
+                continue
+            group = [_compile_comparison(value) for value in term.values]
+            if all(group) and all(len(compiled) == 1 for compiled in group):
+                or_filters = [compiled[0] for compiled in group]
+        else:
+            filters.extend(_compile_comparison(term) or [])
+
+    return filters, or_filters
+
+
+def _compile_comparison(node):
+    """Filters equivalent to a comparison on doc fields, or None."""
+    if not isinstance(node, ast.Compare):
+        return None
+
+    compiled = []
+    left = node.left
+    for op, right in zip(node.ops, node.comparators):
+        term = _compile_operands(left, op, right)
+        if not term:
+            return None
+        compiled.append(term)
+        left = right
+    return compiled
+
+
+def _compile_operands(left, op, right):
+    field, value = _get_doc_field(left), _get_literal(right)
+    swapped = False
+    if field is None:
+        field, value, swapped = _get_doc_field(right), _get_literal(left), True
+    if field is None or value is NO_LITERAL:
+        return None
+
+    if type(op) in COMPARISON_OPERATORS:
+        operator = COMPARISON_OPERATORS[type(op)][swapped]
+        if operator == "=":
+            # "is not set" matches NULL and "", a superset of `is None`
+            return [field, "is", "not set"] if value is None else [field, operator, value]
+        if not isinstance(value, (int, float)):
+            # string ordering depends on the column's collation
+            return None
+        return [field, operator, value]
+
+    if isinstance(op, ast.Is) and value is None and not swapped:
+        return [field, "is", "not set"]
+
+    if isinstance(op, ast.In) and not swapped and isinstance(value, list):
+        return [field, "in", value]
+
+    return None
+
+
+NO_LITERAL = object()
+
+
+def _get_literal(node):
+    """Value of a literal expression, or NO_LITERAL."""
+    try:
+        value = ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return NO_LITERAL
+    if isinstance(value, (tuple, list, set, frozenset)):
+        if not all(isinstance(item, (str, int, float)) for item in value):
+            return NO_LITERAL
+        return list(value)
+    if isinstance(value, bool):
+        return int(value)
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return NO_LITERAL
+
+
+def _get_doc_field(node):
+    """Field name for ``doc.field``, ``doc["field"]`` or ``doc.get("field")``, else None."""
+    if isinstance(node, ast.Attribute) and _is_doc(node.value) and node.attr != "get":
+        return node.attr
+    if isinstance(node, ast.Subscript) and _is_doc(node.value) and _is_string(node.slice):
+        return node.slice.value
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr == "get"
+        and _is_doc(node.func.value)
+        and len(node.args) == 1
+        and not node.keywords
+        and _is_string(node.args[0])
+    ):
+        return node.args[0].value
+    return None
+
+
+def _is_doc(node):
+    return isinstance(node, ast.Name) and node.id == "doc"
+
+
+def _is_string(node):
+    return isinstance(node, ast.Constant) and isinstance(node.value, str)
 
 
 @frappe.whitelist()
@@ -481,9 +885,21 @@ def trigger_notifications(method="daily"):
 
     if method == "daily":
         doc_list = frappe.get_all(
-            "WhatsApp Notification", filters={"doctype_event": ("in", ("Days Before", "Days After")), "disabled": 0}
+            "WhatsApp Notification",
+            filters={"doctype_event": ("in", ("Days Before", "Days After")), "disabled": 0},
+            pluck="name",
         )
-        for d in doc_list:
-            alert = frappe.get_doc("WhatsApp Notification", d.name)
-            alert.get_documents_for_today()
+        # one job per notification, so a large one does not hold up the daily queue or the others
+        for name in doc_list:
+            frappe.enqueue(
+                "frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_notification.whatsapp_notification.send_notification_for_today",
+                queue="long",
+                timeout=NOTIFICATION_TIMEOUT,
+                notification=name,
+            )
+
+
+def send_notification_for_today(notification):
+    """Background job: send one Days Before/After notification."""
+    frappe.get_doc("WhatsApp Notification", notification).get_documents_for_today()
            
\ No newline at end of file
@@ -1,9 +1,265 @@
 # Copyright (c) 2025, Shridhar Patil and Contributors
 # See license.txt
 
-# import frappe
+from unittest.mock import patch
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, now_datetime
+
+from frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_recipient_list import whatsapp_recipient_list
+from frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_recipient_list.whatsapp_recipient_list import (
+	IMPORT_TIMEOUT,
+	RECIPIENT_INSERT_FIELDS,
+	build_recipients,
+	fail_stale_imports,
+	finish_import,
+	get_keyset_filters,
+	get_segment,
+	import_recipients_job,
+	is_importing,
+	iter_source_records,
+	refresh_recipients_job,
+	upsert_recipients,
+)
+
+
+def make_records(count, start=0):
+	return [
+		frappe._dict(name=f"CUST-{n:04d}", mobile_no=f"98765{n:05d}", customer_name=f"Customer {n}", city="Pune")
+		for n in range(start, start + count)
+	]
 
 
 class TestWhatsAppRecipientList(FrappeTestCase):
-	pass
+	def test_source_records_page_by_name(self):
+		records = make_records(5)
+		pages = iter([records[:2], records[2:4], records[4:]])
+		with patch.object(frappe, "get_all", side_effect=lambda *args, **kwargs: next(pages)) as get_all:
+			batches = list(iter_source_records("Customer", ["mobile_no"], {"disabled": 0}, batch_size=2))
+
+		self.assertEqual(batches, [records[:2], records[2:4], records[4:]])
+		self.assertEqual(
+			[c.kwargs["filters"] for c in get_all.call_args_list],
+			[
+				[["disabled", "=", 0]],
+				[["disabled", "=", 0], ["name", ">", "CUST-0001"]],
+				[["disabled", "=", 0], ["name", ">", "CUST-0003"]],
+			],
+		)
+
+	def test_source_records_stop_at_the_limit(self):
+		with patch.object(frappe, "get_all", side_effect=lambda *args, **kwargs: make_records(kwargs["limit"])) as get_all:
+			batches = list(iter_source_records("Customer", ["mobile_no"], limit=5, batch_size=3))
+
+		self.assertEqual([len(batch) for batch in batches], [3, 2])
+		self.assertEqual([c.kwargs["limit"] for c in get_all.call_args_list], [3, 2])
+
+	def test_build_recipients_skips_invalid_numbers(self):
+		records = make_records(3)
+		with patch.object(
+			whatsapp_recipient_list, "normalize_numbers", return_value=["919876500000", None, "919876500002"]
+		) as normalize_numbers:
+			recipients, skipped = build_recipients(records, "mobile_no", "customer_name", ["city"], "91")
+
+		normalize_numbers.assert_called_once_with([r.mobile_no for r in records], "91")
+		self.assertEqual(skipped, 1)
+		self.assertEqual(recipients, [
+			{"mobile_number": "919876500000", "recipient_data": '{"city": "Pune"}', "source_name": "CUST-0000",
+				"recipient_name": "Customer 0"},
+			{"mobile_number": "919876500002", "recipient_data": '{"city": "Pune"}', "source_name": "CUST-0002",
+				"recipient_name": "Customer 2"},
+		])
+
+	def run_import(self, batches, error=None):
+		"""Run the import job over ``batches`` with the database mocked, returning the mocks."""
+		mocks = frappe._dict()
+		with (
+			patch.object(frappe.db, "count", return_value=sum(len(batch) for batch in batches)),
+			patch.object(frappe.db, "commit"),
+			patch.object(frappe.db, "rollback") as mocks.rollback,
+			patch.object(frappe.db, "bulk_insert", side_effect=error) as mocks.bulk_insert,
+			patch.object(frappe, "publish_progress"),
+			patch.object(frappe, "publish_realtime"),
+			patch.object(whatsapp_recipient_list, "start_import", return_value="import-a"),
+			patch.object(whatsapp_recipient_list, "finish_import") as mocks.finish_import,
+			patch.object(whatsapp_recipient_list, "fail_import") as mocks.fail_import,
+			patch.object(whatsapp_recipient_list, "get_default_country_code", return_value="91"),
+			patch.object(whatsapp_recipient_list, "iter_source_records", return_value=iter(batches)),
+		):
+			args = ("List", "Customer", "mobile_no", "customer_name")
+			if error:
+				self.assertRaises(error, import_recipients_job, *args)
+			else:
+				mocks.imported = import_recipients_job(*args)
+		return mocks
+
+	def test_import_stages_one_insert_per_batch(self):
+		mocks = self.run_import([make_records(2), make_records(1, start=2)])
+
+		self.assertEqual(mocks.imported, 3)
+		self.assertEqual(mocks.bulk_insert.call_count, 2)
+		parent, idx = RECIPIENT_INSERT_FIELDS.index("parent"), RECIPIENT_INSERT_FIELDS.index("idx")
+		self.assertEqual(
+			[(row[parent], row[idx]) for c in mocks.bulk_insert.call_args_list for row in c.args[2]],
+			[("import-a", 1), ("import-a", 2), ("import-a", 3)],
+		)
+		self.assertEqual(mocks.finish_import.call_args.args[:2], ("List", "import-a"))
+		mocks.fail_import.assert_not_called()
+
+	def test_failed_import_drops_staged_rows(self):
+		mocks = self.run_import([make_records(2)], error=frappe.ValidationError)
+
+		mocks.rollback.assert_called_once()
+		mocks.fail_import.assert_called_once_with("List", "import-a")
+		mocks.finish_import.assert_not_called()
+
+	def test_keyset_filters_accept_every_filter_shape(self):
+		self.assertEqual(get_keyset_filters(None), [])
+		self.assertEqual(get_keyset_filters(" "), [])
+		self.assertEqual(
+			get_keyset_filters({"disabled": 0, "territory": ["in", ["India"]]}),
+			[["disabled", "=", 0], ["territory", "in", ["India"]]],
+		)
+		self.assertEqual(get_keyset_filters('[["disabled", "=", 0]]'), [["disabled", "=", 0]])
+
+	def test_upsert_updates_by_source_name_and_appends_new(self):
+		recipients = [
+			{"mobile_number": "919876500000", "recipient_data": "{}", "source_name": "CUST-0000"},
+			{"mobile_number": "919876500001", "recipient_data": "{}", "source_name": "CUST-0001"},
+		]
+		with (
+			patch.object(frappe, "get_all", return_value=[("CUST-0000", "row-1")]),
+			patch.object(frappe.db, "sql", return_value=[[7]]),
+			patch.object(frappe.db, "set_value") as set_value,
+			patch.object(frappe.db, "bulk_insert") as bulk_insert,
+		):
+			self.assertEqual(upsert_recipients("List", recipients), (1, 1))
+
+		set_value.assert_called_once_with(
+			"WhatsApp Recipient",
+			"row-1",
+			{"mobile_number": "919876500000", "recipient_name": None, "recipient_data": "{}"},
+		)
+		(row,) = bulk_insert.call_args.args[2]
+		self.assertEqual(row[RECIPIENT_INSERT_FIELDS.index("idx")], 8)
+		self.assertEqual(row[RECIPIENT_INSERT_FIELDS.index("source_name")], "CUST-0001")
+
+	def run_refresh(self, settings):
+		"""Refresh a list with the source and database mocked, returning the mocks."""
+		changed = make_records(2)
+		changed[1].mobile_no = ""
+		mocks = frappe._dict()
+		with (
+			patch.object(frappe.db, "get_value", return_value=frappe._dict(settings)),
+			patch.object(frappe.db, "set_value") as mocks.set_value,
+			patch.object(frappe.db, "commit"),
+			patch.object(frappe, "get_all", return_value=["CUST-0009"]),
+			patch.object(frappe, "publish_realtime"),
+			patch.object(whatsapp_recipient_list, "get_default_country_code", return_value="91"),
+			patch.object(
+				whatsapp_recipient_list, "iter_source_records", side_effect=lambda *args: iter([changed])
+			) as mocks.iter_source_records,
+			patch.object(whatsapp_recipient_list, "upsert_recipients", return_value=(1, 0)) as mocks.upsert_recipients,
+			patch.object(whatsapp_recipient_list, "delete_recipients", return_value=2) as mocks.delete_recipients,
+			patch.object(whatsapp_recipient_list, "import_recipients_job") as mocks.import_recipients_job,
+		):
+			mocks.result = refresh_recipients_job("List")
+		return mocks
+
+	def test_refresh_applies_changes_since_the_watermark(self):
+		mocks = self.run_refresh({
+			"doctype_to_import": "Customer", "mobile_field": "mobile_no", "import_filters": '{"disabled": 0}',
+			"last_import_watermark": "2026-01-01 00:00:00",
+		})
+
+		mocks.import_recipients_job.assert_not_called()
+		self.assertEqual(
+			mocks.iter_source_records.call_args_list[0].args[2],
+			[["disabled", "=", 0], ["modified", ">", "2026-01-01 00:00:00"]],
+		)
+		(recipients,) = [c.args[1] for c in mocks.upsert_recipients.call_args_list]
+		self.assertEqual([r["source_name"] for r in recipients], ["CUST-0000"])
+		# the record that lost its number and the deleted one are removed
+		mocks.delete_recipients.assert_called_once_with("List", ["CUST-0001", "CUST-0009"])
+		self.assertEqual(mocks.set_value.call_args.args[:3], ("WhatsApp Recipient List", "List", "last_import_watermark"))
+		self.assertEqual(mocks.result, 3)
+
+	def test_refresh_without_watermark_imports_in_full(self):
+		for settings in (
+			{"doctype_to_import": "Customer", "mobile_field": "mobile_no"},
+			{"doctype_to_import": "Customer", "mobile_field": "mobile_no", "import_limit": 100,
+				"last_import_watermark": "2026-01-01 00:00:00"},
+		):
+			mocks = self.run_refresh(settings)
+			mocks.import_recipients_job.assert_called_once()
+			mocks.upsert_recipients.assert_not_called()
+
+	def test_get_segment_only_for_dynamic_segments(self):
+		segment = frappe._dict(
+			list_type="Dynamic Segment", doctype_to_import="Customer", mobile_field="mobile_no",
+			name_field=None, import_filters='{"disabled": 0}', data_fields='["city"]',
+		)
+		with patch.object(frappe.db, "get_value", return_value=segment):
+			self.assertEqual(get_segment("Segment"), {
+				"doctype": "Customer",
+				"mobile_field": "mobile_no",
+				"name_field": None,
+				"filters": [["disabled", "=", 0]],
+				"data_fields": ["city"],
+			})
+
+		with patch.object(frappe.db, "get_value", return_value=frappe._dict(list_type="Static")):
+			self.assertIsNone(get_segment("List"))
+
+	def test_is_importing_expires_with_the_job_timeout(self):
+		started = {
+			"running": add_to_date(now_datetime(), seconds=-60),
+			"stale": add_to_date(now_datetime(), seconds=-IMPORT_TIMEOUT - 60),
+		}
+
+		def get_value(doctype, name, fields):
+			if name == "done":
+				return ("Completed", started["running"])
+			if name == "unknown":
+				return ("Importing", None)
+			return ("Importing", started[name])
+
+		with patch.object(frappe.db, "get_value", side_effect=get_value):
+			self.assertTrue(is_importing("running"))
+			self.assertFalse(is_importing("stale"))
+			self.assertFalse(is_importing("unknown"))
+			self.assertFalse(is_importing("done"))
+
+	def test_fail_stale_imports(self):
+		lists = [
+			frappe._dict(name="running", import_staging="import-a"),
+			frappe._dict(name="stale", import_staging="import-b"),
+		]
+		with (
+			patch.object(frappe, "get_all", return_value=lists),
+			patch.object(whatsapp_recipient_list, "is_importing", side_effect=lambda name: name == "running"),
+			patch.object(whatsapp_recipient_list, "fail_import") as fail_import,
+		):
+			fail_stale_imports()
+
+		fail_import.assert_called_once_with("stale", "import-b")
+
+	def test_finish_import_swaps_staged_rows(self):
+		with (
+			patch.object(frappe.db, "delete") as delete,
+			patch.object(frappe.db, "set_value") as set_value,
+			patch.object(frappe.db, "commit") as commit,
+		):
+			finish_import("List", "import-a", {"modified": "2026-01-01 00:00:00"})
+
+		delete.assert_called_once_with("WhatsApp Recipient", {"parenttype": "WhatsApp Recipient List", "parent": "List"})
+		self.assertEqual(
+			set_value.call_args_list[0].args,
+			("WhatsApp Recipient", {"parenttype": "WhatsApp Recipient List", "parent": "import-a"}, "parent", "List"),
+		)
+		self.assertEqual(
+			set_value.call_args_list[1].args[2],
+			{"import_status": "Completed", "import_staging": None, "modified": "2026-01-01 00:00:00"},
+		)
+		commit.assert_called_once()
@@ -1,4 +1,23 @@
 frappe.ui.form.on('WhatsApp Recipient List', {
+    setup: function(frm) {
+        frappe.realtime.on('whatsapp_recipient_import', function(data) {
+            if(data.list_name === frm.doc.name) {
+                let message = __(`${data.count} recipients imported successfully`);
+                if(data.updated || data.removed) {
+                    message += '<br>' + __(`${data.updated || 0} updated, ${data.removed || 0} removed`);
+                }
+                if(data.duplicates) {
+                    message += '<br>' + __(`${data.duplicates} duplicate numbers skipped`);
+                }
+                if(data.skipped) {
+                    message += '<br>' + __(`${data.skipped} records skipped for a missing or invalid mobile number`);
+                }
+                frappe.msgprint(message);
+                frm.reload_doc();
+            }
+        });
+    },
+
     refresh: function(frm) {
         frm.fields_dict.import_button.onclick = function() {
             if(!frm.doc.doctype_to_import || !frm.doc.mobile_field) {
@@ -28,14 +47,59 @@ frappe.ui.form.on('WhatsApp Recipient List', {
                     data_fields: frm.doc.data_fields
                 },
                 callback: function(r) {
-                    if(r.message) {
-                        frappe.msgprint(__(`${r.message} recipients imported successfully`));
-                        frm.reload_doc();
+                    if(!r.exc) {
+                        frappe.show_alert({
+                            message: __('Import queued, the list will reload when it finishes'),
+                            indicator: 'blue'
+                        });
                     }
                 }
             });
         };
         
+        frm.fields_dict.import_file_button.onclick = function() {
+            if(!frm.doc.import_file || !frm.doc.file_mobile_column) {
+                frappe.throw(__('Please attach a file and set the Mobile Number Column before importing'));
+                return;
+            }
+
+            frappe.call({
+                method: 'frappe_whatsapp.utils.bulk_messaging.import_recipients_from_file',
+                args: {
+                    list_name: frm.doc.name,
+                    file_url: frm.doc.import_file,
+                    mobile_column: frm.doc.file_mobile_column,
+                    name_column: frm.doc.file_name_column,
+                    data_columns: frm.doc.file_data_columns
+                },
+                callback: function(r) {
+                    if(!r.exc) {
+                        frappe.show_alert({
+                            message: __('Import queued, the list will reload when it finishes'),
+                            indicator: 'blue'
+                        });
+                    }
+                }
+            });
+        };
+
+        if(frm.doc.import_from_doctype && frm.doc.last_import_watermark) {
+            frm.add_custom_button(__('Refresh Recipients'), function() {
+                frappe.call({
+                    method: 'frappe_whatsapp.utils.bulk_messaging.refresh_recipients',
+                    args: {list_name: frm.doc.name},
+                    callback: function(r) {
+                        if(!r.exc) {
+                            frappe.show_alert({
+                                message: __('Refresh queued, the list will reload when it finishes'),
+                                indicator: 'blue'
+                            });
+                        }
+                    }
+                });
+            });
+        }
+
         // Add a button to add a test recipient
         frm.add_custom_button(__('Add Test Recipient'), function() {
             let d = new frappe.ui.Dialog({
@@ -2,6 +2,18 @@ import frappe
 import json
 from frappe import _
 from frappe.model.document import Document
+from frappe.utils import add_to_date, cint, get_datetime, now, now_datetime
+
+from frappe_whatsapp.utils.phone import get_default_country_code, normalize_numbers
+
+IMPORT_BATCH_SIZE = 5000
+IMPORT_TIMEOUT = 4 * 60 * 60
+RECIPIENT_INSERT_FIELDS = [
+	"name", "creation", "modified", "owner", "modified_by", "docstatus",
+	"parent", "parenttype", "parentfield", "idx",
+	"mobile_number", "recipient_name", "recipient_data", "source_name",
+]
+RECIPIENT_UPDATE_FIELDS = ("mobile_number", "recipient_name", "recipient_data")
 
 
 class WhatsAppRecipientList(Document):
@@ -9,71 +21,438 @@ class WhatsAppRecipientList(Document):
 		self.validate_recipients()
 	
 	def validate_recipients(self):
+		if self.list_type == "Dynamic Segment":
+			if not self.doctype_to_import or not self.mobile_field:
+				frappe.throw(_("A Dynamic Segment needs a DocType and a Mobile Number Field"))
+			self.recipients = []
+			return
+
 		if not self.is_new():
 			if not self.recipients:
 				frappe.throw(_("At least one recipient is required"))
 	
-	def import_list_from_doctype(self, doctype, mobile_field, name_field=None, filters=None, limit=None, data_fields=None):
-		"""Import recipients from another DocType"""
+	def set_import_settings(self, doctype, mobile_field, name_field=None, filters=None, limit=None, data_fields=None):
 		self.doctype_to_import = doctype
 		self.mobile_field = mobile_field
 		self.filters = filters
+		if filters:
+			self.import_filters = filters if isinstance(filters, str) else json.dumps(filters)
+		if name_field:
+			self.name_field = name_field
 		if data_fields:
 			self.data_fields = json.dumps(data_fields)
-
 		if limit:
 			self.import_limit = limit
 
-		fields = [mobile_field]
-		if name_field:
-			fields.append(name_field)
-		if data_fields:
-			meta = frappe.get_meta(doctype)
-			# print(meta.fields)
-			for field in meta.fields:
-				if field.fieldname not in fields and field.fieldname in data_fields:
-					fields.append(field.fieldname)
-		# Get records from the doctype
+	def enqueue_import(self, doctype, mobile_field, name_field=None, filters=None, limit=None, data_fields=None):
+		"""Import recipients from another DocType in a background job."""
+		self.set_import_settings(doctype, mobile_field, name_field, filters, limit, data_fields)
+		self.db_update()
+
+		frappe.enqueue(
+			"frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_recipient_list.whatsapp_recipient_list.import_recipients_job",
+			queue="long",
+			timeout=IMPORT_TIMEOUT,
+			enqueue_after_commit=True,
+			list_name=self.name,
+			doctype=doctype,
+			mobile_field=mobile_field,
+			name_field=name_field,
+			filters=filters,
+			limit=limit,
+			data_fields=data_fields,
+		)
+
+	def enqueue_refresh(self):
+		"""Apply source changes since the last import in a background job."""
+		enqueue_refresh_job(self.name)
+
+
+def get_import_fields(doctype, mobile_field, name_field=None, data_fields=None):
+	"""Fields to read from the source DocType."""
+	fields = [mobile_field]
+	if name_field:
+		fields.append(name_field)
+	if data_fields:
+		meta = frappe.get_meta(doctype)
+		for field in meta.fields:
+			if field.fieldname not in fields and field.fieldname in data_fields:
+				fields.append(field.fieldname)
+	return fields
+
+
+def get_keyset_filters(filters):
+	"""Filters as a list, so a keyset condition on name can be added."""
+	if isinstance(filters, str):
+		filters = json.loads(filters) if filters.strip() else None
+	if isinstance(filters, dict):
+		return [
+			[key, *value] if isinstance(value, (list, tuple)) else [key, "=", value]
+			for key, value in filters.items()
+		]
+	return list(filters or [])
+
+
+def iter_source_records(doctype, fields, filters=None, limit=None, batch_size=IMPORT_BATCH_SIZE):
+	"""Yield batches of source records, paging by name instead of offset."""
+	filters = get_keyset_filters(filters)
+	remaining = cint(limit) or None
+	last_name = None
+
+	while remaining is None or remaining > 0:
+		page_size = min(batch_size, remaining) if remaining else batch_size
 		records = frappe.get_all(
 			doctype,
-			filters=filters,
-			fields=fields,
-			limit=limit
+			filters=filters + ([["name", ">", last_name]] if last_name else []),
+			fields=["name", *fields],
+			order_by="name asc",
+			limit=page_size,
 		)
-		
-		# Clear existing recipients
-		self.recipients = []
-		
-		# Add recipients
-		for record in records:
-			if not record.get(mobile_field):
-				continue
-				
-			# Format mobile number
-			mobile = record.get(mobile_field)
-			# Remove any non-numeric characters except '+'
-			mobile = ''.join(char for char in mobile if char.isdigit() or char == '+')
-			
-			if not mobile:
-				continue
-
-			recipient_data = {}
-			if data_fields:
-				for field in data_fields:
-					if record.get(field):
-						# Use field name as the variable name in recipient data
-						variable_name = field.lower().replace(" ", "_")
-						recipient_data[variable_name] = record.get(field)
-
-				
-			recipient = {
-				"mobile_number": mobile,
-				"recipient_data": json.dumps(recipient_data)
-			}
-			
-			if name_field and record.get(name_field):
-				recipient["recipient_name"] = record.get(name_field)
-				
-			self.append("recipients", recipient)
-		
-		return len(self.recipients)
\ No newline at end of file
+		if not records:
+			return
+
+		yield records
+
+		last_name = records[-1].name
+		if remaining:
+			remaining -= len(records)
+		if len(records) < page_size:
+			return
+
+
+def build_recipients(records, mobile_field, name_field=None, data_fields=None, country_code=""):
+	"""Build WhatsApp Recipient rows from source records.
+
+	Numbers are normalized for the whole batch at once. Returns the rows and
+	the number of records skipped for a missing or invalid number.
+	"""
+	numbers = normalize_numbers([record.get(mobile_field) for record in records], country_code)
+	recipients = []
+	for record, mobile in zip(records, numbers):
+		if not mobile:
+			continue
+
+		recipient = {
+			"mobile_number": mobile,
+			"recipient_data": json.dumps(get_recipient_data(record, data_fields), default=str),
+			"source_name": record.get("name"),
+		}
+
+		if name_field and record.get(name_field):
+			recipient["recipient_name"] = record.get(name_field)
+
+		recipients.append(recipient)
+
+	return recipients, len(records) - len(recipients)
+
+
+def get_recipient_data(record, data_fields=None):
+	"""Message variables of a recipient, taken from the source record."""
+	recipient_data = {}
+	if data_fields:
+		for field in data_fields:
+			if record.get(field):
+				# Use field name as the variable name in recipient data
+				variable_name = field.lower().replace(" ", "_")
+				recipient_data[variable_name] = record.get(field)
+	return recipient_data
+
+
+def get_segment(list_name):
+	"""Source settings of a Dynamic Segment list, or None for a static list."""
+	segment = frappe.db.get_value(
+		"WhatsApp Recipient List",
+		list_name,
+		["list_type", "doctype_to_import", "mobile_field", "name_field", "import_filters", "data_fields"],
+		as_dict=True,
+	)
+	if not segment or segment.list_type != "Dynamic Segment":
+		return None
+
+	return {
+		"doctype": segment.doctype_to_import,
+		"mobile_field": segment.mobile_field,
+		"name_field": segment.name_field,
+		"filters": get_keyset_filters(segment.import_filters),
+		"data_fields": json.loads(segment.data_fields) if segment.data_fields else None,
+	}
+
+
+def count_segment(segment):
+	return frappe.db.count(segment["doctype"], segment["filters"])
+
+
+def start_import(list_name):
+	"""Mark a list as Importing and return the parent its new rows are staged under.
+
+	Staged rows are invisible to the list and its campaigns until
+	``finish_import`` swaps them in, so a failed import leaves the previous
+	recipients untouched.
+	"""
+	staging = f"import-{frappe.generate_hash(length=10)}"
+	frappe.db.set_value(
+		"WhatsApp Recipient List",
+		list_name,
+		{"import_status": "Importing", "import_started_at": now(), "import_staging": staging},
+		update_modified=False,
+	)
+	frappe.db.commit()
+	return staging
+
+
+def finish_import(list_name, staging, values=None):
+	"""Replace the recipients of a list with the rows staged under ``staging``, in one transaction."""
+	frappe.db.delete("WhatsApp Recipient", {"parenttype": "WhatsApp Recipient List", "parent": list_name})
+	frappe.db.set_value(
+		"WhatsApp Recipient",
+		{"parenttype": "WhatsApp Recipient List", "parent": staging},
+		"parent",
+		list_name,
+		update_modified=False,
+	)
+	frappe.db.set_value(
+		"WhatsApp Recipient List",
+		list_name,
+		{"import_status": "Completed", "import_staging": None, **(values or {})},
+	)
+	frappe.db.commit()
+
+
+def fail_import(list_name, staging):
+	"""Drop the rows staged by a failed import and mark the list Failed."""
+	if staging:
+		frappe.db.delete("WhatsApp Recipient", {"parenttype": "WhatsApp Recipient List", "parent": staging})
+	frappe.db.set_value(
+		"WhatsApp Recipient List",
+		list_name,
+		{"import_status": "Failed", "import_staging": None},
+		update_modified=False,
+	)
+	frappe.db.commit()
+
+
+def is_importing(list_name):
+	"""Whether an import of the list is running; one older than the job timeout is not."""
+	status, started_at = frappe.db.get_value(
+		"WhatsApp Recipient List", list_name, ["import_status", "import_started_at"]
+	) or (None, None)
+	return (
+		status == "Importing"
+		and bool(started_at)
+		and get_datetime(started_at) > add_to_date(now_datetime(), seconds=-IMPORT_TIMEOUT)
+	)
+
+
+def fail_stale_imports():
+	"""Hourly: mark imports whose job was killed or timed out as Failed and drop their staged rows."""
+	for row in frappe.get_all(
+		"WhatsApp Recipient List",
+		filters={"import_status": "Importing"},
+		fields=["name", "import_staging"],
+	):
+		if not is_importing(row.name):
+			fail_import(row.name, row.import_staging)
+
+
+def import_recipients_job(list_name, doctype, mobile_field, name_field=None, filters=None, limit=None, data_fields=None):
+	"""Background job: replace the recipients of a list with records of another DocType.
+
+	Pages through the source by name and writes each batch with one
+	multi-row INSERT, so memory use does not grow with the size of the list.
+	Batches are staged and replace the recipients only once the whole
+	source has been read.
+	"""
+	watermark = now()
+	total = frappe.db.count(doctype, get_keyset_filters(filters))
+	if limit:
+		total = min(total, cint(limit))
+
+	staging = start_import(list_name)
+	try:
+		fields = get_import_fields(doctype, mobile_field, name_field, data_fields)
+		country_code = get_default_country_code()
+		imported = scanned = skipped = 0
+		for records in iter_source_records(doctype, fields, filters, limit):
+			scanned += len(records)
+			recipients, invalid = build_recipients(records, mobile_field, name_field, data_fields, country_code)
+			skipped += invalid
+			rows = []
+			for recipient in recipients:
+				imported += 1
+				rows.append(get_recipient_row(staging, imported, recipient))
+
+			if rows:
+				frappe.db.bulk_insert("WhatsApp Recipient", RECIPIENT_INSERT_FIELDS, rows)
+			frappe.db.commit()
+
+			frappe.publish_progress(
+				scanned * 100 / total if total else 100,
+				title=_("Importing Recipients"),
+				doctype="WhatsApp Recipient List",
+				docname=list_name,
+				description=_("{0} of {1} records processed").format(scanned, total),
+			)
+
+		finish_import(list_name, staging, {"last_import_watermark": watermark})
+	except Exception:
+		frappe.db.rollback()
+		fail_import(list_name, staging)
+		raise
+
+	frappe.publish_realtime(
+		"whatsapp_recipient_import",
+		{"list_name": list_name, "count": imported, "skipped": skipped},
+		doctype="WhatsApp Recipient List",
+		docname=list_name,
+	)
+	return imported
+
+
+def get_recipient_row(list_name, idx, recipient):
+	"""Values for RECIPIENT_INSERT_FIELDS."""
+	timestamp, user = now(), frappe.session.user
+	return (
+		frappe.generate_hash(length=10), timestamp, timestamp, user, user, 0,
+		list_name, "WhatsApp Recipient List", "recipients", idx,
+		recipient["mobile_number"], recipient.get("recipient_name"), recipient["recipient_data"],
+		recipient.get("source_name"),
+	)
+
+
+def refresh_recipients_job(list_name):
+	"""Background job: apply changes made to the source records since the last import.
+
+	Only records modified after the list's watermark are read. They are
+	updated or added by source document name, and recipients whose record no
+	longer matches the filters, lost its number or was deleted are removed.
+	Lists without a watermark, or with an import limit, are imported in full.
+	"""
+	settings = frappe.db.get_value(
+		"WhatsApp Recipient List",
+		list_name,
+		["doctype_to_import", "mobile_field", "name_field", "import_filters", "data_fields",
+			"import_limit", "last_import_watermark"],
+		as_dict=True,
+	)
+	data_fields = json.loads(settings.data_fields) if settings.data_fields else None
+	filters = get_keyset_filters(settings.import_filters)
+	if not settings.last_import_watermark or cint(settings.import_limit):
+		return import_recipients_job(
+			list_name, settings.doctype_to_import, settings.mobile_field, settings.name_field,
+			filters, settings.import_limit, data_fields,
+		)
+
+	doctype, since, watermark = settings.doctype_to_import, settings.last_import_watermark, now()
+	fields = get_import_fields(doctype, settings.mobile_field, settings.name_field, data_fields)
+	country_code = get_default_country_code()
+
+	kept, updated, added = set(), 0, 0
+	for records in iter_source_records(doctype, fields, filters + [["modified", ">", since]]):
+		recipients, _skipped = build_recipients(
+			records, settings.mobile_field, settings.name_field, data_fields, country_code
+		)
+		batch_updated, batch_added = upsert_recipients(list_name, recipients)
+		updated += batch_updated
+		added += batch_added
+		kept.update(recipient["source_name"] for recipient in recipients)
+		frappe.db.commit()
+
+	# changed records that are no longer in the list, and deleted ones
+	stale = [
+		record.name
+		for records in iter_source_records(doctype, [], [["modified", ">", since]])
+		for record in records
+		if record.name not in kept
+	]
+	stale += frappe.get_all(
+		"Deleted Document",
+		filters={"deleted_doctype": doctype, "creation": [">", since]},
+		pluck="deleted_name",
+	)
+	removed = delete_recipients(list_name, stale)
+
+	frappe.db.set_value("WhatsApp Recipient List", list_name, "last_import_watermark", watermark)
+	frappe.db.commit()
+	frappe.publish_realtime(
+		"whatsapp_recipient_import",
+		{"list_name": list_name, "count": added, "updated": updated, "removed": removed},
+		doctype="WhatsApp Recipient List",
+		docname=list_name,
+	)
+	return added + updated + removed
+
+
+def upsert_recipients(list_name, recipients):
+	"""Update recipients by source document name and add the new ones.
+
+	Returns ``(updated, added)``.
+	"""
+	if not recipients:
+		return 0, 0
+
+	existing = dict(frappe.get_all(
+		"WhatsApp Recipient",
+		filters={
+			"parenttype": "WhatsApp Recipient List",
+			"parent": list_name,
+			"source_name": ["in", [recipient["source_name"] for recipient in recipients]],
+		},
+		fields=["source_name", "name"],
+		as_list=True,
+	))
+	idx = cint(frappe.db.sql(
+		"""SELECT MAX(idx) FROM `tabWhatsApp Recipient`
+		WHERE parenttype = 'WhatsApp Recipient List' AND parent = %s""",
+		list_name,
+	)[0][0])
+
+	rows = []
+	for recipient in recipients:
+		name = existing.get(recipient["source_name"])
+		if name:
+			frappe.db.set_value(
+				"WhatsApp Recipient",
+				name,
+				{field: recipient.get(field) for field in RECIPIENT_UPDATE_FIELDS},
+			)
+		else:
+			idx += 1
+			rows.append(get_recipient_row(list_name, idx, recipient))
+
+	if rows:
+		frappe.db.bulk_insert("WhatsApp Recipient", RECIPIENT_INSERT_FIELDS, rows)
+	return len(recipients) - len(rows), len(rows)
+
+
+def delete_recipients(list_name, source_names):
+	"""Remove the recipients imported from the given source documents."""
+	removed = 0
+	for start in range(0, len(source_names), IMPORT_BATCH_SIZE):
+		filters = {
+			"parenttype": "WhatsApp Recipient List",
+			"parent": list_name,
+			"source_name": ["in", source_names[start:start + IMPORT_BATCH_SIZE]],
+		}
+		removed += frappe.db.count("WhatsApp Recipient", filters)
+		frappe.db.delete("WhatsApp Recipient", filters)
+	return removed
+
+
+def refresh_recipient_lists():
+	"""Daily: queue a refresh of every list marked Refresh Nightly."""
+	for name in frappe.get_all(
+		"WhatsApp Recipient List",
+		filters={"auto_refresh": 1, "import_from_doctype": 1},
+		pluck="name",
+	):
+		enqueue_refresh_job(name)
+
+
+def enqueue_refresh_job(list_name):
+	frappe.enqueue(
+		"frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_recipient_list.whatsapp_recipient_list.refresh_recipients_job",
+		queue="long",
+		timeout=IMPORT_TIMEOUT,
+		enqueue_after_commit=True,
+		list_name=list_name,
+	)
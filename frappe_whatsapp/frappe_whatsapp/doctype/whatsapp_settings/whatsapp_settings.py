@@ -1,8 +1,13 @@
 # Copyright (c) 2022, Shridhar Patil and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
 class WhatsAppSettings(Document):
-	pass
+	def validate(self):
+		seen = set()
+		for row in self.get("sender_numbers") or []:
+			if row.phone_id in seen:
+				frappe.throw(f"Row {row.idx}: Phone ID {row.phone_id} is already in the sender pool")
+			seen.add(row.phone_id)
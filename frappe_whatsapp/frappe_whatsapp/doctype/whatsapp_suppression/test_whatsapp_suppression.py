@@ -0,0 +1,92 @@
+# Copyright (c) 2026, Shridhar Patil and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_suppression import whatsapp_suppression
+from frappe_whatsapp.utils import suppression
+from frappe_whatsapp.utils.suppression import BloomFilter
+
+
+def make_cache(members=(), execute=None):
+	cache = MagicMock()
+	cache.make_key.side_effect = lambda key: key
+	cache.smembers.return_value = {number.encode() for number in members}
+	if execute is not None:
+		cache.pipeline.return_value.execute.return_value = execute
+	return cache
+
+
+class TestWhatsAppSuppression(UnitTestCase):
+	def test_bloom_filter_has_no_false_negatives(self):
+		numbers = [str(919800000000 + i) for i in range(2000)]
+		bloom = BloomFilter(numbers)
+		self.assertTrue(all(number in bloom for number in numbers))
+
+	def test_bloom_filter_false_positive_rate(self):
+		bloom = BloomFilter(str(919800000000 + i) for i in range(2000))
+		false_positives = sum(str(14150000000 + i) in bloom for i in range(10000))
+		self.assertLess(false_positives, 300)
+
+	def tearDown(self):
+		suppression._filters.clear()
+
+	def test_suppression_reaches_redis_after_commit(self):
+		callbacks = []
+		doc = frappe._dict(mobile_number="919876543210")
+		with (
+			patch.object(frappe.db, "after_commit", MagicMock(add=callbacks.append), create=True),
+			patch.object(whatsapp_suppression, "add_to_cache") as add_to_cache,
+		):
+			whatsapp_suppression.WhatsAppSuppression.after_insert(doc)
+			add_to_cache.assert_not_called()
+
+			for callback in callbacks:
+				callback()
+		add_to_cache.assert_called_once_with("919876543210")
+
+	def test_version_change_rereads_redis_set(self):
+		cache = make_cache(["919876543210"])
+		with (
+			patch.object(frappe, "cache", return_value=cache),
+			patch.object(suppression, "get_version", return_value="v2"),
+			patch.object(frappe, "get_all") as get_all,
+		):
+			bloom = suppression.get_filter()
+
+		get_all.assert_not_called()
+		self.assertIn("919876543210", bloom)
+
+	def test_lost_redis_set_is_loaded_without_deleting(self):
+		cache = make_cache()
+		pipe = cache.pipeline.return_value
+		with (
+			patch.object(frappe, "cache", return_value=cache),
+			patch.object(suppression, "get_version", return_value=None),
+			patch.object(frappe, "get_all", return_value=["919876543210"]),
+		):
+			bloom = suppression.get_filter()
+
+		self.assertIn("919876543210", bloom)
+		pipe.sadd.assert_called_once_with(suppression.SUPPRESSED_KEY, "919876543210")
+		pipe.delete.assert_not_called()
+
+	def test_is_suppressed_confirms_bloom_hits(self):
+		number = "919876543210"
+		suppression._filters[frappe.local.site] = {
+			"filter": BloomFilter([number]), "version": "v1", "checked_at": float("inf"),
+		}
+		with patch.object(suppression, "format_number", side_effect=lambda value: value):
+			with patch.object(frappe, "cache", return_value=make_cache(execute=[True, True])):
+				self.assertTrue(suppression.is_suppressed(number))
+			with patch.object(frappe, "cache", return_value=make_cache(execute=[False, True])):
+				self.assertFalse(suppression.is_suppressed(number))
+			# set evicted from Redis: the database decides
+			with (
+				patch.object(frappe, "cache", return_value=make_cache(execute=[False, False])),
+				patch.object(frappe, "get_all", return_value=[number]),
+			):
+				self.assertTrue(suppression.is_suppressed(number))
@@ -0,0 +1,23 @@
+# Copyright (c) 2026, Shridhar Patil and contributors
+# For license information, please see license.txt
+
+from functools import partial
+
+import frappe
+from frappe.model.document import Document
+
+from frappe_whatsapp.utils.phone import format_number
+from frappe_whatsapp.utils.suppression import add_to_cache, remove_from_cache
+
+
+class WhatsAppSuppression(Document):
+	def autoname(self):
+		self.mobile_number = format_number(self.mobile_number) or self.mobile_number
+		self.name = self.mobile_number
+
+	def after_insert(self):
+		# other processes reload from Redis, so only publish committed suppressions
+		frappe.db.after_commit.add(partial(add_to_cache, self.mobile_number))
+
+	def on_trash(self):
+		frappe.db.after_commit.add(partial(remove_from_cache, self.mobile_number))
@@ -1,9 +1,218 @@
 # Copyright (c) 2022, Shridhar Patil and Contributors
 # See license.txt
 
-# import frappe
+import os
+import tempfile
+from contextlib import ExitStack
+from unittest.mock import MagicMock, patch
+
+import frappe
+import requests
 from frappe.tests import UnitTestCase
 
+from frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_templates import whatsapp_templates
+from frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_templates.whatsapp_templates import (
+	MEDIA_HANDLE_TTL,
+	fetch,
+	get_file_hash,
+	get_media_handle_cache_key,
+	get_template_hash,
+	iter_template_pages,
+	upload_resumable,
+)
+
+
+def meta_template(name, text="Hello {{1}}"):
+	return {
+		"name": name,
+		"id": f"id-{name}",
+		"status": "APPROVED",
+		"language": "en",
+		"category": "UTILITY",
+		"components": [{"type": "BODY", "text": text}],
+	}
+
 
 class TestWhatsAppTemplates(UnitTestCase):
-	pass
+	def test_upload_stops_when_offset_stalls(self):
+		response = MagicMock()
+		response.json.return_value = {"file_offset": 0}
+
+		with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as file:
+			file.write(b"x" * 10)
+		try:
+			with (
+				patch("requests.post", return_value=response) as post,
+				patch("time.sleep"),
+			):
+				self.assertRaises(
+					frappe.ValidationError, upload_resumable, "https://example.com/upload", file.name, "token",
+					chunk_size=4, max_retries=2,
+				)
+			self.assertEqual(post.call_count, 3)
+		finally:
+			os.unlink(file.name)
+
+	def test_upload_sends_chunks_from_reported_offset(self):
+		offsets = iter([{"file_offset": 4}, {"file_offset": 8}, {"h": "handle"}])
+		response = MagicMock()
+		response.json.side_effect = lambda: next(offsets)
+
+		with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as file:
+			file.write(b"x" * 10)
+		try:
+			with patch("requests.post", return_value=response) as post:
+				self.assertEqual(upload_resumable("https://example.com/upload", file.name, "token", chunk_size=4), "handle")
+			self.assertEqual(
+				[call.kwargs["headers"]["file_offset"] for call in post.call_args_list], ["0", "4", "8"]
+			)
+		finally:
+			os.unlink(file.name)
+
+	def test_template_pages_follow_paging_next(self):
+		pages = {
+			"https://graph/v17.0/waba/message_templates?limit=250": {
+				"data": [meta_template("a")], "paging": {"next": "https://graph/page2"},
+			},
+			"https://graph/page2": {"data": [meta_template("b")], "paging": {}},
+		}
+		with patch.object(whatsapp_templates, "make_request", side_effect=lambda method, url, headers: pages[url]):
+			result = list(iter_template_pages("https://graph/v17.0/waba/message_templates", {}))
+
+		self.assertEqual([[t["name"] for t in page] for page in result], [["a"], ["b"]])
+
+	def test_fetch_only_saves_changed_templates(self):
+		unchanged, changed, new = meta_template("unchanged"), meta_template("changed", "Hi {{1}}"), meta_template("new")
+		existing = [
+			frappe._dict(name="Unchanged", actual_name="unchanged", content_hash=get_template_hash(unchanged)),
+			frappe._dict(name="Changed", actual_name="changed", content_hash="stale"),
+		]
+		settings = MagicMock(url="https://graph", version="v17.0", business_id="waba")
+		docs = {"Changed": MagicMock(), "new": MagicMock()}
+
+		def get_doc(doctype, name):
+			return settings if doctype == "WhatsApp Settings" else docs[name]
+
+		with (
+			patch.object(whatsapp_templates, "iter_template_pages", return_value=iter([[unchanged, changed], [new]])),
+			patch.object(frappe, "get_all", return_value=existing),
+			patch.object(frappe, "get_doc", side_effect=get_doc) as get_doc_mock,
+			patch.object(frappe, "new_doc", return_value=docs["new"]),
+			patch.object(frappe.db, "commit") as commit,
+		):
+			message = fetch()
+
+		self.assertEqual(message, "Successfully fetched 3 templates from meta (2 updated)")
+		self.assertNotIn(
+			("WhatsApp Templates", "Unchanged"), [call.args for call in get_doc_mock.call_args_list]
+		)
+		docs["Changed"].save.assert_called_once_with(ignore_permissions=True)
+		self.assertEqual(docs["Changed"].content_hash, get_template_hash(changed))
+		self.assertEqual(docs["Changed"].template, "Hi {{1}}")
+		docs["new"].save.assert_called_once_with(ignore_permissions=True)
+		self.assertEqual(docs["new"].actual_name, "new")
+		self.assertTrue(docs["new"]._skip_after_insert)
+		self.assertEqual(commit.call_count, 2)
+
+	def test_upload_resumes_from_server_offset_after_failure(self):
+		ok = MagicMock()
+		ok.json.side_effect = iter([{"file_offset": 4}, {"h": "handle"}])
+
+		def post(url, headers, data, timeout):
+			if post.failed:
+				return ok
+			post.failed = True
+			raise requests.ConnectionError("reset")
+
+		post.failed = False
+		with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as file:
+			file.write(b"x" * 8)
+		try:
+			with (
+				patch("requests.post", side_effect=post) as post_mock,
+				patch.object(whatsapp_templates, "get_upload_offset", return_value=0) as get_offset,
+				patch("time.sleep"),
+			):
+				self.assertEqual(upload_resumable("https://example.com/upload", file.name, "token", chunk_size=4), "handle")
+
+			get_offset.assert_called_once()
+			self.assertEqual(
+				[call.kwargs["headers"]["file_offset"] for call in post_mock.call_args_list], ["0", "0", "4"]
+			)
+		finally:
+			os.unlink(file.name)
+
+	def test_upload_does_not_retry_client_errors(self):
+		response = MagicMock(status_code=400)
+		error = requests.HTTPError("bad request", response=response)
+		response.raise_for_status.side_effect = error
+
+		with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as file:
+			file.write(b"x" * 8)
+		try:
+			with patch("requests.post", return_value=response) as post, patch("time.sleep"):
+				self.assertRaises(
+					frappe.ValidationError, upload_resumable, "https://example.com/upload", file.name, "token"
+				)
+			self.assertEqual(post.call_count, 1)
+		finally:
+			os.unlink(file.name)
+
+	def make_sample_template(self, content=b"sample"):
+		with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as file:
+			file.write(content)
+		self.addCleanup(os.unlink, file.name)
+
+		doc = frappe.new_doc("WhatsApp Templates")
+		doc.sample = "/files/sample.png"
+		doc._app_id = "app"
+		stack = ExitStack()
+		self.addCleanup(stack.close)
+		stack.enter_context(patch.object(doc, "get_settings"))
+		stack.enter_context(patch.object(doc, "get_absolute_path", return_value=file.name))
+		return doc, file.name
+
+	def test_cached_media_handle_skips_upload(self):
+		doc, path = self.make_sample_template()
+		cache = MagicMock()
+		cache.get_value.return_value = "cached-handle"
+
+		with (
+			patch.object(frappe, "cache", return_value=cache),
+			patch.object(doc, "get_session_id") as get_session_id,
+		):
+			doc.set_media_handle()
+
+		get_session_id.assert_not_called()
+		cache.get_value.assert_called_once_with(
+			get_media_handle_cache_key("/files/sample.png", get_file_hash(path), "app")
+		)
+		self.assertEqual(doc._media_id, "cached-handle")
+
+	def test_uploaded_media_handle_is_cached(self):
+		doc, path = self.make_sample_template()
+		cache = MagicMock()
+		cache.get_value.return_value = None
+
+		def upload():
+			doc._media_id = "new-handle"
+
+		with (
+			patch.object(frappe, "cache", return_value=cache),
+			patch.object(doc, "get_session_id") as get_session_id,
+			patch.object(doc, "get_media_id", side_effect=upload),
+		):
+			doc.set_media_handle()
+
+		get_session_id.assert_called_once()
+		cache.set_value.assert_called_once_with(
+			get_media_handle_cache_key("/files/sample.png", get_file_hash(path), "app"),
+			"new-handle",
+			expires_in_sec=MEDIA_HANDLE_TTL,
+		)
+		self.assertEqual(doc._media_id, "new-handle")
+
+	def test_media_handle_cache_key_tracks_content_and_app(self):
+		key = get_media_handle_cache_key("/files/sample.png", "hash", "app")
+		self.assertNotEqual(key, get_media_handle_cache_key("/files/sample.png", "other", "app"))
+		self.assertNotEqual(key, get_media_handle_cache_key("/files/sample.png", "hash", "other-app"))
@@ -4,12 +4,106 @@
 # For license information, please see license.txt
 import os
 import json
+import hashlib
+import time
 import frappe
 import magic
+import requests
 from frappe.model.document import Document
 from frappe.integrations.utils import make_post_request, make_request
 from frappe.desk.form.utils import get_pdf_link
 
+# Meta does not document how long an upload handle stays valid, so cached
+# handles are refreshed weekly even when the sample is unchanged.
+MEDIA_HANDLE_TTL = 7 * 24 * 60 * 60
+
+
+def get_file_hash(file_path):
+    """SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, mode="rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_media_handle_cache_key(file_url, file_hash, app_id):
+    """Cache key for the upload handle of a template sample."""
+    return f"whatsapp_media_handle:{app_id}:{file_hash}:{file_url}"
+
+
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+UPLOAD_MAX_RETRIES = 5
+
+
+def get_upload_offset(session_url, headers):
+    """Get the offset Meta has received for an upload session."""
+    response = requests.get(session_url, headers=headers, timeout=30)
+    response.raise_for_status()
+    return int(response.json().get("file_offset", 0))
+
+
+def upload_resumable(session_url, file_path, token, chunk_size=UPLOAD_CHUNK_SIZE,
+        max_retries=UPLOAD_MAX_RETRIES, progress=None):
+    """Stream a file to a Meta resumable upload session and return its handle.
+
+    The file is read and posted in `chunk_size` pieces using the `file_offset`
+    header. After a failed request the offset reported by Meta is read back and
+    the upload continues from there, so memory use stays constant and a
+    network error does not restart the whole upload. A response that does not
+    advance the offset counts as a failed attempt, so a stalled session stops
+    after `max_retries`.
+    """
+    headers = {"authorization": f"OAuth {token}"}
+    total = os.path.getsize(file_path)
+    offset = 0
+    retries = 0
+
+    with open(file_path, mode="rb") as file:  # b is important -> binary
+        while True:
+            file.seek(offset)
+            chunk = file.read(chunk_size)
+            try:
+                response = requests.post(
+                    session_url,
+                    headers={**headers, "file_offset": str(offset)},
+                    data=chunk,
+                    timeout=120,
+                )
+                response.raise_for_status()
+                result = response.json()
+            except (requests.RequestException, ValueError) as e:
+                status_code = getattr(getattr(e, "response", None), "status_code", None)
+                retries += 1
+                if retries > max_retries or (status_code and status_code < 500 and status_code != 429):
+                    frappe.throw(f"Failed to upload {os.path.basename(file_path)} to WhatsApp: {e}")
+                time.sleep(min(2 ** retries, 30))
+                try:
+                    offset = get_upload_offset(session_url, headers)
+                except (requests.RequestException, ValueError):
+                    pass
+                continue
+
+            if result.get("h"):
+                if progress:
+                    progress(total, total)
+                return result["h"]
+
+            new_offset = int(result.get("file_offset", offset + len(chunk)))
+            if not chunk or new_offset >= total:
+                frappe.throw(f"WhatsApp did not return a handle for {os.path.basename(file_path)}")
+            if new_offset <= offset:
+                retries += 1
+                if retries > max_retries:
+                    frappe.throw(f"Upload of {os.path.basename(file_path)} to WhatsApp stalled at byte {offset}")
+                time.sleep(min(2 ** retries, 30))
+                continue
+
+            retries = 0
+            offset = new_offset
+            if progress:
+                progress(offset, total)
+
 
 class WhatsAppTemplates(Document):
     """Create whatsapp template."""
@@ -20,14 +114,36 @@ class WhatsAppTemplates(Document):
             self.language_code = lang_code.replace("-", "_")
 
         if self.header_type in ["IMAGE", "DOCUMENT"] and self.sample:
-            self.get_session_id()
-            self.get_media_id()
+            self.set_media_handle()
 
         # Skip update_template during fetch operations to avoid _media_id errors
         if not self.is_new() and not getattr(self, '_skip_update_template', False):
             self.update_template()
 
 
+    def set_media_handle(self):
+        """Set `_media_id` for the sample, uploading it only when it changed.
+
+        Handles are cached against the file URL, its content hash and the app
+        id, so saving a template whose sample is unchanged does not upload
+        the file to Meta again.
+        """
+        if getattr(self, "_media_id", None):
+            return
+
+        self.get_settings()
+        cache_key = get_media_handle_cache_key(
+            self.sample, get_file_hash(self.get_absolute_path(self.sample)), self._app_id
+        )
+        media_id = frappe.cache().get_value(cache_key)
+        if not media_id:
+            self.get_session_id()
+            self.get_media_id()
+            media_id = self._media_id
+            frappe.cache().set_value(cache_key, media_id, expires_in_sec=MEDIA_HANDLE_TTL)
+
+        self._media_id = media_id
+
     def get_session_id(self):
         """Upload media."""
         self.get_settings()
@@ -49,24 +165,24 @@ class WhatsAppTemplates(Document):
         self._session_id = response['id']
 
     def get_media_id(self):
+        """Upload the sample to the open upload session and set `_media_id`."""
         self.get_settings()
 
-        headers = {
-                "authorization": f"OAuth {self._token}"
-            }
-        file_name = self.get_absolute_path(self.sample)
-        with open(file_name, mode='rb') as file: # b is important -> binary
-            file_content = file.read()
+        def publish(uploaded, total):
+            frappe.publish_progress(
+                uploaded * 100 / total if total else 100,
+                title="Uploading sample to WhatsApp",
+                doctype=self.doctype,
+                docname=self.name,
+            )
 
-        payload = file_content
-        response = make_post_request(
+        self._media_id = upload_resumable(
             f"{self._url}/{self._version}/{self._session_id}",
-            headers=headers,
-            data=payload
+            self.get_absolute_path(self.sample),
+            self._token,
+            progress=publish,
         )
 
-        self._media_id = response['h']
-
     def get_absolute_path(self, file_name):
         if(file_name.startswith('/files/')):
             file_path = f'{frappe.utils.get_bench_path()}/sites/{frappe.utils.get_site_base_path()[2:]}/public{file_name}'
@@ -229,9 +345,7 @@ class WhatsAppTemplates(Document):
             elif self.header_type in ["IMAGE", "DOCUMENT"] and self.sample:
                 # This is for template creation where we have a sample file but no _media_id yet
                 # We need to get the media_id first
-                if not hasattr(self, '_media_id'):
-                    self.get_session_id()
-                    self.get_media_id()
+                self.set_media_handle()
                 header.update({"example": {"header_handle": [self._media_id]}})
             # If we don't have _media_id and no sample, this is likely a fetched template
             # In this case, we skip the example field to avoid Meta API errors
@@ -278,9 +392,106 @@ class WhatsAppTemplates(Document):
         }
 
 
+TEMPLATE_PAGE_SIZE = 250
+
+
+def get_template_hash(template):
+    """Hash of a template definition as returned by Meta."""
+    return hashlib.sha256(
+        json.dumps(template, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def iter_template_pages(url, headers):
+    """Yield each page of ``message_templates``, following ``paging.next``."""
+    next_url = f"{url}?limit={TEMPLATE_PAGE_SIZE}"
+    while next_url:
+        response = make_request("GET", next_url, headers=headers)
+        yield response.get("data", [])
+        next_url = response.get("paging", {}).get("next")
+
+
+def apply_template(doc, template):
+    """Copy a Meta template definition onto a WhatsApp Templates doc."""
+    doc.status = template["status"]
+    doc.language_code = template["language"]
+    doc.category = template["category"]
+    doc.id = template["id"]
+
+    # update components
+    for component in template["components"]:
+
+        # update header
+        if component["type"] == "HEADER":
+            doc.header_type = component["format"]
+
+            # if format is text update sample text
+            if component["format"] == "TEXT":
+                doc.header = component["text"]
+            # For IMAGE and DOCUMENT headers, we don't store the media_id from Meta
+            # as it's only needed for template creation/updates, not for fetching
+            # The template will work for sending messages without the media_id
+        # Update footer text
+        elif component["type"] == "FOOTER":
+            doc.footer = component["text"]
+
+        # update template text
+        elif component["type"] == "BODY":
+            doc.template = component["text"]
+            if component.get("example"):
+                doc.sample_values = ",".join(
+                    component["example"]["body_text"][0]
+                )
+
+        # update buttons
+        elif component["type"] == "BUTTONS":
+            # Clear existing buttons using proper child table handling
+            doc.buttons = []
+
+            # Add new buttons
+            buttons_list = component.get("buttons", [])
+
+            for idx, button in enumerate(buttons_list):
+                # Skip unsupported button types (if any)
+                if button.get("type") not in ["QUICK_REPLY", "URL", "PHONE_NUMBER", "COPY_CODE", "FLOW"]:
+                    continue
+
+                # Create button row for child table (with explicit doctype)
+                button_row = {
+                    "doctype": "WhatsApp Template Buttons",
+                    "button_text": button.get("text", ""),
+                    "button_type": button.get("type", ""),
+                    "idx": idx + 1
+                }
+
+                # Set type-specific fields
+                if button.get("type") == "QUICK_REPLY":
+                    # For QUICK_REPLY, no additional fields needed in template creation
+                    pass
+                elif button.get("type") == "URL":
+                    button_row["url"] = button.get("url", "")
+                elif button.get("type") == "PHONE_NUMBER":
+                    button_row["phone_number"] = button.get("phone_number", "")
+                elif button.get("type") == "COPY_CODE":
+                    button_row["copy_code_example"] = button.get("example", [""])[0] if button.get("example") else ""
+                elif button.get("type") == "FLOW":
+                    # For FLOW buttons, store the flow configuration
+                    button_row["flow_id"] = str(button.get("flow_id", ""))
+                    button_row["flow_action"] = button.get("flow_action", "")
+                    button_row["navigate_screen"] = button.get("navigate_screen", "")
+
+                # Append to child table
+                doc.append("buttons", button_row)
+
+
 @frappe.whitelist()
 def fetch():
-    """Fetch templates from meta."""
+    """Fetch templates from meta.
+
+    Follows ``paging.next`` until every template has been read and only saves
+    templates whose definition changed since the last fetch, committing once
+    per page.
+    """
 
     # get credentials
     settings = frappe.get_doc("WhatsApp Settings", "WhatsApp Settings")
@@ -291,110 +502,53 @@ def fetch():
 
     headers = {"authorization": f"Bearer {token}", "content-type": "application/json"}
 
-    try:
-        response = make_request(
-            "GET",
-            f"{url}/{version}/{business_id}/message_templates",
-            headers=headers,
+    existing = {
+        t.actual_name: t
+        for t in frappe.get_all(
+            "WhatsApp Templates", fields=["name", "actual_name", "content_hash"]
         )
-        
-        for template in response["data"]:
-            # set flag to insert or update
-            flags = 1
-            if frappe.db.exists("WhatsApp Templates", {"actual_name": template["name"]}):
-                doc = frappe.get_doc("WhatsApp Templates", {"actual_name": template["name"]})
-            else:
-                flags = 0
-                doc = frappe.new_doc("WhatsApp Templates")
-                doc.template_name = template["name"]
-                doc.actual_name = template["name"]
-                # Skip after_insert during fetch to prevent recreating template in Meta
-                doc._skip_after_insert = True
-
-            doc.status = template["status"]
-            doc.language_code = template["language"]
-            doc.category = template["category"]
-            doc.id = template["id"]
-
-            # update components
-            for component in template["components"]:
-
-                # update header
-                if component["type"] == "HEADER":
-                    doc.header_type = component["format"]
-
-                    # if format is text update sample text
-                    if component["format"] == "TEXT":
-                        doc.header = component["text"]
-                    # For IMAGE and DOCUMENT headers, we don't store the media_id from Meta
-                    # as it's only needed for template creation/updates, not for fetching
-                    # The template will work for sending messages without the media_id
-                # Update footer text
-                elif component["type"] == "FOOTER":
-                    doc.footer = component["text"]
-
-                # update template text
-                elif component["type"] == "BODY":
-                    doc.template = component["text"]
-                    if component.get("example"):
-                        doc.sample_values = ",".join(
-                            component["example"]["body_text"][0]
-                        )
-
-                # update buttons
-                elif component["type"] == "BUTTONS":
-                    # Clear existing buttons using proper child table handling
-                    doc.buttons = []
-                    
-                    # Add new buttons
-                    buttons_list = component.get("buttons", [])
-                    
-                    for idx, button in enumerate(buttons_list):
-                        # Skip unsupported button types (if any)
-                        if button.get("type") not in ["QUICK_REPLY", "URL", "PHONE_NUMBER", "COPY_CODE", "FLOW"]:
-                            continue
-                        
-                        # Create button row for child table (with explicit doctype)
-                        button_row = {
-                            "doctype": "WhatsApp Template Buttons",
-                            "button_text": button.get("text", ""),
-                            "button_type": button.get("type", ""),
-                            "idx": idx + 1
-                        }
-                        
-                        # Set type-specific fields
-                        if button.get("type") == "QUICK_REPLY":
-                            # For QUICK_REPLY, no additional fields needed in template creation
-                            pass
-                        elif button.get("type") == "URL":
-                            button_row["url"] = button.get("url", "")
-                        elif button.get("type") == "PHONE_NUMBER":
-                            button_row["phone_number"] = button.get("phone_number", "")
-                        elif button.get("type") == "COPY_CODE":
-                            button_row["copy_code_example"] = button.get("example", [""])[0] if button.get("example") else ""
-                        elif button.get("type") == "FLOW":
-                            # For FLOW buttons, store the flow configuration
-                            button_row["flow_id"] = str(button.get("flow_id", ""))
-                            button_row["flow_action"] = button.get("flow_action", "")
-                            button_row["navigate_screen"] = button.get("navigate_screen", "")
-                        
-                        # Append to child table
-                        doc.append("buttons", button_row)
-
-            # Save document with child tables properly handled
-            # Use save() to ensure child tables are processed correctly
-            try:
-                # Skip template update during fetch to avoid _media_id errors
-                doc._skip_update_template = True
-                # Preserve the skip flag for after_insert
-                if hasattr(doc, '_skip_after_insert'):
+        if t.actual_name
+    }
+    fetched = changed = 0
+
+    try:
+        for page in iter_template_pages(f"{url}/{version}/{business_id}/message_templates", headers):
+            for template in page:
+                fetched += 1
+                content_hash = get_template_hash(template)
+                current = existing.get(template["name"])
+                if current and current.content_hash == content_hash:
+                    continue
+
+                if current:
+                    doc = frappe.get_doc("WhatsApp Templates", current.name)
+                else:
+                    doc = frappe.new_doc("WhatsApp Templates")
+                    doc.template_name = template["name"]
+                    doc.actual_name = template["name"]
+                    # Skip after_insert during fetch to prevent recreating template in Meta
                     doc._skip_after_insert = True
-                doc.save(ignore_permissions=True)
-                frappe.db.commit()
-            except Exception as e:
-                frappe.log_error("Template Save Error", f"Failed to save template {doc.actual_name}: {str(e)}")
-                frappe.db.rollback()
-                raise
+
+                apply_template(doc, template)
+                doc.content_hash = content_hash
+
+                # Save document with child tables properly handled
+                # Use save() to ensure child tables are processed correctly
+                try:
+                    # Skip template update during fetch to avoid _media_id errors
+                    doc._skip_update_template = True
+                    doc.save(ignore_permissions=True)
+                except Exception as e:
+                    frappe.log_error("Template Save Error", f"Failed to save template {doc.actual_name}: {str(e)}")
+                    frappe.db.rollback()
+                    raise
+
+                existing[template["name"]] = frappe._dict(
+                    name=doc.name, actual_name=doc.actual_name, content_hash=content_hash
+                )
+                changed += 1
+
+            frappe.db.commit()
 
     except Exception as e:
         # Handle API errors if integration_request exists
@@ -413,4 +567,4 @@ def fetch():
             # No integration_request, just throw the original error
             frappe.throw(f"Error fetching templates: {str(e)}")
 
-    return "Successfully fetched templates from meta"
+    return f"Successfully fetched {fetched} templates from meta ({changed} updated)"
@@ -16,7 +16,7 @@ frappe.query_reports["Bulk WhatsApp Status"] = {
             "fieldname": "status",
             "label": __("Status"),
             "fieldtype": "Select",
-            "options": "\nDraft\nQueued\nIn Progress\nCompleted\nPartially Failed"
+            "options": "\nDraft\nScheduled\nQueued\nIn Progress\nPaused\nCancelled\nCompleted\nPartially Failed"
         },
         // {
         //     "fieldname": "from_number",
@@ -1,5 +1,9 @@
 import frappe
 
+from frappe_whatsapp.utils.campaign import COUNTER_FIELDS, get_counters
+
+ACTIVE_STATUSES = ("Queued", "In Progress", "Paused")
+
 
 def execute(filters=None):
     if not filters:
@@ -79,55 +83,43 @@ def get_columns():
 def get_data(filters):
     conditions = ""
     if filters.get("from_date") and filters.get("to_date"):
-        conditions += " AND creation BETWEEN %(from_date)s AND %(to_date)s"
+        conditions += " AND b.creation BETWEEN %(from_date)s AND %(to_date)s"
     
     if filters.get("status"):
-        conditions += " AND status = %(status)s"
+        conditions += " AND b.status = %(status)s"
         
     if filters.get("from_number"):
-        conditions += " AND from_number = %(from_number)s"
+        conditions += " AND b.from_number = %(from_number)s"
     
+    # Message stats are the counters each campaign maintains on its own row,
+    # so the report never scans WhatsApp Message. Counters of campaigns that
+    # are still sending are read live from Redis.
     data = frappe.db.sql("""
         SELECT 
-            name, 
-            title, 
-            creation, 
-            recipient_count, 
-            sent_count, 
-            status 
+            b.name, 
+            b.title, 
+            b.creation, 
+            b.recipient_count, 
+            b.sent_count, 
+            b.delivered_count, 
+            b.read_count, 
+            b.failed_count, 
+            b.status 
         FROM 
-            `tabBulk WhatsApp Message` 
+            `tabBulk WhatsApp Message` b
         WHERE 
-            docstatus = 1 
+            b.docstatus = 1 
             {conditions}
         ORDER BY 
-            creation DESC
+            b.creation DESC
     """.format(conditions=conditions), filters, as_dict=1)
-    
-    # Fetch additional stats for each bulk message
+
     for row in data:
-        # Get delivered count
-        row["delivered_count"] = frappe.db.count("WhatsApp Message", {
-            "bulk_message_reference": row.name,
-            "status": "delivered"
-        })
-        
-        # Get read count
-        row["read_count"] = frappe.db.count("WhatsApp Message", {
-            "bulk_message_reference": row.name,
-            "status": "read"
-        })
+        if row.status not in ACTIVE_STATUSES:
+            continue
+        for counter, value in get_counters(row.name).items():
+            fieldname = COUNTER_FIELDS.get(counter)
+            if fieldname and value is not None:
+                row[fieldname] = value
 
-         # Get read count
-        row["sent_count"] = frappe.db.count("WhatsApp Message", {
-            "bulk_message_reference": row.name,
-            "status": "sent"
-        })
-        
-        # Get failed count
-        row["failed_count"] = frappe.db.count("WhatsApp Message", {
-            "bulk_message_reference": row.name,
-            "status": "failed"
-        })
-    
     return data
@@ -0,0 +1,55 @@
+# Copyright (c) 2026, Shridhar Patil and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from frappe_whatsapp.frappe_whatsapp.report.bulk_whatsapp_status import bulk_whatsapp_status
+from frappe_whatsapp.patches import v1_2_backfill_campaign_counters as backfill
+
+
+def make_row(name, status, sent=0, failed=0, delivered=0, read=0):
+    return frappe._dict(
+        name=name, title=name, status=status, recipient_count=10,
+        sent_count=sent, failed_count=failed, delivered_count=delivered, read_count=read,
+    )
+
+
+class TestBulkWhatsAppStatus(UnitTestCase):
+    def test_report_reads_stored_counters_and_live_ones_while_sending(self):
+        rows = [make_row("DONE", "Completed", 9, 1, 8, 5), make_row("RUNNING", "In Progress", 2)]
+        live = {"sent": 6, "failed": 1, "delivered": 4, "read": None, "processed": 7}
+
+        with (
+            patch.object(frappe.db, "sql", return_value=rows) as sql,
+            patch.object(bulk_whatsapp_status, "get_counters", return_value=live) as get_counters,
+        ):
+            data = bulk_whatsapp_status.get_data({})
+
+        self.assertNotIn("`tabWhatsApp Message`", sql.call_args.args[0])
+        get_counters.assert_called_once_with("RUNNING")
+        self.assertEqual((data[0].sent_count, data[0].delivered_count, data[0].read_count), (9, 8, 5))
+        self.assertEqual(
+            (data[1].sent_count, data[1].failed_count, data[1].delivered_count, data[1].read_count), (6, 1, 4, 0)
+        )
+
+    def test_backfill_counters_of_older_campaigns(self):
+        counts = {
+            "OLD": {"sent": 8, "failed": 2, "queued": 0, "delivered": 3, "read": 4},
+            "EMPTY": {"sent": 0, "failed": 0, "queued": 0, "delivered": 0, "read": 0},
+        }
+        with (
+            patch.object(frappe.db, "sql_list", return_value=list(counts), create=True),
+            patch.object(backfill, "get_status_counts", return_value=counts) as get_status_counts,
+            patch.object(frappe.db, "set_value") as set_value,
+            patch.object(frappe.db, "commit"),
+        ):
+            backfill.execute()
+
+        get_status_counts.assert_called_once_with(["OLD", "EMPTY"])
+        self.assertEqual(set_value.call_args_list[0].args[2], {
+            "sent_count": 8, "failed_count": 2, "delivered_count": 7, "read_count": 4,
+        })
+        self.assertEqual(set_value.call_count, 2)
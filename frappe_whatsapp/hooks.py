@@ -115,11 +115,19 @@ app_include_js = "/assets/frappe_whatsapp/js/frappe_whatsapp.js"
 # ---------------
 
 scheduler_events = {
+    "cron": {
+        "* * * * *": [
+            "frappe_whatsapp.utils.campaign.scheduler_tick",
+            "frappe_whatsapp.utils.dispatch_window.drain_timing_wheel",
+        ],
+    },
     "all": [
-        "frappe_whatsapp.utils.trigger_whatsapp_notifications_all"
+        "frappe_whatsapp.utils.trigger_whatsapp_notifications_all",
+        "frappe_whatsapp.utils.bulk_messaging.schedule_bulk_messages",
     ],
     "hourly": [
-        "frappe_whatsapp.utils.trigger_whatsapp_notifications_hourly"
+        "frappe_whatsapp.utils.trigger_whatsapp_notifications_hourly",
+        "frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_recipient_list.whatsapp_recipient_list.fail_stale_imports",
     ],
     "hourly_long": [
         "frappe_whatsapp.utils.trigger_whatsapp_notifications_hourly_long"
@@ -130,6 +138,7 @@ scheduler_events = {
     ],
     "daily_long": [
         "frappe_whatsapp.utils.trigger_whatsapp_notifications_daily_long",
+        "frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_recipient_list.whatsapp_recipient_list.refresh_recipient_lists",
     ],
     "weekly": [
         "frappe_whatsapp.utils.trigger_whatsapp_notifications_weekly",
@@ -0,0 +1,41 @@
+# Copyright (c) 2026, Frappe Whatsapp and Contributors
+# See license.txt
+
+import frappe
+
+from frappe_whatsapp.utils.campaign import get_status_counts
+
+BATCH_SIZE = 500
+
+
+def execute():
+    """Fill the message counters of campaigns sent before they were kept on the campaign.
+
+    The Bulk WhatsApp Status report reads these counters instead of scanning
+    WhatsApp Message, so older campaigns would otherwise show nothing
+    delivered, read or failed.
+    """
+    names = frappe.db.sql_list("""
+        SELECT name FROM `tabBulk WhatsApp Message`
+        WHERE docstatus = 1
+            AND IFNULL(failed_count, 0) = 0
+            AND IFNULL(delivered_count, 0) = 0
+            AND IFNULL(read_count, 0) = 0
+    """)
+
+    for start in range(0, len(names), BATCH_SIZE):
+        counts = get_status_counts(names[start:start + BATCH_SIZE])
+        for name, count in counts.items():
+            frappe.db.set_value(
+                "Bulk WhatsApp Message",
+                name,
+                {
+                    "sent_count": count["sent"],
+                    "failed_count": count["failed"],
+                    # a read message was delivered first
+                    "delivered_count": count["delivered"] + count["read"],
+                    "read_count": count["read"],
+                },
+                update_modified=False,
+            )
+        frappe.db.commit()
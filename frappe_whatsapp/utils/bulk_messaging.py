@@ -1,13 +1,21 @@
 import json
 import frappe
 from frappe.utils import cint
+from frappe_whatsapp.utils import campaign
+from frappe_whatsapp.utils.campaign import flush_active_campaigns
+from frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_recipient_list.whatsapp_recipient_list import (
+    enqueue_refresh_job,
+    get_segment,
+)
+from frappe_whatsapp.utils.recipient_file import enqueue_file_import
 
 
 @frappe.whitelist()
 def get_progress(name):
     """Get progress for a bulk message"""
-    doc = frappe.get_doc("Bulk WhatsApp Message", name)
-    return doc.get_progress()
+    frappe.has_permission("Bulk WhatsApp Message", "read", name, throw=True)
+    recipient_count = frappe.db.get_value("Bulk WhatsApp Message", name, "recipient_count")
+    return campaign.get_progress(name, recipient_count)
 
 @frappe.whitelist()
 def retry_failed(name):
@@ -16,9 +24,33 @@ def retry_failed(name):
     doc.retry_failed()
     return True
 
+@frappe.whitelist()
+def pause_campaign(name):
+    """Pause a running bulk message"""
+    doc = frappe.get_doc("Bulk WhatsApp Message", name)
+    doc.check_permission("write")
+    doc.pause()
+    return doc.status
+
+@frappe.whitelist()
+def resume_campaign(name):
+    """Resume a paused bulk message"""
+    doc = frappe.get_doc("Bulk WhatsApp Message", name)
+    doc.check_permission("write")
+    doc.resume()
+    return doc.status
+
+@frappe.whitelist()
+def cancel_campaign(name):
+    """Stop sending the remaining messages of a bulk message"""
+    doc = frappe.get_doc("Bulk WhatsApp Message", name)
+    doc.check_permission("write")
+    doc.cancel_sending()
+    return doc.status
+
 @frappe.whitelist()
 def import_recipients(list_name, doctype, mobile_field, name_field=None, filters=None, limit=None, data_fields=None):
-    """Import recipients from a DocType"""
+    """Queue an import of recipients from a DocType"""
     if filters and isinstance(filters, str):
         filters = json.loads(filters)
 
@@ -26,39 +58,47 @@ def import_recipients(list_name, doctype, mobile_field, name_field=None, filters
         data_fields = json.loads(data_fields)
         
     doc = frappe.get_doc("WhatsApp Recipient List", list_name)
-    count = doc.import_list_from_doctype(doctype, mobile_field, name_field, filters, limit, data_fields)
-    doc.save()
-    
-    return count
+    doc.check_permission("write")
+    doc.enqueue_import(doctype, mobile_field, name_field, filters, limit, data_fields)
+
+@frappe.whitelist()
+def import_recipients_from_file(list_name, file_url, mobile_column, name_column=None, data_columns=None):
+    """Queue an import of recipients from an attached CSV or Parquet file"""
+    frappe.has_permission("WhatsApp Recipient List", "write", list_name, throw=True)
+    enqueue_file_import(list_name, file_url, mobile_column, name_column, data_columns)
+
+@frappe.whitelist()
+def refresh_recipients(list_name):
+    """Queue an incremental refresh of an imported recipient list"""
+    frappe.has_permission("WhatsApp Recipient List", "write", list_name, throw=True)
+    enqueue_refresh_job(list_name)
 
 @frappe.whitelist()
 def schedule_bulk_messages():
     """Background job to process bulk WhatsApp messages"""
-    # Find queued bulk messages with recipient counts less than sent counts
+    # Write campaign counters kept in Redis back to the campaigns
+    flush_active_campaigns()
+
+    # Find running bulk messages whose recipients have all been processed
     bulk_messages = frappe.get_all(
         "Bulk WhatsApp Message", 
         filters={
-            "status": "Queued",
+            "status": ["in", ["Queued", "In Progress"]],
             "docstatus": 1
         },
-        fields=["name", "recipient_count", "sent_count"]
+        fields=["name", "recipient_count", "recipient_type", "recipient_list"]
     )
     
     for bulk in bulk_messages:
-        # Skip if all messages have been sent
-        if cint(bulk.sent_count) >= cint(bulk.recipient_count):
-            frappe.db.set_value("Bulk WhatsApp Message", bulk.name, "status", "Completed")
+        if bulk.recipient_type == "Recipient List" and get_segment(bulk.recipient_list):
+            # recipient_count of a segment is an estimate until it is planned,
+            # these complete through record_chunk_done instead
             continue
-            
-        # Check for failed messages
-        failed_count = frappe.db.count("WhatsApp Message", {
-            "bulk_message_reference": bulk.name,
-            "status": "Failed"
-        })
-        
-        # If all messages are either sent or failed
-        if cint(bulk.sent_count) - failed_count + cint(failed_count) >= cint(bulk.recipient_count):
-            if failed_count > 0:
-                frappe.db.set_value("Bulk WhatsApp Message", bulk.name, "status", "Partially Failed")
-            else:
-                frappe.db.set_value("Bulk WhatsApp Message", bulk.name, "status", "Completed")
+
+        # Sent, failed and skipped recipients all count as processed, as in record_processed
+        processed = campaign.get_counters(bulk.name, "processed")["processed"]
+        if processed is None:
+            campaign.seed_counters(bulk.name)
+            processed = campaign.get_counters(bulk.name, "processed")["processed"]
+        if cint(processed) >= cint(bulk.recipient_count):
+            campaign.complete_campaign(bulk.name)
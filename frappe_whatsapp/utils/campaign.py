@@ -0,0 +1,884 @@
+"""Campaign execution for Bulk WhatsApp Message.
+
+A submitted campaign is split into chunks of recipients identified by a
+range of WhatsApp Recipient ``idx`` values. Chunk jobs receive a small,
+frozen campaign context instead of the Bulk WhatsApp Message name, so a
+worker never reloads the parent doc and its recipients table; recipients
+are read by keyset on ``idx``.
+
+Progress counters (sent, failed, delivered, read) live in Redis and are
+updated with INCRBY, so parallel workers never race on the parent row.
+They are flushed to the Bulk WhatsApp Message periodically by
+``flush_active_campaigns`` and when the campaign completes.
+
+Template campaigns send each chunk over one HTTP session and persist the
+resulting WhatsApp Message rows with one multi-row INSERT per batch of
+``CONTROL_CHECK_INTERVAL`` recipients, skipping the per-row ORM insert and
+its document events.
+
+Campaigns with a future ``scheduled_time`` wait in a Redis sorted set scored
+by release time, and chunks of a campaign with a ramp-up wait in a second
+sorted set. ``scheduler_tick`` runs every minute and releases whatever is due.
+
+Running campaigns are paused, resumed or cancelled through a Redis control
+key that workers check between batches. After each batch its messages are
+committed and the chunk records the idx of the last recipient processed, so
+a resumed campaign continues where it stopped and a crashed job resends at
+most one batch.
+
+A campaign can send from the pool of numbers in WhatsApp Settings (see
+``sender_pool``) instead of the default phone_id.
+
+A campaign to a Dynamic Segment list reads the matching source records at
+send time. Its chunks are ``(start, end]`` ranges of source document names,
+found by a background job paging through names by keyset, so the first
+chunk goes out while the rest of the segment is still being planned. Such a
+campaign completes when every planned chunk has finished.
+"""
+import json
+import math
+from contextlib import nullcontext
+
+import frappe
+import requests
+from frappe import _
+from frappe.utils import cint, get_datetime, now, now_datetime
+
+from frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_recipient_list.whatsapp_recipient_list import (
+    get_import_fields,
+    get_recipient_data,
+    get_segment,
+)
+from frappe_whatsapp.utils.phone import format_number
+from frappe_whatsapp.utils.suppression import handle_error_code, is_suppressed
+from frappe_whatsapp.utils.sender_pool import get_campaign_sender, get_sender_pool, wait_for_budget
+from frappe_whatsapp.utils.template_compiler import get_compiled_template
+
+DEFAULT_CHUNK_SIZE = 500
+RECIPIENT_FIELDS = ["name", "idx", "mobile_number", "recipient_name", "recipient_data"]
+
+# counter -> Bulk WhatsApp Message field it is flushed to
+COUNTER_FIELDS = {
+    "sent": "sent_count",
+    "failed": "failed_count",
+    "delivered": "delivered_count",
+    "read": "read_count",
+}
+COUNTER_TTL = 30 * 24 * 60 * 60
+ACTIVE_CAMPAIGNS_KEY = "whatsapp_active_campaigns"
+SCHEDULED_CAMPAIGNS_KEY = "whatsapp_scheduled_campaigns"
+SCHEDULED_CHUNKS_KEY = "whatsapp_scheduled_chunks"
+SCHEDULE_RESTORED_KEY = "whatsapp_campaign_schedule_restored"
+
+# workers look at the control key after every this many recipients
+CONTROL_CHECK_INTERVAL = 25
+
+# members popped from a schedule sorted set per call
+POP_LIMIT = 1000
+POP_DUE_SCRIPT = """
+local members = redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1], "LIMIT", 0, ARGV[2])
+if #members > 0 then
+    redis.call("ZREM", KEYS[1], unpack(members))
+end
+return members
+"""
+CHUNK_LOCK_TTL = 4000
+
+MESSAGE_INSERT_FIELDS = [
+    "name", "creation", "modified", "owner", "modified_by", "docstatus", "idx",
+    "type", "to", "status", "message_type", "use_template", "template",
+    "template_parameters", "content_type", "message_id", "bulk_message_reference", "from",
+]
+
+
+def get_chunk_size():
+    """Recipients per campaign job, from WhatsApp Settings."""
+    return cint(frappe.db.get_single_value("WhatsApp Settings", "bulk_chunk_size")) or DEFAULT_CHUNK_SIZE
+
+
+def get_campaign_context(doc):
+    """Get the frozen context a chunk job needs to send for a campaign."""
+    parenttype, parent = doc.get_recipient_source()
+    context = {
+        "name": doc.name,
+        "use_template": cint(doc.use_template),
+        "template": doc.template,
+        "template_variables": doc.template_variables,
+        "use_sender_pool": cint(doc.use_sender_pool),
+        "from_number": doc.from_number,
+        "recipient_count": cint(doc.recipient_count),
+        "parenttype": parenttype,
+        "parent": parent,
+    }
+    if parenttype == "WhatsApp Recipient List":
+        segment = get_segment(parent)
+        if segment:
+            context["segment"] = segment
+    return context
+
+
+def get_chunks(context, chunk_size=None):
+    """Split the campaign's recipients into ``(start, end]`` idx ranges."""
+    chunk_size = chunk_size or get_chunk_size()
+    max_idx = frappe.db.sql(
+        """SELECT MAX(idx) FROM `tabWhatsApp Recipient`
+        WHERE parenttype = %(parenttype)s AND parent = %(parent)s""",
+        context,
+    )[0][0]
+    return [
+        (start, min(start + chunk_size, cint(max_idx)))
+        for start in range(0, cint(max_idx), chunk_size)
+    ]
+
+
+def queue_campaign(doc):
+    """Release the campaign now, or park it until its scheduled time."""
+    if doc.scheduled_time and get_datetime(doc.scheduled_time) > now_datetime():
+        schedule_campaign(doc.name, doc.scheduled_time)
+        doc.db_set("status", "Scheduled")
+        return
+
+    release_campaign(doc)
+
+
+def release_campaign(doc):
+    """Enqueue the campaign's chunks, spread over its ramp-up window if it has one."""
+    context = get_campaign_context(doc)
+    ramp_up_seconds = cint(doc.ramp_up_minutes) * 60
+    if context.get("segment"):
+        frappe.enqueue(
+            "frappe_whatsapp.utils.campaign.release_segment_chunks",
+            queue="long",
+            timeout=4000,
+            context=context,
+            ramp_up_seconds=ramp_up_seconds,
+        )
+        return
+
+    chunks = get_chunks(context)
+    offsets = get_ramp_up_offsets(len(chunks), ramp_up_seconds)
+    release_chunks(context, chunks, offsets, now_datetime().timestamp())
+
+
+def release_chunks(context, chunks, offsets, release_at):
+    """Register chunks and enqueue them, or park them until their ramp-up offset."""
+    register_chunks(context["name"], chunks)
+
+    pipe = frappe.cache().pipeline()
+    for (start, end), offset in zip(chunks, offsets):
+        if offset <= 0:
+            enqueue_chunk(context, start, end)
+            continue
+        member = json.dumps({"context": context, "start": start, "end": end}, sort_keys=True)
+        pipe.zadd(frappe.cache().make_key(SCHEDULED_CHUNKS_KEY), {member: release_at + offset})
+    pipe.execute()
+
+
+def iter_segment_chunks(segment, chunk_size):
+    """Yield ``(start, end, size)`` name ranges covering a segment, paging by keyset."""
+    last_name = ""
+    while True:
+        names = frappe.get_all(
+            segment["doctype"],
+            filters=segment["filters"] + ([["name", ">", last_name]] if last_name else []),
+            pluck="name",
+            order_by="name asc",
+            limit=chunk_size,
+        )
+        if not names:
+            return
+
+        yield last_name, names[-1], len(names)
+        if len(names) < chunk_size:
+            return
+        last_name = names[-1]
+
+
+def release_segment_chunks(context, ramp_up_seconds=0):
+    """Background job: plan a Dynamic Segment campaign and release each chunk as it is found.
+
+    Ramp-up offsets are spread over the segment size counted when the
+    campaign was submitted. The planned total replaces that estimate.
+    """
+    context = frappe._dict(context)
+    chunk_size = get_chunk_size()
+    estimate = max(math.ceil(cint(context.recipient_count) / chunk_size), 1)
+    offsets = get_ramp_up_offsets(estimate, ramp_up_seconds)
+    release_at = now_datetime().timestamp()
+
+    chunk_count = planned = 0
+    for start, end, size in iter_segment_chunks(context.segment, chunk_size):
+        if get_control(context.name) == "cancelled":
+            return
+        offset = offsets[chunk_count] if chunk_count < estimate else ramp_up_seconds
+        release_chunks(context, [(start, end)], [offset], release_at)
+        chunk_count += 1
+        planned += size
+
+    frappe.db.set_value(
+        "Bulk WhatsApp Message", context.name, "recipient_count", planned, update_modified=False
+    )
+    frappe.cache().set(_counter_key(context.name, "chunk_total"), chunk_count, ex=COUNTER_TTL)
+    if not chunk_count or get_counters(context.name, "chunks_done")["chunks_done"] == chunk_count:
+        complete_campaign(context.name)
+
+
+def enqueue_chunk(context, start, end):
+    frappe.enqueue(
+        "frappe_whatsapp.utils.campaign.send_campaign_chunk",
+        queue="long",
+        timeout=4000,
+        context=context,
+        start=start,
+        end=end,
+    )
+
+
+def get_ramp_up_offsets(chunk_count, ramp_up_seconds):
+    """Release offset in seconds of each chunk for a linear ramp-up.
+
+    The send rate grows linearly from zero to full over the window, so the
+    share of chunks released by time ``t`` is ``(t / window) ** 2`` and chunk
+    ``i`` of ``n`` is released at ``window * sqrt(i / n)``.
+    """
+    if not ramp_up_seconds or chunk_count <= 1:
+        return [0] * chunk_count
+    return [int(ramp_up_seconds * math.sqrt(i / chunk_count)) for i in range(chunk_count)]
+
+
+def schedule_campaign(name, scheduled_time):
+    """Park a campaign until ``scheduled_time``."""
+    frappe.cache().zadd(
+        frappe.cache().make_key(SCHEDULED_CAMPAIGNS_KEY),
+        {name: get_datetime(scheduled_time).timestamp()},
+    )
+
+
+def unschedule_campaign(name):
+    """Drop a parked campaign and its pending ramp-up chunks."""
+    cache = frappe.cache()
+    cache.zrem(cache.make_key(SCHEDULED_CAMPAIGNS_KEY), name)
+
+    key = cache.make_key(SCHEDULED_CHUNKS_KEY)
+    for member in cache.zrange(key, 0, -1):
+        if json.loads(member)["context"]["name"] == name:
+            cache.zrem(key, member)
+
+
+def pop_due(key, timestamp, limit=POP_LIMIT):
+    """Remove and return up to ``limit`` members of a sorted set scored at or before ``timestamp``.
+
+    The range and the removal run as one Lua script, so concurrent ticks
+    never release the same member twice.
+    """
+    cache = frappe.cache()
+    members = cache.eval(POP_DUE_SCRIPT, 1, cache.make_key(key), timestamp, limit)
+    return [frappe.safe_decode(member) for member in members]
+
+
+def restore_scheduled_campaigns():
+    """Rebuild the schedule from the database if Redis lost it."""
+    # SET NX on the raw key both checks and sets the marker
+    if not frappe.cache().set(frappe.cache().make_key(SCHEDULE_RESTORED_KEY), 1, nx=True):
+        return
+
+    for campaign in frappe.get_all(
+        "Bulk WhatsApp Message",
+        filters={"status": "Scheduled", "docstatus": 1},
+        fields=["name", "scheduled_time"],
+    ):
+        schedule_campaign(campaign.name, campaign.scheduled_time or now_datetime())
+
+
+def scheduler_tick():
+    """Scheduler: release campaigns and ramp-up chunks that are due."""
+    restore_scheduled_campaigns()
+    timestamp = now_datetime().timestamp()
+
+    for name in pop_due(SCHEDULED_CAMPAIGNS_KEY, timestamp):
+        doc = frappe.get_doc("Bulk WhatsApp Message", name)
+        if doc.docstatus != 1 or doc.status != "Scheduled":
+            continue
+        doc.db_set("status", "Queued")
+        release_campaign(doc)
+
+    for member in pop_due(SCHEDULED_CHUNKS_KEY, timestamp):
+        chunk = json.loads(member)
+        enqueue_chunk(chunk["context"], chunk["start"], chunk["end"])
+
+
+def get_chunk_recipients(context, start, end):
+    """Get recipients with ``start < idx <= end``, in idx order."""
+    if context.get("segment"):
+        return get_segment_recipients(context.segment, start, end)
+
+    return frappe.get_all(
+        "WhatsApp Recipient",
+        filters=[
+            ["parenttype", "=", context["parenttype"]],
+            ["parent", "=", context["parent"]],
+            ["idx", ">", start],
+            ["idx", "<=", end],
+        ],
+        fields=RECIPIENT_FIELDS,
+        order_by="idx asc",
+    )
+
+
+def get_segment_recipients(segment, start, end):
+    """Read the segment's source records with ``start < name <= end`` as recipients.
+
+    The source name stands in for ``idx``, so checkpoints work the same way.
+    """
+    fields = get_import_fields(
+        segment["doctype"], segment["mobile_field"], segment.get("name_field"), segment.get("data_fields")
+    )
+    records = frappe.get_all(
+        segment["doctype"],
+        filters=segment["filters"] + ([["name", ">", start]] if start else []) + [["name", "<=", end]],
+        fields=["name", *fields],
+        order_by="name asc",
+    )
+    return [
+        frappe._dict(
+            name=record.name,
+            idx=record.name,
+            mobile_number=record.get(segment["mobile_field"]) or "",
+            recipient_name=record.get(segment["name_field"]) if segment.get("name_field") else None,
+            recipient_data=json.dumps(get_recipient_data(record, segment.get("data_fields")), default=str),
+        )
+        for record in records
+    ]
+
+
+def send_campaign_chunk(context, start, end):
+    """Background job: send the campaign to recipients in ``(start, end]``.
+
+    Starts after the chunk's checkpoint and stops early when the campaign is
+    paused or cancelled, leaving the checkpoint at the last recipient sent.
+    """
+    context = frappe._dict(context)
+    if get_control(context.name) or not acquire_chunk_lock(context.name, start):
+        return
+
+    try:
+        last_idx = get_checkpoint(context.name, start, end)
+        if last_idx == end:
+            return
+
+        frappe.db.set_value(
+            "Bulk WhatsApp Message",
+            {"name": context.name, "status": "Queued"},
+            "status",
+            "In Progress",
+            update_modified=False,
+        )
+        seed_counters(context.name)
+
+        recipients = get_chunk_recipients(context, last_idx, end)
+        with requests.Session() as session:
+            for i in range(0, len(recipients), CONTROL_CHECK_INTERVAL):
+                if i and get_control(context.name):
+                    # paused or cancelled, the checkpoint stays at the last batch sent
+                    break
+
+                batch = recipients[i:i + CONTROL_CHECK_INTERVAL]
+                if context.use_template and context.template:
+                    sent, failed, skipped = send_template_chunk(context, batch, session)
+                else:
+                    sent = failed = skipped = 0
+                    for recipient in batch:
+                        result = send_to_recipient(context, recipient)
+                        if result is None:
+                            skipped += 1
+                        elif result:
+                            sent += 1
+                        else:
+                            failed += 1
+
+                # persist each batch before sending the next, so a crashed or
+                # timed out job resends at most one batch when it is retried
+                frappe.db.commit()
+                set_checkpoint(context.name, start, end, batch[-1].idx)
+                record_processed(context, sent, failed, skipped)
+            else:
+                set_checkpoint(context.name, start, end, end)
+                if context.get("segment"):
+                    record_chunk_done(context.name)
+    finally:
+        release_chunk_lock(context.name, start)
+
+
+def _control_key(name):
+    return frappe.cache().make_key(f"whatsapp_campaign_control:{name}")
+
+
+def _chunks_key(name):
+    return f"whatsapp_campaign_chunks:{name}"
+
+
+def get_control(name):
+    """``paused`` or ``cancelled`` when workers must stop sending for a campaign."""
+    return frappe.safe_decode(frappe.cache().get(_control_key(name)))
+
+
+def set_control(name, action=None):
+    """Set (or clear, with no ``action``) the control state seen by workers."""
+    if action:
+        frappe.cache().set(_control_key(name), action, ex=COUNTER_TTL)
+    else:
+        frappe.cache().delete(_control_key(name))
+
+
+def _chunk_field(start, end):
+    # idx ranges keep their short form, name ranges may contain ":"
+    if isinstance(start, int):
+        return f"{start}:{end}"
+    return json.dumps([start, end])
+
+
+def _parse_chunk_field(field):
+    field = frappe.safe_decode(field)
+    if field.startswith("["):
+        return tuple(json.loads(field))
+    return tuple(cint(bound) for bound in field.split(":"))
+
+
+def register_chunks(name, chunks):
+    """Record every chunk of a released campaign with nothing sent yet."""
+    for start, end in chunks:
+        frappe.cache().hset(_chunks_key(name), _chunk_field(start, end), start)
+    _expire_chunks(name)
+
+
+def _expire_chunks(name):
+    # checkpoints live as long as the counters, not forever
+    frappe.cache().expire(frappe.cache().make_key(_chunks_key(name)), COUNTER_TTL)
+
+
+def get_checkpoint(name, start, end):
+    """Idx (or source name) of the last recipient processed in a chunk; ``end`` once it is done."""
+    last_idx = frappe.cache().hget(_chunks_key(name), _chunk_field(start, end))
+    return start if last_idx is None else last_idx
+
+
+def set_checkpoint(name, start, end, last_idx):
+    frappe.cache().hset(_chunks_key(name), _chunk_field(start, end), last_idx)
+    _expire_chunks(name)
+
+
+def acquire_chunk_lock(name, start):
+    """Make sure only one worker sends a chunk, even if it was queued twice."""
+    key = frappe.cache().make_key(f"whatsapp_campaign_chunk_lock:{name}:{start}")
+    return frappe.cache().set(key, 1, ex=CHUNK_LOCK_TTL, nx=True)
+
+
+def release_chunk_lock(name, start):
+    frappe.cache().delete(frappe.cache().make_key(f"whatsapp_campaign_chunk_lock:{name}:{start}"))
+
+
+def pause_campaign(doc):
+    """Stop workers after their current recipient and keep the checkpoints."""
+    set_control(doc.name, "paused")
+    frappe.cache().zrem(frappe.cache().make_key(SCHEDULED_CAMPAIGNS_KEY), doc.name)
+    flush_counters(doc.name)
+    doc.db_set("status", "Paused")
+
+
+def resume_campaign(doc):
+    """Re-queue every chunk of a paused campaign from its checkpoint."""
+    checkpoints = frappe.cache().hgetall(_chunks_key(doc.name))
+    if not checkpoints and has_started_sending(doc):
+        # the checkpoints expired or were evicted, releasing again would resend to everyone
+        frappe.throw(_("The progress of this campaign is no longer available, so it cannot be resumed"))
+
+    set_control(doc.name)
+    if not checkpoints:
+        # paused before it was released
+        doc.db_set("status", "Queued")
+        queue_campaign(doc)
+        return
+
+    doc.db_set("status", "In Progress")
+    context = get_campaign_context(doc)
+    for chunk, last_idx in checkpoints.items():
+        start, end = _parse_chunk_field(chunk)
+        if last_idx != end:
+            enqueue_chunk(context, start, end)
+
+
+def has_started_sending(doc):
+    """Whether any recipient of the campaign was processed, going by the stored counts."""
+    counts = frappe.db.get_value(
+        "Bulk WhatsApp Message", doc.name, ["sent_count", "failed_count"], as_dict=True
+    ) or {}
+    processed = get_counters(doc.name, "processed")["processed"]
+    return bool(cint(counts.get("sent_count")) or cint(counts.get("failed_count")) or cint(processed))
+
+
+def cancel_campaign(doc):
+    """Stop the campaign for good and drop anything still scheduled."""
+    set_control(doc.name, "cancelled")
+    unschedule_campaign(doc.name)
+    flush_counters(doc.name)
+    doc.db_set("status", "Cancelled")
+
+
+def get_messages_endpoint(phone_id=None):
+    """Get the Graph API messages URL and request headers from WhatsApp Settings.
+
+    Sends from the default phone_id unless another sender's is given.
+    """
+    settings = frappe.get_cached_doc("WhatsApp Settings", "WhatsApp Settings")
+    token = settings.get_password("token")
+    return (
+        f"{settings.url}/{settings.version}/{phone_id or settings.phone_id}/messages",
+        {"authorization": f"Bearer {token}", "content-type": "application/json"},
+    )
+
+
+def build_template_payload(template, to, values, static_components):
+    """Build a template message payload for one normalized recipient number.
+
+    Returns the payload and the body parameter values used.
+    """
+    data = template.new_payload(
+        to,
+        name=template.actual_name or template.template_name,
+    )
+    parameters = []
+    if template.body_fields:
+        parameters = [values.get(field) for field in template.body_fields]
+        data["template"]["components"].append(template.body_component(parameters))
+    data["template"]["components"].extend(static_components)
+    return data, parameters
+
+
+def post_message(session, url, headers, data):
+    """Send one payload, returning ``(message_id, error)``."""
+    try:
+        response = session.post(url, headers=headers, data=json.dumps(data), timeout=30)
+        result = response.json()
+    except (requests.RequestException, ValueError) as e:
+        return None, str(e)
+
+    if response.ok and result.get("messages"):
+        return result["messages"][0]["id"], None
+
+    error = result.get("error", {})
+    handle_error_code(data.get("to"), error.get("code"))
+    return None, error.get("error_user_msg") or error.get("message") or response.text
+
+
+def send_template_chunk(context, recipients, session=None):
+    """Send a template to each recipient and bulk insert the resulting messages.
+
+    Suppressed recipients are dropped before a payload is built.
+    Returns ``(sent, failed, skipped)``.
+    """
+    from frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_message.whatsapp_message import (
+        get_template_buttons_component,
+    )
+
+    template = get_compiled_template(context.template)
+    static_components = [
+        component
+        for component in (template.sample_header_component(), get_template_buttons_component(template))
+        if component
+    ]
+    url, headers = get_messages_endpoint()
+    pool, sender_urls = get_sender_pool(), {}
+
+    rows, errors, skipped = [], [], 0
+    timestamp, user = now(), frappe.session.user
+    with (requests.Session() if session is None else nullcontext(session)) as session:
+        for recipient in recipients:
+            mobile_number = recipient.get("mobile_number") or ""
+            to = format_number(mobile_number)
+            if to and is_suppressed(to):
+                skipped += 1
+                continue
+
+            values = {}
+            if recipient.get("recipient_data"):
+                try:
+                    values = json.loads(recipient.get("recipient_data") or "{}")
+                except ValueError as e:
+                    frappe.log_error(f"Error parsing recipient data: {str(e)}", "WhatsApp Bulk Messaging")
+
+            data, parameters = build_template_payload(
+                template, to or mobile_number, values, static_components
+            )
+            sender = get_campaign_sender(context, pool, data["to"])
+            if not to:
+                # undeliverable, do not spend an API call on it
+                message_id, error = None, f"{mobile_number} is not a valid WhatsApp number"
+            else:
+                message_url = url
+                if sender:
+                    wait_for_budget(sender)
+                    if sender.phone_id not in sender_urls:
+                        sender_urls[sender.phone_id] = get_messages_endpoint(sender.phone_id)[0]
+                    message_url = sender_urls[sender.phone_id]
+
+                message_id, error = post_message(session, message_url, headers, data)
+
+            if error:
+                errors.append({"to": data["to"], "error": error})
+
+            rows.append((
+                frappe.generate_hash(length=10), timestamp, timestamp, user, user, 0, 0,
+                "Outgoing", data["to"], "Failed" if error else "Success", "Template",
+                1, context.template, json.dumps(parameters), "text", message_id, context.name,
+                sender.phone_number if sender else None,
+            ))
+
+    if rows:
+        frappe.db.bulk_insert("WhatsApp Message", MESSAGE_INSERT_FIELDS, rows)
+    if errors:
+        frappe.get_doc({
+            "doctype": "WhatsApp Notification Log",
+            "template": context.template,
+            "meta_data": {"bulk_message_reference": context.name, "errors": errors},
+        }).insert(ignore_permissions=True)
+
+    return len(rows) - len(errors), len(errors), skipped
+
+
+def send_to_recipient(context, recipient):
+    """Create and send the WhatsApp Message for one recipient.
+
+    Returns None, without creating a message, for a suppressed recipient.
+    """
+    if is_suppressed(recipient.get("mobile_number")):
+        return None
+
+    custom_ref_doc = {}
+    if recipient.get("recipient_data"):
+        try:
+            custom_ref_doc = json.loads(recipient.get("recipient_data") or "{}")
+        except Exception as e:
+            frappe.log_error(f"Error parsing recipient data: {str(e)}", "WhatsApp Bulk Messaging")
+
+    wa_message = frappe.new_doc("WhatsApp Message")
+    wa_message.to = recipient.get("mobile_number")
+    wa_message.message_type = "Text"
+    wa_message.flags.custom_ref_doc = custom_ref_doc
+    wa_message.bulk_message_reference = context.name
+
+    # hash the normalized number, as send_template_chunk does, so a recipient
+    # lands on the same sender whichever path sends to it
+    mobile_number = wa_message.to or ""
+    sender = get_campaign_sender(context, get_sender_pool(), format_number(mobile_number) or mobile_number)
+    if sender:
+        wait_for_budget(sender)
+        wa_message.set("from", sender.phone_number)
+        wa_message.flags.phone_id = sender.phone_id
+
+    if context.use_template:
+        wa_message.template = context.template
+        wa_message.message_type = "Template"
+        wa_message.use_template = context.use_template
+        if context.template_variables:
+            wa_message.template_variables = context.template_variables
+
+    wa_message.status = "Queued"
+    try:
+        wa_message.insert(ignore_permissions=True)
+    except Exception:
+        return False
+    return True
+
+
+def _counter_key(name, counter):
+    return frappe.cache().make_key(f"whatsapp_campaign:{name}:{counter}")
+
+
+def seed_counters(name):
+    """Initialise missing Redis counters from the values stored on the campaign.
+
+    Redis may have evicted or expired any of them, and ``flush_counters``
+    writes absolute values, so every increment must start from a seeded
+    counter. The campaign is only read when a counter is missing.
+    """
+    missing = [counter for counter, value in get_counters(name).items() if value is None]
+    if not missing:
+        return
+
+    values = frappe.db.get_value("Bulk WhatsApp Message", name, list(COUNTER_FIELDS.values()), as_dict=True)
+    if not values:
+        return
+
+    seeds = {counter: cint(values[field]) for counter, field in COUNTER_FIELDS.items()}
+    seeds["processed"] = seeds["sent"] + seeds["failed"]
+
+    pipe = frappe.cache().pipeline()
+    for counter in missing:
+        pipe.set(_counter_key(name, counter), seeds[counter], ex=COUNTER_TTL, nx=True)
+    pipe.execute()
+
+
+def increment_counters(name, **deltas):
+    """Atomically add ``deltas`` to the campaign counters and return the new values."""
+    deltas = {counter: cint(delta) for counter, delta in deltas.items() if cint(delta)}
+    if not deltas:
+        return {}
+
+    pipe = frappe.cache().pipeline()
+    for counter, delta in deltas.items():
+        key = _counter_key(name, counter)
+        pipe.incrby(key, delta)
+        pipe.expire(key, COUNTER_TTL)
+    results = pipe.execute()
+    frappe.cache().sadd(ACTIVE_CAMPAIGNS_KEY, name)
+
+    return {counter: cint(results[i * 2]) for i, counter in enumerate(deltas)}
+
+
+def get_counters(name, *counters):
+    """Current Redis counters for a campaign, ``None`` where never set."""
+    counters = counters or list(COUNTER_FIELDS) + ["processed"]
+    values = frappe.cache().mget([_counter_key(name, counter) for counter in counters])
+    return {
+        counter: (cint(value) if value is not None else None)
+        for counter, value in zip(counters, values)
+    }
+
+
+def flush_counters(name):
+    """Write the Redis counters of a campaign to its Bulk WhatsApp Message."""
+    counters = get_counters(name)
+    values = {
+        field: counters[counter]
+        for counter, field in COUNTER_FIELDS.items()
+        if counters[counter] is not None
+    }
+    if values:
+        frappe.db.set_value("Bulk WhatsApp Message", name, values, update_modified=False)
+    return counters
+
+
+def record_processed(context, sent, failed, skipped=0):
+    """Count a finished chunk and complete the campaign once every recipient is processed.
+
+    Exactly one worker sees ``processed`` cross ``recipient_count`` because
+    the increment is atomic, so completion is decided once, without locks.
+    """
+    counters = increment_counters(context.name, sent=sent, failed=failed, processed=sent + failed + skipped)
+    if context.get("segment"):
+        # segments change while they are sent, they complete by chunk instead
+        return
+
+    processed = counters.get("processed")
+    total = cint(context.recipient_count)
+    if processed is None or not (processed >= total > processed - sent - failed - skipped):
+        return
+
+    complete_campaign(context.name)
+
+
+def record_chunk_done(name):
+    """Count a finished segment chunk and complete the campaign after the last planned one."""
+    done = increment_counters(name, chunks_done=1)["chunks_done"]
+    total = get_counters(name, "chunk_total")["chunk_total"]
+    if total is not None and done == total:
+        complete_campaign(name)
+
+
+def complete_campaign(name):
+    counters = flush_counters(name)
+    frappe.db.set_value(
+        "Bulk WhatsApp Message",
+        name,
+        "status",
+        "Partially Failed" if cint(counters.get("failed")) else "Completed",
+        update_modified=False,
+    )
+
+
+# WhatsApp Message statuses (lower case) counted in each progress bucket
+STATUS_BUCKETS = {
+    "sent": ("sent", "delivered", "read", "success"),
+    "failed": ("failed",),
+    "queued": ("queued",),
+}
+
+
+def get_status_counts(names):
+    """Count campaign messages per progress bucket with one ``GROUP BY`` query.
+
+    Returns ``{campaign: {"sent": n, "failed": n, "queued": n, "delivered": n, "read": n}}``.
+    """
+    counts = {
+        name: {"sent": 0, "failed": 0, "queued": 0, "delivered": 0, "read": 0}
+        for name in names
+    }
+    if not names:
+        return counts
+
+    rows = frappe.db.sql(
+        """SELECT bulk_message_reference, LOWER(status), COUNT(*)
+        FROM `tabWhatsApp Message`
+        WHERE bulk_message_reference IN %(names)s
+        GROUP BY bulk_message_reference, status""",
+        {"names": tuple(names)},
+    )
+    for name, status, count in rows:
+        for bucket, statuses in STATUS_BUCKETS.items():
+            if status in statuses:
+                counts[name][bucket] += count
+        if status in ("delivered", "read"):
+            counts[name][status] += count
+    return counts
+
+
+def get_progress(name, recipient_count):
+    """Progress of a campaign from its Redis counters, or one aggregate query."""
+    total = cint(recipient_count)
+    counters = get_counters(name)
+    if counters["processed"] is not None:
+        sent, failed = cint(counters["sent"]), cint(counters["failed"])
+        queued = max(total - cint(counters["processed"]), 0)
+    else:
+        counts = get_status_counts([name])[name]
+        sent, failed, queued = counts["sent"], counts["failed"], counts["queued"]
+
+    return {
+        "total": total,
+        "sent": sent,
+        "failed": failed,
+        "queued": queued,
+        "percent": (sent / total * 100) if total else 0
+    }
+
+
+def record_status_change(name, old_status, new_status):
+    """Count a delivery status reported by the webhook for a campaign message."""
+    if not name or old_status == new_status:
+        return
+
+    if new_status == "delivered":
+        deltas = {"delivered": 1}
+    elif new_status == "read":
+        deltas = {"read": 1}
+    elif new_status == "failed" and old_status != "Failed":
+        deltas = {"sent": -1, "failed": 1}
+    else:
+        return
+
+    # a counter evicted from Redis would otherwise restart from the delta
+    seed_counters(name)
+    increment_counters(name, **deltas)
+
+
+def flush_active_campaigns():
+    """Scheduler: flush counters of campaigns that changed since the last run."""
+    cache = frappe.cache()
+    names = [frappe.safe_decode(name) for name in cache.smembers(ACTIVE_CAMPAIGNS_KEY)]
+    if not names:
+        return
+
+    # remove before flushing so increments that race with the flush re-add the campaign
+    cache.srem(ACTIVE_CAMPAIGNS_KEY, *names)
+    for name in names:
+        flush_counters(name)
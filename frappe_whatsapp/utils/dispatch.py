@@ -0,0 +1,65 @@
+"""Concurrent delivery of prebuilt message payloads to the Graph API.
+
+Each message is one HTTPS round trip, which dominates large scheduled
+runs. ``Dispatcher`` posts a batch of payloads over a small thread pool,
+one keep-alive session per thread, and returns the results in payload
+order.
+
+Worker threads only make HTTP requests. Payloads are built and results are
+recorded by the calling job, which owns the database connection.
+"""
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_WORKERS = 8
+
+
+class Dispatcher:
+    """Thread pool posting message payloads to one messages endpoint."""
+
+    def __init__(self, url, headers, workers=DEFAULT_WORKERS):
+        self.url = url
+        self.headers = headers
+        self.workers = workers
+        self._local = threading.local()
+        self._sessions = []
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def __enter__(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="whatsapp-dispatch")
+        return self
+
+    def __exit__(self, *exc):
+        self._executor.shutdown(wait=True)
+        for session in self._sessions:
+            session.close()
+
+    def _get_session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def post(self, data):
+        """Send one payload, returning ``(message_id, error, error_code)``."""
+        try:
+            response = self._get_session().post(self.url, headers=self.headers, data=json.dumps(data), timeout=30)
+            result = response.json()
+        except (requests.RequestException, ValueError) as e:
+            return None, str(e), None
+
+        if response.ok and result.get("messages"):
+            return result["messages"][0]["id"], None, None
+
+        error = result.get("error", {})
+        return None, error.get("error_user_msg") or error.get("message") or response.text, error.get("code")
+
+    def post_messages(self, payloads):
+        """Send payloads concurrently, returning their results in order."""
+        return list(self._executor.map(self.post, payloads))
@@ -0,0 +1,144 @@
+"""Time-spread delivery for WhatsApp Notifications.
+
+A notification with a dispatch window or a local send time does not send
+when its scheduler event fires. Each rendered message is parked on a timing
+wheel, a Redis sorted set scored by the time it is due:
+
+* with Send at Local Time, the next occurrence of that time in the
+  recipient's time zone (from the Recipient Time Zone Field, else the
+  system time zone);
+* plus an offset into the dispatch window taken from a hash of the
+  notification and recipient, so load is spread evenly over the window and
+  a recipient keeps the same slot from run to run.
+
+``drain_timing_wheel`` runs every minute, pops the due messages and
+enqueues one send job per notification and batch.
+"""
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import frappe
+from frappe.utils import cint, get_system_timezone, get_time
+
+from frappe_whatsapp.utils.campaign import POP_LIMIT, get_messages_endpoint, pop_due
+from frappe_whatsapp.utils.dispatch import Dispatcher
+from frappe_whatsapp.utils.suppression import is_suppressed
+
+TIMING_WHEEL_KEY = "whatsapp_notification_wheel"
+SEND_BATCH_SIZE = 500
+
+
+def spreads_dispatch(notification):
+    """Whether a notification's messages go through the timing wheel."""
+    return bool(cint(notification.get("dispatch_window_minutes")) or notification.get("local_send_time"))
+
+
+def get_dispatch_offset(notification_name, to, window_seconds):
+    """Deterministic offset in ``[0, window_seconds)`` for one recipient."""
+    if window_seconds <= 0:
+        return 0
+    digest = hashlib.md5(f"{notification_name}:{to}".encode()).hexdigest()
+    return int(digest[:12], 16) % window_seconds
+
+
+def get_zone(timezone=None):
+    """ZoneInfo for a time zone name, falling back to the system time zone."""
+    if timezone:
+        try:
+            return ZoneInfo(timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    return ZoneInfo(get_system_timezone())
+
+
+def next_local_time(timestamp, local_time, zone):
+    """Epoch seconds of the next ``local_time`` in ``zone`` at or after ``timestamp``."""
+    local_now = datetime.fromtimestamp(timestamp, zone)
+    target = datetime.combine(local_now.date(), local_time, tzinfo=zone)
+    if target < local_now:
+        target = datetime.combine(local_now.date() + timedelta(days=1), local_time, tzinfo=zone)
+    return target.timestamp()
+
+
+def get_send_at(notification, to, doc_data=None, timestamp=None):
+    """Epoch seconds at which a notification's message to ``to`` is due."""
+    send_at = timestamp or time.time()
+    if notification.get("local_send_time"):
+        timezone = doc_data.get(notification.timezone_field) if doc_data and notification.timezone_field else None
+        send_at = next_local_time(send_at, get_time(notification.local_send_time), get_zone(timezone))
+
+    window_seconds = cint(notification.get("dispatch_window_minutes")) * 60
+    return send_at + get_dispatch_offset(notification.name, to, window_seconds)
+
+
+def park_messages(notification, messages):
+    """Put rendered ``(doc_data, payload, result)`` messages on the timing wheel."""
+    timestamp = time.time()
+    cache = frappe.cache()
+    key = cache.make_key(TIMING_WHEEL_KEY)
+
+    pipe = cache.pipeline()
+    for doc_data, data, result in messages:
+        send_at = get_send_at(notification, data["to"], doc_data, timestamp)
+        member = json.dumps({
+            "id": frappe.generate_hash(length=10),
+            "notification": notification.name,
+            "content_type": notification.content_type,
+            "reference_doctype": doc_data.doctype if doc_data else None,
+            "reference_name": doc_data.name if doc_data else None,
+            "payload": data,
+        }, sort_keys=True)
+        pipe.zadd(key, {member: send_at})
+        result.update(status="Scheduled", send_at=send_at)
+    pipe.execute()
+
+
+def drain_timing_wheel():
+    """Scheduler: enqueue the parked messages that are due, per notification."""
+    by_notification = {}
+    timestamp = time.time()
+    while True:
+        members = pop_due(TIMING_WHEEL_KEY, timestamp)
+        for member in members:
+            message = json.loads(member)
+            by_notification.setdefault(message["notification"], []).append(message)
+        if len(members) < POP_LIMIT:
+            break
+
+    for notification, messages in by_notification.items():
+        for start in range(0, len(messages), SEND_BATCH_SIZE):
+            frappe.enqueue(
+                "frappe_whatsapp.utils.dispatch_window.send_parked_messages",
+                notification=notification,
+                messages=messages[start:start + SEND_BATCH_SIZE],
+            )
+
+
+def send_parked_messages(notification, messages):
+    """Background job: send messages taken off the timing wheel."""
+    if not frappe.db.exists("WhatsApp Notification", notification):
+        return
+    doc = frappe.get_doc("WhatsApp Notification", notification)
+    if doc.disabled:
+        return
+
+    batch = []
+    for message in messages:
+        if is_suppressed(message["payload"]["to"]):
+            # opted out while the message was parked
+            continue
+        doc_data = None
+        if message.get("reference_name"):
+            doc_data = frappe._dict(doctype=message["reference_doctype"], name=message["reference_name"])
+        batch.append((doc_data, message["payload"], frappe._dict()))
+
+    if not batch:
+        return
+
+    doc.content_type = messages[0].get("content_type")
+    url, headers = get_messages_endpoint()
+    with Dispatcher(url, headers) as dispatcher:
+        doc.record_batch(batch, dispatcher.post_messages([data for _, data, _ in batch]))
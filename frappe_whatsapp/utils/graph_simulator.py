@@ -0,0 +1,320 @@
+"""Local stand-in for the WhatsApp Cloud (Graph) API.
+
+Serves the endpoints this app calls, so campaign throughput and retry
+behaviour can be measured without touching Meta:
+
+* ``POST /<version>/<phone_id>/messages``
+* ``GET /<version>/<media_id>`` and the media download URL it returns
+* ``POST /<version>/<app_id>/uploads`` and the resumable ``upload:<id>`` session
+* ``GET`` / ``POST /<version>/<business_id>/message_templates``, paginated
+
+Every request can be delayed, failed with a 500 or throttled with a 429.
+Accepted messages are followed by ``sent``, ``delivered`` and ``read``
+status webhooks posted back to the site by a background thread.
+
+Point WhatsApp Settings ``url`` at the simulator to use it. It does not
+touch the database and runs outside any site.
+"""
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from urllib.parse import urlencode
+
+import requests
+from werkzeug.exceptions import HTTPException, NotFound
+from werkzeug.routing import Map, Rule
+from werkzeug.serving import run_simple
+from werkzeug.wrappers import Request, Response
+
+WEBHOOK_STATUSES = ("sent", "delivered", "read")
+
+# 1x1 transparent PNG served for every media download
+SAMPLE_MEDIA = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+class WebhookEmitter(threading.Thread):
+    """Post delayed status webhooks to the site from a single thread."""
+
+    def __init__(self, webhook_url):
+        super().__init__(daemon=True)
+        self.webhook_url = webhook_url
+        self._queue = []
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self.stats = Counter()
+
+    def schedule(self, delay, payload):
+        with self._condition:
+            heapq.heappush(self._queue, (time.monotonic() + delay, next(self._seq), payload))
+            self._condition.notify()
+
+    def run(self):
+        with requests.Session() as session:
+            while True:
+                with self._condition:
+                    while not self._queue or self._queue[0][0] > time.monotonic():
+                        timeout = self._queue[0][0] - time.monotonic() if self._queue else None
+                        self._condition.wait(timeout)
+                    _, _, payload = heapq.heappop(self._queue)
+
+                try:
+                    session.post(self.webhook_url, json=payload, timeout=30).raise_for_status()
+                    outcome = "webhooks_sent"
+                except requests.RequestException:
+                    outcome = "webhooks_failed"
+
+                with self._condition:
+                    self.stats[outcome] += 1
+
+    def get_stats(self):
+        with self._condition:
+            return dict(self.stats)
+
+
+class GraphAPISimulator:
+    """WSGI app implementing the subset of the Graph API used by the app."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0,
+            rate_limit=0, webhook_url=None, status_delay=1.0, templates=0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rate_limit = rate_limit
+        self.status_delay = status_delay
+        self.random = random.Random(seed)
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._window = {}
+        self._uploads = {}
+        self._templates = {}
+
+        for i in range(templates):
+            self._add_template({
+                "name": f"simulated_template_{i}",
+                "language": "en",
+                "category": "UTILITY",
+                "components": [{"type": "BODY", "text": "Hello {{1}}", "example": {"body_text": [["there"]]}}],
+            }, status="APPROVED")
+
+        self.emitter = None
+        if webhook_url:
+            self.emitter = WebhookEmitter(webhook_url)
+            self.emitter.start()
+
+        self.url_map = Map([
+            Rule("/_stats", endpoint="stats", methods=["GET"]),
+            Rule("/media/<media_id>", endpoint="download", methods=["GET"]),
+            Rule("/<version>/<phone_id>/messages", endpoint="messages", methods=["POST"]),
+            Rule("/<version>/<app_id>/uploads", endpoint="create_upload", methods=["POST"]),
+            Rule("/<version>/<waba_id>/message_templates", endpoint="templates", methods=["GET", "POST", "DELETE"]),
+            # the webhook fetches media as f"{url}{media_id}/", with a trailing slash
+            Rule("/<version>/<object_id>", endpoint="object", methods=["GET", "POST"], strict_slashes=False),
+        ])
+
+    def __call__(self, environ, start_response):
+        request = Request(environ)
+        adapter = self.url_map.bind_to_environ(environ)
+        try:
+            endpoint, values = adapter.match()
+            self._count(f"requests_{endpoint}")
+            if endpoint != "stats":
+                self._delay()
+                injected = self._inject_error(values.get("phone_id"))
+                if injected:
+                    return injected(environ, start_response)
+            response = getattr(self, f"on_{endpoint}")(request, **values)
+        except HTTPException as e:
+            response = e
+        return response(environ, start_response)
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _delay(self):
+        delay = self.latency + (self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _inject_error(self, phone_id):
+        if self._over_rate_limit(phone_id) or (self.throttle_rate and self.random.random() < self.throttle_rate):
+            self._count("throttled")
+            return error_response(429, 130429, "(#130429) Rate limit hit", "Cloud API message throughput has been reached.")
+        if self.error_rate and self.random.random() < self.error_rate:
+            self._count("errors")
+            return error_response(500, 131000, "(#131000) Something went wrong", "Simulated server error.")
+        return None
+
+    def _over_rate_limit(self, phone_id):
+        """Per phone_id, per second limit like a number's messaging tier."""
+        if not (self.rate_limit and phone_id):
+            return False
+        second = int(time.time())
+        with self._lock:
+            window_second, used = self._window.get(phone_id, (second, 0))
+            if window_second != second:
+                used = 0
+            self._window[phone_id] = (second, used + 1)
+        return used >= self.rate_limit
+
+    def on_stats(self, request):
+        with self._lock:
+            stats = dict(self.stats)
+        if self.emitter:
+            stats.update(self.emitter.get_stats())
+        return json_response(stats)
+
+    def on_messages(self, request, version, phone_id):
+        data = request.get_json(silent=True) or {}
+        to = data.get("to")
+        if not to:
+            return error_response(400, 100, "(#100) The parameter to is required.")
+
+        message_id = f"wamid.sim-{uuid.uuid4().hex}"
+        self._count("messages")
+        if self.emitter:
+            for i, status in enumerate(WEBHOOK_STATUSES, start=1):
+                self.emitter.schedule(
+                    self.status_delay * i, status_webhook(phone_id, message_id, to, status)
+                )
+
+        return json_response({
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": to, "wa_id": to}],
+            "messages": [{"id": message_id}],
+        })
+
+    def on_download(self, request, media_id):
+        return Response(SAMPLE_MEDIA, mimetype="image/png")
+
+    def on_create_upload(self, request, version, app_id):
+        upload_id = f"upload:{uuid.uuid4().hex}"
+        with self._lock:
+            self._uploads[upload_id] = {
+                "offset": 0,
+                "length": int(request.values.get("file_length") or 0),
+            }
+        return json_response({"id": upload_id})
+
+    def on_object(self, request, version, object_id):
+        if object_id.startswith("upload:"):
+            return self.on_upload(request, object_id)
+        if request.method != "GET":
+            raise NotFound()
+
+        return json_response({
+            "messaging_product": "whatsapp",
+            "url": f"{request.host_url}media/{object_id}",
+            "mime_type": "image/png",
+            "sha256": "",
+            "file_size": len(SAMPLE_MEDIA),
+            "id": object_id,
+        })
+
+    def on_upload(self, request, upload_id):
+        upload = self._uploads.get(upload_id)
+        if not upload:
+            raise NotFound()
+        if request.method == "GET":
+            with self._lock:
+                offset = upload["offset"]
+            return json_response({"id": upload_id, "file_offset": offset})
+
+        offset = int(request.headers.get("file_offset") or 0)
+        data = request.get_data()
+        with self._lock:
+            uploaded = upload["offset"]
+            accepted = offset == uploaded
+            if accepted:
+                upload["offset"] = uploaded = uploaded + len(data)
+
+        if not accepted:
+            return error_response(400, 100, f"Offset {offset} does not match uploaded {uploaded}")
+        if uploaded < upload["length"]:
+            return json_response({"id": upload_id, "file_offset": uploaded})
+        return json_response({"h": f"sim-handle-{upload_id.split(':', 1)[1]}"})
+
+    def on_templates(self, request, version, waba_id):
+        if request.method == "POST":
+            template = request.get_json(silent=True) or request.form.to_dict()
+            return json_response({"id": self._add_template(template)["id"], "status": "PENDING", "category": template.get("category")})
+
+        if request.method == "DELETE":
+            name = request.args.get("name")
+            with self._lock:
+                for template_id in [k for k, v in self._templates.items() if v["name"] == name]:
+                    del self._templates[template_id]
+            return json_response({"success": True})
+
+        with self._lock:
+            templates = list(self._templates.values())
+        limit = int(request.args.get("limit") or 25)
+        start = int(request.args.get("after") or 0)
+        page = {"data": templates[start:start + limit], "paging": {}}
+        if start + limit < len(templates):
+            query = urlencode({"limit": limit, "after": start + limit})
+            page["paging"]["next"] = f"{request.base_url}?{query}"
+        return json_response(page)
+
+    def _add_template(self, template, status="PENDING"):
+        template = dict(template, id=str(uuid.uuid4().int)[:15], status=status)
+        if isinstance(template.get("components"), str):
+            template["components"] = json.loads(template["components"])
+        with self._lock:
+            self._templates[template["id"]] = template
+        return template
+
+
+def json_response(data, status=200):
+    return Response(json.dumps(data), status=status, mimetype="application/json")
+
+
+def error_response(status, code, message, details=None):
+    error = {
+        "message": message,
+        "type": "OAuthException",
+        "code": code,
+        "fbtrace_id": uuid.uuid4().hex[:22],
+    }
+    if details:
+        error["error_data"] = {"messaging_product": "whatsapp", "details": details}
+        error["error_user_msg"] = details
+    return json_response({"error": error}, status=status)
+
+
+def status_webhook(phone_id, message_id, recipient, status):
+    """Status webhook payload in the shape Meta posts it."""
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "simulated-waba",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "15550000000", "phone_number_id": phone_id},
+                    "statuses": [{
+                        "id": message_id,
+                        "status": status,
+                        "timestamp": str(int(time.time())),
+                        "recipient_id": recipient,
+                        "conversation": {"id": f"simulated-conversation-{recipient}"},
+                    }],
+                },
+            }],
+        }],
+    }
+
+
+def serve(host="127.0.0.1", port=8765, **options):
+    """Run the simulator until interrupted."""
+    run_simple(host, port, GraphAPISimulator(**options), threaded=True, use_reloader=False)
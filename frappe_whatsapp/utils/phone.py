@@ -0,0 +1,118 @@
+"""Phone number normalization to E.164.
+
+Numbers are returned the way the Graph API expects them in ``to``: the
+E.164 digits without the leading ``+``. Anything that cannot be turned into
+8 to 15 digits is invalid and comes back as None, so callers can drop it
+before spending an API call on it.
+
+A national number written with a trunk ``0`` (``09876 543210``) gets the
+Default Country Code from WhatsApp Settings. A number without ``+``, ``00``
+or trunk ``0`` is kept when it is a valid international number, which is how
+numbers have always been stored (``6591234567`` stays in Singapore);
+otherwise it must be a valid national number of the default country
+(``9876543210`` becomes ``919876543210``) or it is invalid. That check uses
+``phonenumbers``, which Frappe depends on.
+``normalize_numbers`` works over a whole column at once for imports;
+``format_number`` is memoized for per-message calls.
+"""
+import math
+import re
+import string
+from functools import lru_cache
+
+import frappe
+import phonenumbers
+
+MIN_LENGTH = 8
+MAX_LENGTH = 15
+
+# separators people put in numbers, removed with one str.translate
+SEPARATORS = str.maketrans("", "", " \t\n-.()/\u00a0\u2010\u2011\u2012\u2013\u2014")
+NON_DIGITS = re.compile(r"\D")
+DIGITS = frozenset(string.digits)
+
+
+def get_default_country_code():
+    """Default Country Code from WhatsApp Settings, digits only."""
+    code = frappe.get_cached_value("WhatsApp Settings", "WhatsApp Settings", "default_country_code")
+    return NON_DIGITS.sub("", code or "")
+
+
+def normalize_numbers(numbers, default_country_code=""):
+    """Normalize a column of numbers, returning None for each invalid one."""
+    translate, digits_only, strip_digits = str.translate, DIGITS.issuperset, NON_DIGITS.sub
+    country_code = default_country_code or ""
+    result = []
+    append = result.append
+
+    for number in numbers:
+        if not number:
+            append(None)
+            continue
+
+        if type(number) is float:
+            # numeric spreadsheet and Parquet columns, NaN for empty cells
+            if not math.isfinite(number):
+                append(None)
+                continue
+            number = int(number)
+        number = translate(str(number), SEPARATORS)
+        international = number.startswith("+")
+        if international:
+            number = number[1:]
+        if not digits_only(number):
+            number = strip_digits("", number)
+
+        if not international:
+            if number.startswith("00"):
+                number = number[2:]
+            elif number.startswith("0"):
+                number = country_code + number[1:] if country_code else ""
+            elif country_code and number:
+                number = resolve_national_number(number, country_code) or ""
+
+        if MIN_LENGTH <= len(number) <= MAX_LENGTH and number[0] != "0":
+            append(number)
+        else:
+            append(None)
+
+    return result
+
+
+def resolve_national_number(number, country_code):
+    """E.164 digits of a number written without ``+``, ``00`` or trunk ``0``, or None.
+
+    A valid international number is kept as it is; otherwise the number has
+    to be a valid national number of ``country_code``, which is then added.
+    """
+    try:
+        if phonenumbers.is_valid_number(phonenumbers.parse("+" + number)):
+            return number
+        region = phonenumbers.region_code_for_country_code(int(country_code))
+        if region == phonenumbers.UNKNOWN_REGION:
+            # nothing to validate a national number against
+            return number
+        parsed = phonenumbers.parse(number, region)
+    except phonenumbers.NumberParseException:
+        return None
+
+    if not phonenumbers.is_valid_number(parsed):
+        return None
+    return f"{parsed.country_code}{parsed.national_number}"
+
+
+def normalize_number(number, default_country_code=""):
+    """Normalize one number, or None when it is not valid."""
+    return normalize_numbers((number,), default_country_code)[0]
+
+
+@lru_cache(maxsize=65536)
+def _format_number(number, default_country_code):
+    return normalize_number(number, default_country_code)
+
+
+def format_number(number):
+    """Normalize a number with the site's default country code, memoized."""
+    if not number:
+        return None
+    return _format_number(number, get_default_country_code())
@@ -0,0 +1,179 @@
+"""Streaming import of WhatsApp Recipient List rows from CSV or Parquet files.
+
+Files are read in batches of ``IMPORT_BATCH_SIZE`` rows. Each batch is
+normalized, deduplicated against the numbers already imported and written
+with one multi-row INSERT. Only the current batch and the set of numbers
+seen so far (one int per unique number) are held in memory.
+
+Parquet support needs ``pyarrow``, which is not a dependency of this app.
+"""
+import csv
+import os
+
+import frappe
+from frappe import _
+from frappe.utils import now
+
+from frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_recipient_list.whatsapp_recipient_list import (
+    IMPORT_BATCH_SIZE,
+    IMPORT_TIMEOUT,
+    RECIPIENT_INSERT_FIELDS,
+    build_recipients,
+    fail_import,
+    finish_import,
+    get_recipient_row,
+    start_import,
+)
+from frappe_whatsapp.utils.phone import get_default_country_code
+
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+
+
+def get_data_columns(data_columns):
+    """Column names from a comma separated string or a list."""
+    if not data_columns:
+        return []
+    if isinstance(data_columns, str):
+        data_columns = data_columns.split(",")
+    return [column.strip() for column in data_columns if column and column.strip()]
+
+
+def iter_csv_batches(path, columns, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """Yield lists of row dicts from a CSV file with a header row.
+
+    ``progress(done, total)`` is called per batch with bytes read.
+    """
+    total = os.path.getsize(path)
+    read = 0
+
+    with open(path, "rb") as file:
+
+        def lines():
+            nonlocal read
+            for line in file:
+                read += len(line)
+                yield line.decode("utf-8-sig", errors="replace")
+
+        reader = csv.DictReader(lines())
+        missing = [column for column in columns if column not in (reader.fieldnames or [])]
+        if missing:
+            frappe.throw(_("Columns not found in the file: {0}").format(", ".join(missing)))
+
+        batch = []
+        for row in reader:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+                if progress:
+                    progress(read, total)
+        if batch:
+            yield batch
+        if progress:
+            progress(total, total)
+
+
+def iter_parquet_batches(path, columns, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """Yield lists of row dicts from a Parquet file, reading only ``columns``.
+
+    ``progress(done, total)`` is called per batch with rows read.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        frappe.throw(_("Install pyarrow to import Parquet files"))
+
+    parquet_file = pq.ParquetFile(path)
+    missing = [column for column in columns if column not in parquet_file.schema_arrow.names]
+    if missing:
+        frappe.throw(_("Columns not found in the file: {0}").format(", ".join(missing)))
+
+    total = parquet_file.metadata.num_rows
+    read = 0
+    for record_batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+        read += record_batch.num_rows
+        yield record_batch.to_pylist()
+        if progress:
+            progress(read, total)
+
+
+def iter_file_batches(path, columns, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    if path.lower().endswith(PARQUET_EXTENSIONS):
+        return iter_parquet_batches(path, columns, batch_size, progress)
+    return iter_csv_batches(path, columns, batch_size, progress)
+
+
+def get_file_path(file_url):
+    """Path on disk of an attached file."""
+    file_doc = frappe.get_doc("File", {"file_url": file_url})
+    return file_doc.get_full_path()
+
+
+def enqueue_file_import(list_name, file_url, mobile_column, name_column=None, data_columns=None):
+    frappe.enqueue(
+        "frappe_whatsapp.utils.recipient_file.import_file_job",
+        queue="long",
+        timeout=IMPORT_TIMEOUT,
+        enqueue_after_commit=True,
+        list_name=list_name,
+        file_url=file_url,
+        mobile_column=mobile_column,
+        name_column=name_column,
+        data_columns=get_data_columns(data_columns),
+    )
+
+
+def import_file_job(list_name, file_url, mobile_column, name_column=None, data_columns=None):
+    """Background job: replace the recipients of a list with the rows of a file.
+
+    Rows are staged while the file is read and swapped in at the end, so a
+    bad file leaves the list as it was and marks it Failed.
+    """
+    data_columns = get_data_columns(data_columns)
+    columns = list(dict.fromkeys([mobile_column, *([name_column] if name_column else []), *data_columns]))
+    country_code = get_default_country_code()
+
+    def publish(done, total):
+        frappe.publish_progress(
+            done * 100 / total if total else 100,
+            title=_("Importing Recipients"),
+            doctype="WhatsApp Recipient List",
+            docname=list_name,
+        )
+
+    staging = start_import(list_name)
+    try:
+        seen = set()
+        imported = skipped = duplicates = 0
+        for records in iter_file_batches(get_file_path(file_url), columns, progress=publish):
+            recipients, invalid = build_recipients(records, mobile_column, name_column, data_columns, country_code)
+            skipped += invalid
+
+            rows = []
+            for recipient in recipients:
+                number = int(recipient["mobile_number"])
+                if number in seen:
+                    duplicates += 1
+                    continue
+                seen.add(number)
+                recipient["source_name"] = None
+                imported += 1
+                rows.append(get_recipient_row(staging, imported, recipient))
+
+            if rows:
+                frappe.db.bulk_insert("WhatsApp Recipient", RECIPIENT_INSERT_FIELDS, rows)
+            frappe.db.commit()
+
+        finish_import(list_name, staging, {"modified": now()})
+    except Exception:
+        frappe.db.rollback()
+        fail_import(list_name, staging)
+        raise
+
+    frappe.publish_realtime(
+        "whatsapp_recipient_import",
+        {"list_name": list_name, "count": imported, "skipped": skipped, "duplicates": duplicates},
+        doctype="WhatsApp Recipient List",
+        docname=list_name,
+    )
+    return imported
@@ -0,0 +1,112 @@
+"""Pool of sender phone numbers for campaigns.
+
+Every enabled row in the Sender Numbers table of WhatsApp Settings is a
+sender with its own Graph API ``phone_id`` and rate budget. Recipients are
+mapped to senders with a consistent hash ring, so a recipient always hears
+from the same number and adding or removing a number only moves the
+recipients that hashed to it.
+
+A sender's rate budget is shared by every worker through a per-second Redis
+counter; a worker that finds the current second used up waits for the next.
+"""
+import bisect
+import hashlib
+import time
+
+import frappe
+from frappe.utils import cint
+
+# points each sender gets on the ring, to spread recipients evenly
+VIRTUAL_NODES = 160
+
+_pools = {}
+
+
+def _hash(value):
+    return int(hashlib.md5(value.encode()).hexdigest()[:16], 16)
+
+
+class SenderPool:
+    """Consistent hash ring over the enabled sender numbers."""
+
+    def __init__(self, senders):
+        self.senders = senders
+        ring = sorted(
+            (_hash(f"{sender.phone_id}#{i}"), n)
+            for n, sender in enumerate(senders)
+            for i in range(VIRTUAL_NODES)
+        )
+        self._points = [point for point, _ in ring]
+        self._owners = [senders[n] for _, n in ring]
+
+    def __bool__(self):
+        return bool(self.senders)
+
+    def get_sender(self, mobile_number):
+        """Sender that owns a recipient number."""
+        if not self._points:
+            return None
+        i = bisect.bisect(self._points, _hash(mobile_number.lstrip("+")))
+        return self._owners[i % len(self._owners)]
+
+    def find(self, number):
+        """Sender registered with the given phone number or phone_id."""
+        number = (number or "").lstrip("+")
+        for sender in self.senders:
+            if number in (sender.phone_id, (sender.phone_number or "").lstrip("+")):
+                return sender
+        return None
+
+
+def get_sender_pool():
+    """Get the pool for the current site, rebuilt when the Sender Numbers change."""
+    settings = frappe.get_cached_doc("WhatsApp Settings", "WhatsApp Settings")
+    senders = tuple(
+        frappe._dict(
+            phone_id=row.phone_id,
+            phone_number=row.phone_number,
+            messages_per_second=cint(row.messages_per_second),
+        )
+        for row in settings.get("sender_numbers") or []
+        if row.enabled and row.phone_id
+    )
+    site = frappe.local.site
+    key = tuple(tuple(sender.values()) for sender in senders)
+    pool = _pools.get(site)
+    if pool is None or pool[0] != key:
+        # one pool per site: a change to the Sender Numbers replaces it
+        pool = _pools[site] = (key, SenderPool(list(senders)))
+    return pool[1]
+
+
+def get_campaign_sender(context, pool, mobile_number):
+    """Sender for one campaign recipient, or None to use the default phone_id.
+
+    A campaign using the pool hashes the recipient onto it; otherwise a
+    ``from_number`` on the campaign pins every message to that sender.
+    """
+    if context.get("use_sender_pool"):
+        return pool.get_sender(mobile_number)
+    if context.get("from_number"):
+        return pool.find(context.from_number)
+    return None
+
+
+def wait_for_budget(sender):
+    """Block until the sender has room in its per-second rate budget."""
+    rate = cint(sender.messages_per_second)
+    if rate <= 0:
+        return
+
+    cache = frappe.cache()
+    while True:
+        timestamp = time.time()
+        second = int(timestamp)
+        key = cache.make_key(f"whatsapp_sender_rate:{sender.phone_id}:{second}")
+        pipe = cache.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, 2)
+        used = pipe.execute()[0]
+        if used <= rate:
+            return
+        time.sleep(second + 1 - timestamp)
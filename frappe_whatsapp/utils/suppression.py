@@ -0,0 +1,188 @@
+"""Opt-out and suppression checks for outgoing messages.
+
+Suppressed numbers are stored as WhatsApp Suppression docs. They are fed by
+opt-out keywords in incoming messages and by permanent failure codes from
+Meta, and can be added by hand.
+
+Every send path asks ``is_suppressed`` before it builds a payload. Each
+process keeps a Bloom filter of the suppressed numbers, so the common case
+(a number that is not suppressed) is answered in memory. Bloom hits are
+confirmed against an exact Redis set. The filter is rebuilt from that set
+when the suppression version in Redis changes, checked at most every
+``REFRESH_SECONDS``. The set is only filled from the database when Redis
+has lost it, and suppressions reach Redis once their transaction commits.
+"""
+import hashlib
+import math
+import time
+
+import frappe
+
+from frappe_whatsapp.utils.phone import format_number
+
+SUPPRESSED_KEY = "whatsapp_suppressed_numbers"
+VERSION_KEY = "whatsapp_suppression_version"
+REFRESH_SECONDS = 10
+
+# "stop promotions" is the text of the opt-out button Meta adds to marketing templates
+OPT_OUT_KEYWORDS = {"stop", "stopall", "unsubscribe", "quit", "opt out", "optout", "stop promotions"}
+OPT_IN_KEYWORDS = {"start", "unstop", "subscribe"}
+
+# Meta error codes that will fail again for the same number:
+# 131026 message undeliverable (not a WhatsApp user), 131050 user stopped marketing messages
+PERMANENT_ERROR_CODES = {131026, 131050}
+
+_filters = {}
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, sized for about 1% false positives."""
+
+    def __init__(self, values, bits_per_value=10, hash_count=7):
+        values = list(values)
+        self.size = max(len(values) * bits_per_value, 1024)
+        self.hash_count = hash_count
+        self.bits = bytearray(math.ceil(self.size / 8))
+        for value in values:
+            self.add(value)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+def _redis_key(key):
+    return frappe.cache().make_key(key)
+
+
+def get_version():
+    return frappe.safe_decode(frappe.cache().get(_redis_key(VERSION_KEY)))
+
+
+def load_suppressed_numbers():
+    """Fill the Redis set from the database and return the numbers.
+
+    Numbers are only added: a suppression committed while the table is read
+    reaches the set through its own after-commit update and is never dropped.
+    """
+    numbers = frappe.get_all("WhatsApp Suppression", pluck="mobile_number")
+    pipe = frappe.cache().pipeline()
+    for start in range(0, len(numbers), 10000):
+        pipe.sadd(_redis_key(SUPPRESSED_KEY), *numbers[start:start + 10000])
+    pipe.set(_redis_key(VERSION_KEY), frappe.generate_hash(length=8), nx=True)
+    pipe.execute()
+    return numbers
+
+
+def get_suppressed_numbers():
+    """Numbers in the shared Redis set, loading it from the database if Redis lost it."""
+    if not get_version():
+        return load_suppressed_numbers()
+    return [frappe.safe_decode(number) for number in frappe.cache().smembers(SUPPRESSED_KEY)]
+
+
+def get_filter():
+    """This process's Bloom filter, rebuilt when the suppression version changes."""
+    key = frappe.local.site
+    entry = _filters.get(key)
+    now = time.monotonic()
+    if entry and now < entry["checked_at"] + REFRESH_SECONDS:
+        return entry["filter"]
+
+    version = get_version()
+    if entry and version and entry["version"] == version:
+        entry["checked_at"] = now
+        return entry["filter"]
+
+    numbers = get_suppressed_numbers()
+    entry = {"filter": BloomFilter(numbers), "version": get_version(), "checked_at": now}
+    _filters[key] = entry
+    return entry["filter"]
+
+
+def is_suppressed(number):
+    """Whether messages to a number must be dropped."""
+    number = format_number(number)
+    if not number or number not in get_filter():
+        return False
+
+    pipe = frappe.cache().pipeline()
+    pipe.sismember(_redis_key(SUPPRESSED_KEY), number)
+    pipe.exists(_redis_key(SUPPRESSED_KEY))
+    is_member, set_exists = pipe.execute()
+    if not set_exists:
+        # evicted from Redis, the database decides
+        return number in load_suppressed_numbers()
+    return bool(is_member)
+
+
+def add_to_cache(number):
+    """Make a newly suppressed number visible to every process, once it is committed."""
+    pipe = frappe.cache().pipeline()
+    pipe.sadd(_redis_key(SUPPRESSED_KEY), number)
+    pipe.set(_redis_key(VERSION_KEY), frappe.generate_hash(length=8))
+    pipe.execute()
+
+    entry = _filters.get(frappe.local.site)
+    if entry:
+        entry["filter"].add(number)
+
+
+def remove_from_cache(number):
+    # a Bloom filter cannot forget, the exact set decides
+    pipe = frappe.cache().pipeline()
+    pipe.srem(_redis_key(SUPPRESSED_KEY), number)
+    pipe.set(_redis_key(VERSION_KEY), frappe.generate_hash(length=8))
+    pipe.execute()
+
+
+def suppress(number, reason, source=None):
+    """Suppress a number, if it is not already."""
+    number = format_number(number)
+    if not number or frappe.db.exists("WhatsApp Suppression", number):
+        return
+    frappe.get_doc({
+        "doctype": "WhatsApp Suppression",
+        "mobile_number": number,
+        "reason": reason,
+        "source": source,
+    }).insert(ignore_permissions=True)
+
+
+def unsuppress(number, reason=None):
+    """Lift the suppression of a number, optionally only one with the given reason."""
+    number = format_number(number)
+    if not number:
+        return
+    filters = {"name": number}
+    if reason:
+        filters["reason"] = reason
+    for name in frappe.get_all("WhatsApp Suppression", filters=filters, pluck="name"):
+        frappe.delete_doc("WhatsApp Suppression", name, ignore_permissions=True)
+
+
+def handle_incoming_text(number, text):
+    """Apply an opt-out or opt-in keyword sent by a user."""
+    keyword = " ".join((text or "").lower().split())
+    if keyword in OPT_OUT_KEYWORDS:
+        suppress(number, "Opt-out", keyword)
+    elif keyword in OPT_IN_KEYWORDS:
+        unsuppress(number, "Opt-out")
+
+
+def handle_error_code(number, code):
+    """Suppress a number Meta reported a permanent failure for."""
+    try:
+        code = int(code)
+    except (TypeError, ValueError):
+        return
+    if code in PERMANENT_ERROR_CODES:
+        suppress(number, "Invalid Number", str(code))
@@ -0,0 +1,138 @@
+"""Compiled WhatsApp Templates for payload construction.
+
+Loading a WhatsApp Templates doc with its buttons for every send is the
+most expensive part of building a template message. A template is compiled
+once into the static parts of the payload (name, language, body parameter
+slots, header kind and button layout) and cached per process, keyed on the
+doc's ``modified`` timestamp, so sending only has to fill in the slots.
+"""
+from collections import OrderedDict
+
+import frappe
+
+# sub_type used for each template button type when sending a template message
+BUTTON_SUB_TYPES = {
+    "QUICK_REPLY": "quick_reply",
+    "URL": "url",
+    "PHONE_NUMBER": "phone_number",
+    "COPY_CODE": "copy_code",
+    "FLOW": "flow",
+}
+
+BUTTON_FIELDS = (
+    "button_text", "button_type", "url", "phone_number", "copy_code_example",
+    "flow_id", "flow_action", "navigate_screen",
+)
+
+# compiled templates kept per process, least recently used dropped first
+MAX_COMPILED_TEMPLATES = 256
+
+_compiled_templates = OrderedDict()
+
+
+class CompiledTemplate:
+    """Static, read-only view of a WhatsApp Templates doc."""
+
+    def __init__(self, doc):
+        self.name = doc.name
+        self.modified = doc.modified
+        self.template_name = doc.template_name
+        self.actual_name = doc.actual_name
+        self.language_code = doc.language_code
+        self.header_type = doc.header_type
+        self.sample = doc.sample
+        self.sample_values = doc.sample_values
+        self.field_names = doc.field_names
+        self.buttons = tuple(
+            frappe._dict({field: button.get(field) for field in BUTTON_FIELDS})
+            for button in (doc.buttons or [])
+        )
+
+        # body parameter slots, in template order
+        self.body_fields = ()
+        if self.sample_values:
+            fields = self.field_names or self.sample_values
+            self.body_fields = tuple(f.strip() for f in fields.split(","))
+
+        self.button_sub_types = tuple(
+            BUTTON_SUB_TYPES.get(button.button_type) for button in self.buttons
+        )
+
+    def get(self, key, default=None):
+        """Dict style access, mirroring `Document.get`."""
+        return getattr(self, key, default)
+
+    def new_payload(self, to, name=None):
+        """Fresh message payload with the static template skeleton filled in."""
+        return {
+            "messaging_product": "whatsapp",
+            "to": to,
+            "type": "template",
+            "template": {
+                "name": name or self.actual_name,
+                "language": {"code": self.language_code},
+                "components": [],
+            },
+        }
+
+    @staticmethod
+    def body_component(values):
+        """Body component for the given parameter values."""
+        return {
+            "type": "body",
+            "parameters": [{"type": "text", "text": value} for value in values],
+        }
+
+    def button_component(self, index, value):
+        """Component for the button at ``index`` with its dynamic value, or None."""
+        sub_type = self.button_sub_types[index] if index < len(self.button_sub_types) else None
+        if not sub_type:
+            return None
+
+        if sub_type == "quick_reply":
+            parameter = {"type": "payload", "payload": value}
+        elif sub_type == "flow":
+            parameter = {"type": "action", "action": {"flow_token": value}}
+        else:
+            parameter = {"type": "text", "text": value}
+        return {"type": "button", "sub_type": sub_type, "index": str(index), "parameters": [parameter]}
+
+    def sample_header_component(self):
+        """Image header pointing at the template sample, if it has one."""
+        if self.header_type != "IMAGE" or not self.sample:
+            return None
+
+        if self.sample.startswith("http"):
+            url = self.sample
+        else:
+            url = f"{frappe.utils.get_url()}{self.sample}"
+
+        return {
+            "type": "header",
+            "parameters": [{"type": "image", "image": {"link": url}}],
+        }
+
+
+def get_compiled_template(name):
+    """Get the compiled template, recompiling when the doc was modified."""
+    key = (frappe.local.site, name)
+    modified = frappe.db.get_value("WhatsApp Templates", name, "modified")
+    if not modified:
+        frappe.throw(f"WhatsApp Template {name} not found", frappe.DoesNotExistError)
+
+    compiled = _compiled_templates.get(key)
+    if compiled and compiled.modified == modified:
+        _compiled_templates.move_to_end(key)
+        return compiled
+
+    compiled = CompiledTemplate(frappe.get_doc("WhatsApp Templates", name))
+    _compiled_templates[key] = compiled
+    _compiled_templates.move_to_end(key)
+    while len(_compiled_templates) > MAX_COMPILED_TEMPLATES:
+        _compiled_templates.popitem(last=False)
+    return compiled
+
+
+def clear_compiled_templates():
+    """Drop every compiled template held by this process."""
+    _compiled_templates.clear()
@@ -0,0 +1,413 @@
+# Copyright (c) 2026, Shridhar Patil and Contributors
+# See license.txt
+
+import json
+from unittest.mock import MagicMock, call, patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from frappe_whatsapp.frappe_whatsapp.doctype.whatsapp_message import whatsapp_message
+from frappe_whatsapp.utils import campaign
+
+CAMPAIGN = "BULK-WA-TEST"
+CONTEXT = {
+    "name": CAMPAIGN,
+    "use_template": 0,
+    "recipient_count": 60,
+    "parenttype": "WhatsApp Recipient List",
+    "parent": "Test List",
+}
+
+
+def make_recipients(start, end):
+    return [frappe._dict(idx=idx, mobile_number=f"9198000{idx:05d}") for idx in range(start + 1, end + 1)]
+
+
+class TestCampaignChunks(UnitTestCase):
+    def test_chunks_cover_idx_range(self):
+        with patch.object(frappe.db, "sql", return_value=[[1201]]):
+            self.assertEqual(campaign.get_chunks(CONTEXT, chunk_size=500), [(0, 500), (500, 1000), (1000, 1201)])
+        with patch.object(frappe.db, "sql", return_value=[[500]]):
+            self.assertEqual(campaign.get_chunks(CONTEXT, chunk_size=500), [(0, 500)])
+        with patch.object(frappe.db, "sql", return_value=[[None]]):
+            self.assertEqual(campaign.get_chunks(CONTEXT, chunk_size=500), [])
+
+    def test_release_enqueues_one_job_per_chunk(self):
+        chunks = [(0, 500), (500, 1000), (1000, 1201)]
+        with (
+            patch.object(campaign, "get_campaign_context", return_value=CONTEXT),
+            patch.object(campaign, "get_chunks", return_value=chunks),
+            patch.object(campaign, "register_chunks") as register_chunks,
+            patch.object(campaign, "enqueue_chunk") as enqueue_chunk,
+            patch.object(frappe, "cache", return_value=MagicMock()),
+        ):
+            campaign.release_campaign(frappe._dict(name=CAMPAIGN, ramp_up_minutes=0))
+
+        register_chunks.assert_called_once_with(CAMPAIGN, chunks)
+        self.assertEqual(enqueue_chunk.call_args_list, [call(CONTEXT, start, end) for start, end in chunks])
+
+
+    def test_ramp_up_offsets(self):
+        self.assertEqual(campaign.get_ramp_up_offsets(3, 0), [0, 0, 0])
+        self.assertEqual(campaign.get_ramp_up_offsets(4, 100), [0, 50, 70, 86])
+
+    def test_ramp_up_parks_later_chunks(self):
+        cache = MagicMock()
+        cache.make_key.side_effect = lambda key: key
+        chunks = [(0, 500), (500, 1000)]
+        with (
+            patch.object(campaign, "register_chunks"),
+            patch.object(campaign, "enqueue_chunk") as enqueue_chunk,
+            patch.object(frappe, "cache", return_value=cache),
+        ):
+            campaign.release_chunks(CONTEXT, chunks, [0, 30], 1000)
+
+        enqueue_chunk.assert_called_once_with(CONTEXT, 0, 500)
+        member = json.dumps({"context": CONTEXT, "start": 500, "end": 1000}, sort_keys=True)
+        cache.pipeline.return_value.zadd.assert_called_once_with(campaign.SCHEDULED_CHUNKS_KEY, {member: 1030})
+
+    def test_scheduler_releases_due_campaigns_and_chunks(self):
+        doc = MagicMock(docstatus=1, status="Scheduled")
+        chunk = json.dumps({"context": CONTEXT, "start": 500, "end": 1000})
+        due = {campaign.SCHEDULED_CAMPAIGNS_KEY: [CAMPAIGN], campaign.SCHEDULED_CHUNKS_KEY: [chunk]}
+        with (
+            patch.object(campaign, "restore_scheduled_campaigns"),
+            patch.object(campaign, "pop_due", side_effect=lambda key, timestamp: due[key]),
+            patch.object(frappe, "get_doc", return_value=doc),
+            patch.object(campaign, "release_campaign") as release_campaign,
+            patch.object(campaign, "enqueue_chunk") as enqueue_chunk,
+        ):
+            campaign.scheduler_tick()
+
+        doc.db_set.assert_called_once_with("status", "Queued")
+        release_campaign.assert_called_once_with(doc)
+        enqueue_chunk.assert_called_once_with(CONTEXT, 500, 1000)
+
+
+    def test_segment_chunks_page_by_name(self):
+        segment = {"doctype": "Customer", "filters": [["disabled", "=", 0]]}
+        pages = iter([["CUST-1", "CUST-2"], ["CUST-3", "CUST-4"], ["CUST-5"]])
+        with patch.object(frappe, "get_all", side_effect=lambda *args, **kwargs: next(pages)) as get_all:
+            chunks = list(campaign.iter_segment_chunks(segment, 2))
+
+        self.assertEqual(chunks, [("", "CUST-2", 2), ("CUST-2", "CUST-4", 2), ("CUST-4", "CUST-5", 1)])
+        self.assertEqual(get_all.call_args_list[1].kwargs["filters"], [["disabled", "=", 0], ["name", ">", "CUST-2"]])
+
+    def test_segment_recipients_use_the_source_name_as_idx(self):
+        segment = {
+            "doctype": "Customer", "mobile_field": "mobile_no", "name_field": "customer_name",
+            "filters": [["disabled", "=", 0]], "data_fields": ["city"],
+        }
+        records = [frappe._dict(name="CUST-3", mobile_no="919876500003", customer_name="Asha", city="Pune")]
+        with (
+            patch.object(campaign, "get_import_fields", return_value=["mobile_no", "customer_name", "city"]),
+            patch.object(frappe, "get_all", return_value=records) as get_all,
+        ):
+            recipients = campaign.get_segment_recipients(segment, "CUST-2", "CUST-4")
+
+        self.assertEqual(
+            get_all.call_args.kwargs["filters"],
+            [["disabled", "=", 0], ["name", ">", "CUST-2"], ["name", "<=", "CUST-4"]],
+        )
+        self.assertEqual(recipients, [frappe._dict(
+            name="CUST-3", idx="CUST-3", mobile_number="919876500003", recipient_name="Asha",
+            recipient_data='{"city": "Pune"}',
+        )])
+
+class TestCampaignChunkWorker(UnitTestCase):
+    def run_chunk(self, start, end, checkpoint, controls):
+        """Send a chunk with Redis and the database mocked, returning the mocks."""
+        recipients = make_recipients(checkpoint, end)
+        with (
+            patch.object(campaign, "get_control", side_effect=controls) as get_control,
+            patch.object(campaign, "acquire_chunk_lock", return_value=True),
+            patch.object(campaign, "release_chunk_lock") as release_chunk_lock,
+            patch.object(campaign, "get_checkpoint", return_value=checkpoint),
+            patch.object(campaign, "set_checkpoint") as set_checkpoint,
+            patch.object(campaign, "get_chunk_recipients", return_value=recipients) as get_chunk_recipients,
+            patch.object(campaign, "send_to_recipient", return_value=True),
+            patch.object(campaign, "record_processed") as record_processed,
+            patch.object(campaign, "seed_counters"),
+            patch.object(frappe.db, "set_value"),
+            patch.object(frappe.db, "commit"),
+        ):
+            campaign.send_campaign_chunk(CONTEXT, start, end)
+
+        return frappe._dict(
+            get_control=get_control,
+            release_chunk_lock=release_chunk_lock,
+            set_checkpoint=set_checkpoint,
+            get_chunk_recipients=get_chunk_recipients,
+            record_processed=record_processed,
+        )
+
+    def test_chunk_checkpoints_every_batch(self):
+        mocks = self.run_chunk(0, 60, 0, [None, None, None])
+
+        self.assertEqual(
+            mocks.set_checkpoint.call_args_list,
+            [call(CONTEXT["name"], 0, 60, idx) for idx in (25, 50, 60, 60)],
+        )
+        self.assertEqual([c.args[1:] for c in mocks.record_processed.call_args_list], [(25, 0, 0), (25, 0, 0), (10, 0, 0)])
+        mocks.release_chunk_lock.assert_called_once_with(CONTEXT["name"], 0)
+
+    def test_paused_chunk_keeps_checkpoint(self):
+        mocks = self.run_chunk(0, 60, 0, [None, None, "paused"])
+
+        self.assertEqual(
+            mocks.set_checkpoint.call_args_list,
+            [call(CONTEXT["name"], 0, 60, 25), call(CONTEXT["name"], 0, 60, 50)],
+        )
+        self.assertEqual(mocks.record_processed.call_count, 2)
+
+    def test_resumed_chunk_starts_after_checkpoint(self):
+        mocks = self.run_chunk(0, 60, 50, [None])
+
+        mocks.get_chunk_recipients.assert_called_once()
+        self.assertEqual(mocks.get_chunk_recipients.call_args.args[1:], (50, 60))
+        self.assertEqual(mocks.set_checkpoint.call_args_list[-1], call(CONTEXT["name"], 0, 60, 60))
+
+    def test_finished_chunk_is_not_resent(self):
+        mocks = self.run_chunk(0, 60, 60, [None])
+
+        mocks.get_chunk_recipients.assert_not_called()
+        mocks.set_checkpoint.assert_not_called()
+
+
+    def test_template_chunk_bulk_inserts_its_messages(self):
+        template = MagicMock()
+        template.sample_header_component.return_value = None
+        context = frappe._dict(CONTEXT, use_template=1, template="order_update")
+        recipients = make_recipients(0, 3)
+        results = iter([("wamid.1", None), (None, "Invalid parameter"), ("wamid.3", None)])
+        with (
+            patch.object(campaign, "get_compiled_template", return_value=template),
+            patch.object(whatsapp_message, "get_template_buttons_component", return_value=None),
+            patch.object(campaign, "get_messages_endpoint", return_value=("https://graph/messages", {})),
+            patch.object(campaign, "get_sender_pool", return_value=None),
+            patch.object(campaign, "get_campaign_sender", return_value=None),
+            patch.object(campaign, "format_number", side_effect=lambda number: number),
+            patch.object(campaign, "is_suppressed", side_effect=lambda to: to.endswith("3")),
+            patch.object(campaign, "build_template_payload", side_effect=lambda t, to, v, c: ({"to": to}, [])),
+            patch.object(campaign, "post_message", side_effect=lambda *args: next(results)),
+            patch.object(frappe.db, "bulk_insert") as bulk_insert,
+            patch.object(frappe, "get_doc") as get_doc,
+        ):
+            self.assertEqual(campaign.send_template_chunk(context, recipients, MagicMock()), (1, 1, 1))
+
+        bulk_insert.assert_called_once()
+        doctype, fields, rows = bulk_insert.call_args.args
+        self.assertEqual((doctype, fields), ("WhatsApp Message", campaign.MESSAGE_INSERT_FIELDS))
+        self.assertEqual(
+            [(row[fields.index("status")], row[fields.index("message_id")]) for row in rows],
+            [("Success", "wamid.1"), ("Failed", None)],
+        )
+        get_doc.return_value.insert.assert_called_once_with(ignore_permissions=True)
+
+class TestCampaignCounters(UnitTestCase):
+    def test_seed_only_missing_counters(self):
+        cache = MagicMock()
+        cache.make_key.side_effect = lambda key: key
+        pipe = cache.pipeline.return_value
+        counters = {"sent": 5, "failed": None, "delivered": 3, "read": None, "processed": None}
+        stored = frappe._dict(sent_count=5, failed_count=2, delivered_count=3, read_count=1)
+
+        with (
+            patch.object(campaign, "get_counters", return_value=counters),
+            patch.object(frappe.db, "get_value", return_value=stored),
+            patch.object(frappe, "cache", return_value=cache),
+        ):
+            campaign.seed_counters(CAMPAIGN)
+
+        self.assertEqual(pipe.set.call_args_list, [
+            call(f"whatsapp_campaign:{CAMPAIGN}:failed", 2, ex=campaign.COUNTER_TTL, nx=True),
+            call(f"whatsapp_campaign:{CAMPAIGN}:read", 1, ex=campaign.COUNTER_TTL, nx=True),
+            call(f"whatsapp_campaign:{CAMPAIGN}:processed", 7, ex=campaign.COUNTER_TTL, nx=True),
+        ])
+
+    def test_seeded_counters_skip_the_database(self):
+        counters = {"sent": 5, "failed": 0, "delivered": 3, "read": 1, "processed": 5}
+        with (
+            patch.object(campaign, "get_counters", return_value=counters),
+            patch.object(frappe.db, "get_value") as get_value,
+        ):
+            campaign.seed_counters(CAMPAIGN)
+        get_value.assert_not_called()
+
+    def test_status_change_seeds_before_incrementing(self):
+        calls = MagicMock()
+        with (
+            patch.object(campaign, "seed_counters", calls.seed_counters),
+            patch.object(campaign, "increment_counters", calls.increment_counters),
+        ):
+            campaign.record_status_change(CAMPAIGN, "Success", "delivered")
+            campaign.record_status_change(CAMPAIGN, "delivered", "failed")
+            campaign.record_status_change(CAMPAIGN, "Failed", "failed")
+            campaign.record_status_change(CAMPAIGN, "read", "read")
+            campaign.record_status_change(None, "Success", "read")
+
+        self.assertEqual(calls.mock_calls, [
+            call.seed_counters(CAMPAIGN),
+            call.increment_counters(CAMPAIGN, delivered=1),
+            call.seed_counters(CAMPAIGN),
+            call.increment_counters(CAMPAIGN, sent=-1, failed=1),
+        ])
+
+
+class TestCampaignProgress(UnitTestCase):
+    def test_status_counts_group_statuses_into_buckets(self):
+        rows = [
+            (CAMPAIGN, "success", 4),
+            (CAMPAIGN, "delivered", 3),
+            (CAMPAIGN, "read", 2),
+            (CAMPAIGN, "failed", 1),
+            (CAMPAIGN, "queued", 5),
+        ]
+        with patch.object(frappe.db, "sql", return_value=rows) as sql:
+            counts = campaign.get_status_counts([CAMPAIGN, "BULK-WA-OTHER"])
+
+        sql.assert_called_once()
+        self.assertEqual(counts[CAMPAIGN], {"sent": 9, "failed": 1, "queued": 5, "delivered": 3, "read": 2})
+        self.assertEqual(counts["BULK-WA-OTHER"], {"sent": 0, "failed": 0, "queued": 0, "delivered": 0, "read": 0})
+
+    def test_status_counts_without_campaigns_skip_the_query(self):
+        with patch.object(frappe.db, "sql") as sql:
+            self.assertEqual(campaign.get_status_counts([]), {})
+        sql.assert_not_called()
+
+    def test_progress_reads_counters(self):
+        counters = {"sent": 30, "failed": 10, "delivered": 0, "read": 0, "processed": 45}
+        with (
+            patch.object(campaign, "get_counters", return_value=counters),
+            patch.object(campaign, "get_status_counts") as get_status_counts,
+        ):
+            progress = campaign.get_progress(CAMPAIGN, 60)
+
+        get_status_counts.assert_not_called()
+        self.assertEqual(progress, {"total": 60, "sent": 30, "failed": 10, "queued": 15, "percent": 50.0})
+
+    def test_progress_falls_back_to_one_aggregate_query(self):
+        counters = dict.fromkeys(("sent", "failed", "delivered", "read", "processed"))
+        counts = {CAMPAIGN: {"sent": 12, "failed": 3, "queued": 5, "delivered": 0, "read": 0}}
+        with (
+            patch.object(campaign, "get_counters", return_value=counters),
+            patch.object(campaign, "get_status_counts", return_value=counts),
+        ):
+            progress = campaign.get_progress(CAMPAIGN, 20)
+
+        self.assertEqual(progress, {"total": 20, "sent": 12, "failed": 3, "queued": 5, "percent": 60.0})
+
+
+class TestCampaignControl(UnitTestCase):
+    def resume(self, checkpoints, counts=None, processed=None):
+        doc = MagicMock()
+        doc.name = CAMPAIGN
+        cache = MagicMock()
+        cache.hgetall.return_value = checkpoints
+        with (
+            patch.object(frappe, "cache", return_value=cache),
+            patch.object(frappe.db, "get_value", return_value=frappe._dict(counts or {})),
+            patch.object(campaign, "get_counters", return_value={"processed": processed}),
+            patch.object(campaign, "set_control") as set_control,
+            patch.object(campaign, "queue_campaign") as queue_campaign,
+            patch.object(campaign, "get_campaign_context", return_value={"name": CAMPAIGN}),
+            patch.object(campaign, "enqueue_chunk") as enqueue_chunk,
+        ):
+            campaign.resume_campaign(doc)
+        return frappe._dict(doc=doc, set_control=set_control, queue_campaign=queue_campaign, enqueue_chunk=enqueue_chunk)
+
+    def test_resume_requeues_unfinished_chunks(self):
+        mocks = self.resume({b"0:500": 500, b"500:1000": 725, b"1000:1201": 1000})
+
+        mocks.set_control.assert_called_once_with(CAMPAIGN)
+        mocks.doc.db_set.assert_called_once_with("status", "In Progress")
+        self.assertEqual(
+            mocks.enqueue_chunk.call_args_list,
+            [call({"name": CAMPAIGN}, 500, 1000), call({"name": CAMPAIGN}, 1000, 1201)],
+        )
+        mocks.queue_campaign.assert_not_called()
+
+    def test_resume_releases_campaign_paused_before_release(self):
+        mocks = self.resume({}, counts={"sent_count": 0, "failed_count": 0})
+
+        mocks.doc.db_set.assert_called_once_with("status", "Queued")
+        mocks.queue_campaign.assert_called_once_with(mocks.doc)
+
+    def test_resume_never_rereleases_a_started_campaign(self):
+        for counts, processed in (({"sent_count": 40}, None), ({}, 3)):
+            with self.assertRaises(frappe.ValidationError):
+                self.resume({}, counts=counts, processed=processed)
+
+    def test_pause_flushes_counters_and_keeps_checkpoints(self):
+        doc = MagicMock()
+        doc.name = CAMPAIGN
+        cache = MagicMock()
+        cache.make_key.side_effect = lambda key: key
+        with (
+            patch.object(frappe, "cache", return_value=cache),
+            patch.object(campaign, "flush_counters") as flush_counters,
+        ):
+            campaign.pause_campaign(doc)
+
+        cache.set.assert_called_once_with(
+            f"whatsapp_campaign_control:{CAMPAIGN}", "paused", ex=campaign.COUNTER_TTL
+        )
+        cache.zrem.assert_called_once_with(campaign.SCHEDULED_CAMPAIGNS_KEY, CAMPAIGN)
+        cache.delete.assert_not_called()
+        flush_counters.assert_called_once_with(CAMPAIGN)
+        doc.db_set.assert_called_once_with("status", "Paused")
+
+    def test_cancel_drops_scheduled_work(self):
+        doc = MagicMock()
+        doc.name = CAMPAIGN
+        with (
+            patch.object(campaign, "set_control") as set_control,
+            patch.object(campaign, "unschedule_campaign") as unschedule_campaign,
+            patch.object(campaign, "flush_counters"),
+        ):
+            campaign.cancel_campaign(doc)
+
+        set_control.assert_called_once_with(CAMPAIGN, "cancelled")
+        unschedule_campaign.assert_called_once_with(CAMPAIGN)
+        doc.db_set.assert_called_once_with("status", "Cancelled")
+
+    def test_chunk_fields_round_trip(self):
+        self.assertEqual(campaign._chunk_field(0, 500), "0:500")
+        self.assertEqual(campaign._parse_chunk_field(b"0:500"), (0, 500))
+        # segment chunks are name ranges, which may contain ":"
+        field = campaign._chunk_field("", "CUST:0042")
+        self.assertEqual(campaign._parse_chunk_field(field), ("", "CUST:0042"))
+
+    def test_checkpoints_expire_with_the_counters(self):
+        cache = MagicMock()
+        cache.make_key.side_effect = lambda key: key
+        with patch.object(frappe, "cache", return_value=cache):
+            campaign.register_chunks(CAMPAIGN, [(0, 500), (500, 800)])
+            campaign.set_checkpoint(CAMPAIGN, 0, 500, 25)
+
+        self.assertEqual(cache.hset.call_count, 3)
+        self.assertEqual(
+            cache.expire.call_args_list,
+            [call(f"whatsapp_campaign_chunks:{CAMPAIGN}", campaign.COUNTER_TTL)] * 2,
+        )
+
+    def test_scheduler_leaves_segment_campaigns_to_their_chunks(self):
+        from frappe_whatsapp.utils import bulk_messaging
+
+        campaigns = [
+            frappe._dict(name="SEGMENT", recipient_count=10, recipient_type="Recipient List", recipient_list="Segment"),
+            frappe._dict(name="STATIC", recipient_count=10, recipient_type="Recipient List", recipient_list="Static"),
+            frappe._dict(name="RUNNING", recipient_count=10, recipient_type="Individual", recipient_list=None),
+        ]
+        processed = {"SEGMENT": 12, "STATIC": 10, "RUNNING": 9}
+        with (
+            patch.object(bulk_messaging, "flush_active_campaigns"),
+            patch.object(frappe, "get_all", return_value=campaigns),
+            patch.object(bulk_messaging, "get_segment", side_effect=lambda name: {} if name == "Static" else {"doctype": "Customer"}),
+            patch.object(campaign, "get_counters", side_effect=lambda name, counter: {counter: processed[name]}),
+            patch.object(campaign, "complete_campaign") as complete_campaign,
+        ):
+            bulk_messaging.schedule_bulk_messages()
+
+        complete_campaign.assert_called_once_with("STATIC")
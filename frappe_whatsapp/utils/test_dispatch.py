@@ -0,0 +1,44 @@
+# Copyright (c) 2026, Shridhar Patil and Contributors
+# See license.txt
+
+import json
+from unittest.mock import MagicMock, patch
+
+import requests
+from frappe.tests import UnitTestCase
+
+from frappe_whatsapp.utils.dispatch import Dispatcher
+
+
+def make_session():
+    def post(url, headers, data, timeout):
+        to = json.loads(data)["to"]
+        response = MagicMock(ok=to != "bad", text="error")
+        if to == "down":
+            raise requests.ConnectionError("connection reset")
+        if to == "bad":
+            response.json.return_value = {"error": {"code": 131026, "message": "(#131026) Message undeliverable"}}
+        else:
+            response.json.return_value = {"messages": [{"id": f"wamid.{to}"}]}
+        return response
+
+    session = MagicMock()
+    session.post.side_effect = post
+    return session
+
+
+class TestDispatcher(UnitTestCase):
+    def test_results_follow_payload_order(self):
+        payloads = [{"to": str(n)} for n in range(50)] + [{"to": "bad"}, {"to": "down"}]
+        with patch("requests.Session", side_effect=make_session) as session_class:
+            with Dispatcher("https://graph/messages", {}, workers=4) as dispatcher:
+                results = dispatcher.post_messages(payloads)
+
+        self.assertEqual(results[:50], [(f"wamid.{n}", None, None) for n in range(50)])
+        self.assertEqual(results[50], (None, "(#131026) Message undeliverable", 131026))
+        self.assertEqual(results[51], (None, "connection reset", None))
+
+        # one session per worker thread, all closed on exit
+        self.assertLessEqual(session_class.call_count, 4)
+        for session in dispatcher._sessions:
+            session.close.assert_called_once()
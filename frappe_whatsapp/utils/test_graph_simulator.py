@@ -0,0 +1,46 @@
+# Copyright (c) 2026, Shridhar Patil and Contributors
+# See license.txt
+
+from concurrent.futures import ThreadPoolExecutor
+
+from frappe.tests import UnitTestCase
+from werkzeug.test import Client
+
+from frappe_whatsapp.utils.graph_simulator import GraphAPISimulator
+
+TEMPLATES_URL = "/v17.0/waba/message_templates"
+
+
+class TestGraphAPISimulator(UnitTestCase):
+    def test_concurrent_requests_are_all_counted(self):
+        simulator = GraphAPISimulator()
+        client = Client(simulator)
+
+        def send(i):
+            return client.post("/v17.0/phone/messages", json={"to": f"91987654{i:04d}"}).status_code
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            self.assertEqual(set(pool.map(send, range(400))), {200})
+
+        stats = client.get("/_stats").get_json()
+        self.assertEqual(stats["messages"], 400)
+        self.assertEqual(stats["requests_messages"], 400)
+
+    def test_delete_removes_template_in_place(self):
+        simulator = GraphAPISimulator(templates=3)
+        templates = simulator._templates
+        client = Client(simulator)
+
+        client.delete(TEMPLATES_URL, query_string={"name": "simulated_template_1"})
+
+        self.assertIs(simulator._templates, templates)
+        names = [t["name"] for t in client.get(TEMPLATES_URL).get_json()["data"]]
+        self.assertEqual(names, ["simulated_template_0", "simulated_template_2"])
+
+    def test_templates_are_paginated(self):
+        client = Client(GraphAPISimulator(templates=3))
+
+        page = client.get(TEMPLATES_URL, query_string={"limit": 2}).get_json()
+
+        self.assertEqual(len(page["data"]), 2)
+        self.assertIn("after=2", page["paging"]["next"])
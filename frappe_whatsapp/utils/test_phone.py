@@ -0,0 +1,45 @@
+# Copyright (c) 2026, Shridhar Patil and Contributors
+# See license.txt
+
+from frappe.tests import UnitTestCase
+
+from frappe_whatsapp.utils.phone import normalize_number, normalize_numbers
+
+
+class TestPhone(UnitTestCase):
+    def test_normalize_international_numbers(self):
+        self.assertEqual(
+            normalize_numbers(["+91 98765-43210", "0091 98765 43210", "(+1) 415.555.0100"], "91"),
+            ["919876543210", "919876543210", "14155550100"],
+        )
+
+    def test_numbers_without_plus_keep_their_country_code(self):
+        # stored international numbers, not national ones
+        self.assertEqual(normalize_number("6591234567", "91"), "6591234567")
+        self.assertEqual(normalize_number("14155550100", "91"), "14155550100")
+        self.assertEqual(normalize_number("919876543210", "91"), "919876543210")
+
+    def test_national_numbers_get_default_country_code(self):
+        self.assertEqual(normalize_number("98765 43210", "91"), "919876543210")
+        self.assertEqual(normalize_number("415-555-0100", "1"), "14155550100")
+        # neither a valid Indian number nor a valid international one
+        self.assertIsNone(normalize_number("1098765432", "91"))
+
+    def test_national_numbers_without_default_country_code(self):
+        self.assertEqual(normalize_number("9876543210", ""), "9876543210")
+
+    def test_trunk_prefix_gets_default_country_code(self):
+        self.assertEqual(normalize_number("09876 543210", "91"), "919876543210")
+        self.assertIsNone(normalize_number("09876 543210", ""))
+
+    def test_invalid_numbers(self):
+        self.assertEqual(
+            normalize_numbers([None, "", "12345", "+0123456789", "1" * 16, "not a number"], "91"),
+            [None] * 6,
+        )
+
+    def test_float_cells(self):
+        self.assertEqual(
+            normalize_numbers([919876543210.0, float("nan"), float("inf")], "91"),
+            ["919876543210", None, None],
+        )
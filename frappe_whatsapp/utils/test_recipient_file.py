@@ -0,0 +1,95 @@
+# Copyright (c) 2026, Shridhar Patil and Contributors
+# See license.txt
+
+import os
+import tempfile
+from contextlib import ExitStack
+from unittest.mock import patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from frappe_whatsapp.utils import recipient_file
+from frappe_whatsapp.utils.recipient_file import get_data_columns, import_file_job, iter_csv_batches
+
+CSV = "mobile_number,name,city\n+91 98765 43210,Asha,Pune\n919876543210,Asha,Pune\n12345,Bad,Goa\n+1 415 555 0100,Sam,SF\n"
+
+
+class TestRecipientFile(UnitTestCase):
+    def setUp(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as file:
+            file.write(CSV)
+        self.path = file.name
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def test_data_columns(self):
+        self.assertEqual(get_data_columns(" first_name, city ,,"), ["first_name", "city"])
+        self.assertEqual(get_data_columns(["city", " "]), ["city"])
+        self.assertEqual(get_data_columns(None), [])
+
+    def test_csv_batches(self):
+        progress = []
+        batches = list(iter_csv_batches(self.path, ["mobile_number"], batch_size=3, progress=lambda *p: progress.append(p)))
+
+        self.assertEqual([len(batch) for batch in batches], [3, 1])
+        self.assertEqual(batches[0][0]["city"], "Pune")
+        self.assertEqual(progress[-1], (os.path.getsize(self.path), os.path.getsize(self.path)))
+
+    def test_missing_columns(self):
+        with self.assertRaises(frappe.ValidationError):
+            list(iter_csv_batches(self.path, ["phone"]))
+
+    def import_file(self, **patches):
+        with ExitStack() as stack:
+            mocks = frappe._dict({
+                name: stack.enter_context(patch.object(target, name, **kwargs))
+                for target, name, kwargs in (
+                    (recipient_file, "get_file_path", {"return_value": self.path}),
+                    (recipient_file, "get_default_country_code", {"return_value": "91"}),
+                    (recipient_file, "start_import", {"return_value": "import-a"}),
+                    (recipient_file, "finish_import", {}),
+                    (recipient_file, "fail_import", {}),
+                    (frappe.db, "bulk_insert", {}),
+                    (frappe.db, "commit", {}),
+                    (frappe.db, "rollback", {}),
+                    (frappe.db, "delete", {}),
+                    (frappe, "publish_progress", {}),
+                    (frappe, "publish_realtime", {}),
+                )
+            })
+            for name, value in patches.items():
+                stack.enter_context(patch.object(recipient_file, name, value))
+
+            try:
+                mocks.imported = import_file_job("List", "/files/list.csv", "mobile_number", "name", "city")
+            except RuntimeError:
+                mocks.imported = None
+
+        return mocks
+
+    def test_import_stages_deduplicated_rows(self):
+        result = self.import_file()
+
+        self.assertEqual(result.imported, 2)
+        rows = [row for call in result.bulk_insert.call_args_list for row in call.args[2]]
+        # parent, idx and mobile_number of each staged row
+        self.assertEqual([(row[6], row[9], row[10]) for row in rows], [
+            ("import-a", 1, "919876543210"),
+            ("import-a", 2, "14155550100"),
+        ])
+        result.finish_import.assert_called_once()
+        self.assertEqual(result.finish_import.call_args.args[:2], ("List", "import-a"))
+        result.delete.assert_not_called()
+
+    def test_failed_import_keeps_the_list(self):
+        def fail(*args, **kwargs):
+            raise RuntimeError("bad file")
+
+        result = self.import_file(iter_file_batches=fail)
+
+        result.rollback.assert_called_once()
+        result.fail_import.assert_called_once_with("List", "import-a")
+        result.finish_import.assert_not_called()
+        result.delete.assert_not_called()
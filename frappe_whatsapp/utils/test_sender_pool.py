@@ -0,0 +1,109 @@
+# Copyright (c) 2026, Shridhar Patil and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from frappe_whatsapp.utils import sender_pool
+from frappe_whatsapp.utils.sender_pool import SenderPool, get_campaign_sender, get_sender_pool, wait_for_budget
+
+
+def make_senders(count):
+    return [
+        frappe._dict(phone_id=f"10000{n}", phone_number=f"+1555000000{n}", messages_per_second=0)
+        for n in range(count)
+    ]
+
+
+NUMBERS = [str(919800000000 + n) for n in range(3000)]
+
+
+class TestSenderPool(UnitTestCase):
+    def test_sender_pool_is_deterministic(self):
+        senders = make_senders(3)
+        pool = SenderPool(senders)
+        for number in NUMBERS[:100]:
+            sender = pool.get_sender(number)
+            self.assertIs(pool.get_sender("+" + number), sender)
+            # a pool rebuilt from the same senders maps recipients the same way
+            self.assertEqual(SenderPool(make_senders(3)).get_sender(number).phone_id, sender.phone_id)
+
+    def test_sender_pool_spreads_recipients(self):
+        pool = SenderPool(make_senders(3))
+        counts = {}
+        for number in NUMBERS:
+            phone_id = pool.get_sender(number).phone_id
+            counts[phone_id] = counts.get(phone_id, 0) + 1
+
+        self.assertEqual(len(counts), 3)
+        for count in counts.values():
+            self.assertGreater(count, len(NUMBERS) / 3 * 0.7)
+
+    def test_adding_a_sender_only_moves_recipients_to_it(self):
+        before = SenderPool(make_senders(3))
+        after = SenderPool(make_senders(4))
+        new_sender = make_senders(4)[-1].phone_id
+
+        moved = 0
+        for number in NUMBERS:
+            old, new = before.get_sender(number).phone_id, after.get_sender(number).phone_id
+            if old != new:
+                self.assertEqual(new, new_sender)
+                moved += 1
+        self.assertLess(moved, len(NUMBERS) / 2)
+
+    def test_empty_sender_pool(self):
+        pool = SenderPool([])
+        self.assertFalse(pool)
+        self.assertIsNone(pool.get_sender("919876543210"))
+
+    def test_get_campaign_sender(self):
+        senders = make_senders(3)
+        pool = SenderPool(senders)
+        number = NUMBERS[0]
+
+        self.assertIs(
+            get_campaign_sender(frappe._dict(use_sender_pool=1), pool, number), pool.get_sender(number)
+        )
+        self.assertIs(get_campaign_sender(frappe._dict(from_number="15550000001"), pool, number), senders[1])
+        self.assertIs(get_campaign_sender(frappe._dict(from_number="100002"), pool, number), senders[2])
+        self.assertIsNone(get_campaign_sender(frappe._dict(), pool, number))
+
+    def test_pool_is_rebuilt_only_when_senders_change(self):
+        rows = [frappe._dict(phone_id="100001", phone_number="+15550000001", messages_per_second=10, enabled=1)]
+        settings = MagicMock()
+        settings.get.side_effect = lambda field: rows
+        with (
+            patch.object(frappe, "get_cached_doc", return_value=settings),
+            patch.dict(sender_pool._pools, clear=True),
+        ):
+            pool = get_sender_pool()
+            self.assertIs(get_sender_pool(), pool)
+
+            rows.append(frappe._dict(phone_id="100002", phone_number="+15550000002", enabled=1))
+            rows.append(frappe._dict(phone_id="100003", phone_number="+15550000003", enabled=0))
+            rebuilt = get_sender_pool()
+
+        self.assertIsNot(rebuilt, pool)
+        self.assertEqual([sender.phone_id for sender in rebuilt.senders], ["100001", "100002"])
+
+    def test_wait_for_budget_waits_for_the_next_second(self):
+        cache = MagicMock()
+        cache.pipeline.return_value.execute.side_effect = [[3, True], [1, True]]
+        sender = frappe._dict(phone_id="100001", messages_per_second=2)
+        with (
+            patch.object(frappe, "cache", return_value=cache),
+            patch("time.time", return_value=1000.25),
+            patch("time.sleep") as sleep,
+        ):
+            wait_for_budget(sender)
+
+        sleep.assert_called_once_with(0.75)
+        self.assertEqual(cache.pipeline.return_value.execute.call_count, 2)
+
+    def test_unlimited_sender_skips_the_budget(self):
+        with patch.object(frappe, "cache") as cache:
+            wait_for_budget(frappe._dict(phone_id="100001", messages_per_second=0))
+        cache.assert_not_called()
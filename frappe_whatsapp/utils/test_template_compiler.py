@@ -0,0 +1,88 @@
+# Copyright (c) 2026, Shridhar Patil and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from frappe_whatsapp.utils import template_compiler
+from frappe_whatsapp.utils.template_compiler import CompiledTemplate, clear_compiled_templates, get_compiled_template
+
+
+def make_template(name="order_update", modified="2026-01-01 00:00:00", buttons=()):
+    return frappe._dict(
+        name=name,
+        modified=modified,
+        template_name=name,
+        actual_name=f"{name}_v2",
+        language_code="en_US",
+        header_type="IMAGE",
+        sample="https://example.com/sample.png",
+        sample_values="Jane, 42",
+        field_names="customer_name, order_id",
+        buttons=[frappe._dict(button_type=button_type) for button_type in buttons],
+    )
+
+
+class TestTemplateCompiler(UnitTestCase):
+    def tearDown(self):
+        clear_compiled_templates()
+
+    def test_compiled_template_payload(self):
+        template = CompiledTemplate(make_template())
+        self.assertEqual(template.body_fields, ("customer_name", "order_id"))
+
+        data = template.new_payload("919876543210")
+        self.assertEqual(data["to"], "919876543210")
+        self.assertEqual(data["template"]["name"], "order_update_v2")
+        self.assertEqual(data["template"]["language"], {"code": "en_US"})
+        self.assertEqual(
+            template.sample_header_component()["parameters"][0]["image"]["link"],
+            "https://example.com/sample.png",
+        )
+
+    def test_button_components_follow_template_layout(self):
+        template = CompiledTemplate(make_template(buttons=("QUICK_REPLY", "URL", "FLOW", "OTHER")))
+        self.assertEqual(template.button_sub_types, ("quick_reply", "url", "flow", None))
+
+        self.assertEqual(
+            template.button_component(0, "yes"),
+            {"type": "button", "sub_type": "quick_reply", "index": "0",
+                "parameters": [{"type": "payload", "payload": "yes"}]},
+        )
+        self.assertEqual(template.button_component(1, "orders/42")["parameters"], [{"type": "text", "text": "orders/42"}])
+        self.assertEqual(
+            template.button_component(2, "token")["parameters"],
+            [{"type": "action", "action": {"flow_token": "token"}}],
+        )
+        self.assertIsNone(template.button_component(3, "x"))
+        self.assertIsNone(template.button_component(4, "x"))
+
+    def test_compiled_templates_are_bounded(self):
+        docs = {name: make_template(name) for name in ("a", "b", "c")}
+        with (
+            patch.object(template_compiler, "MAX_COMPILED_TEMPLATES", 2),
+            patch.object(frappe.db, "get_value", side_effect=lambda doctype, name, field: docs[name].modified),
+            patch.object(frappe, "get_doc", side_effect=lambda doctype, name: docs[name]) as get_doc,
+        ):
+            first = get_compiled_template("a")
+            get_compiled_template("b")
+            self.assertIs(get_compiled_template("a"), first)
+            get_compiled_template("c")
+            self.assertEqual(get_doc.call_count, 3)
+
+            # "b" was least recently used and is compiled again
+            get_compiled_template("b")
+            self.assertEqual(get_doc.call_count, 4)
+            self.assertEqual(len(template_compiler._compiled_templates), 2)
+
+    def test_modified_template_is_recompiled(self):
+        doc = make_template("a")
+        with (
+            patch.object(frappe.db, "get_value", side_effect=lambda doctype, name, field: doc.modified),
+            patch.object(frappe, "get_doc", return_value=doc),
+        ):
+            first = get_compiled_template("a")
+            doc.modified = "2026-01-02 00:00:00"
+            self.assertIsNot(get_compiled_template("a"), first)
@@ -0,0 +1,63 @@
+# Copyright (c) 2026, Shridhar Patil and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from frappe_whatsapp.utils import webhook_benchmark
+from frappe_whatsapp.utils.webhook_benchmark import build_synthetic_payloads, percentile, summarize
+
+
+class TestWebhookBenchmark(UnitTestCase):
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 11))
+        self.assertEqual(percentile(values, 50), 5)
+        self.assertEqual(percentile(values, 90), 9)
+        self.assertEqual(percentile(values, 95), 10)
+        self.assertEqual(percentile(values, 100), 10)
+        self.assertEqual(percentile(values, 0), 1)
+
+    def test_percentile_small_samples(self):
+        self.assertEqual(percentile([], 50), 0.0)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertEqual(percentile([1, 2], 50), 1)
+        self.assertEqual(percentile([1, 2], 51), 2)
+
+    def test_summarize_webhook_benchmark(self):
+        results = [
+            {"kind": "text", "latency": 0.01, "queries": 4, "error": None},
+            {"kind": "text", "latency": 0.03, "queries": 6, "error": None},
+            {"kind": "read", "latency": 0.02, "queries": 2, "error": "ValueError: bad"},
+        ]
+        report = summarize(results, 2.0)
+
+        self.assertEqual(report["payloads"], 3)
+        self.assertEqual(report["throughput_per_s"], 1.5)
+        self.assertAlmostEqual(report["p50_ms"], 20.0)
+        self.assertAlmostEqual(report["max_ms"], 30.0)
+        self.assertEqual(report["queries_per_payload"], 4.0)
+        self.assertEqual(report["errors"], 1)
+        self.assertEqual(report["first_errors"], ["ValueError: bad"])
+        self.assertEqual(report["kinds"]["text"]["count"], 2)
+        self.assertEqual(report["kinds"]["text"]["queries_per_payload"], 5.0)
+        self.assertEqual(report["kinds"]["read"]["errors"], 1)
+
+    def test_synthetic_payloads_cycle_kinds_and_target_seeded_messages(self):
+        with (
+            patch.object(frappe, "generate_hash", return_value="run"),
+            patch.object(webhook_benchmark, "seed_status_targets", return_value=["out-1", "out-2"]) as seed,
+        ):
+            payloads = build_synthetic_payloads(4, kinds=["text", "read"])
+
+        seed.assert_called_once_with(2, "15550001111")
+        self.assertEqual([kind for kind, _ in payloads], ["text", "read", "text", "read"])
+
+        message = payloads[0][1]["entry"][0]["changes"][0]["value"]["messages"][0]
+        self.assertEqual(message["id"], "wamid.bench-run-0")
+        self.assertEqual(message["text"]["body"], "Benchmark message run-0")
+
+        statuses = [p["entry"][0]["changes"][0]["value"]["statuses"][0] for kind, p in payloads if kind == "read"]
+        self.assertEqual({s["id"] for s in statuses}, {"out-1", "out-2"})
+        self.assertEqual({s["status"] for s in statuses}, {"read"})
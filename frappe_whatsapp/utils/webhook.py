@@ -5,6 +5,8 @@ import requests
 import time
 from werkzeug.wrappers import Response
 import frappe.utils
+from frappe_whatsapp.utils.campaign import record_status_change
+from frappe_whatsapp.utils.suppression import handle_error_code, handle_incoming_text
 
 
 @frappe.whitelist(allow_guest=True)
@@ -69,6 +71,7 @@ def post():
 					"content_type":message_type,
 					"profile_name":sender_profile_name
 				}).insert(ignore_permissions=True)
+				handle_incoming_text(message['from'], message['text']['body'])
 			elif message_type == 'reaction':
 				frappe.get_doc({
 					"doctype": "WhatsApp Message",
@@ -155,6 +158,7 @@ def post():
 					"content_type": message_type,
 					"profile_name":sender_profile_name
 				}).insert(ignore_permissions=True)
+				handle_incoming_text(message['from'], message['button']['text'])
 			else:
 				frappe.get_doc({
 					"doctype": "WhatsApp Message",
@@ -200,7 +204,13 @@ def update_message_status(data):
 	name = frappe.db.get_value("WhatsApp Message", filters={"message_id": id})
 
 	doc = frappe.get_doc("WhatsApp Message", name)
+	if doc.bulk_message_reference:
+		record_status_change(doc.bulk_message_reference, doc.status, status)
 	doc.status = status
 	if conversation:
 		doc.conversation_id = conversation
-	doc.save(ignore_permissions=True)
\ No newline at end of file
+	doc.save(ignore_permissions=True)
+
+	if status == "failed":
+		error = (data['statuses'][0].get('errors') or [{}])[0]
+		handle_error_code(data['statuses'][0].get('recipient_id') or doc.to, error.get('code'))
\ No newline at end of file
@@ -0,0 +1,310 @@
+"""Replay and load-generation harness for the webhook entry point.
+
+Replays stored webhook payloads (WhatsApp Notification Log entries with
+template "Webhook") or synthetic payloads built for each message and status
+type against ``frappe_whatsapp.utils.webhook.webhook`` on a local site, and
+reports throughput, latency percentiles and DB queries per payload.
+"""
+import json
+import math
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+BENCH_MESSAGE_PREFIX = "wamid.bench-"
+
+# Media messages download the file from Meta, so they are only useful when
+# WhatsApp Settings points at a local Graph API stand-in.
+MESSAGE_KINDS = ("text", "reaction", "interactive", "button", "location")
+MEDIA_KINDS = ("image", "document")
+STATUS_KINDS = ("sent", "delivered", "read")
+
+
+def load_stored_payloads(limit=None):
+    """Get webhook payloads recorded in WhatsApp Notification Log."""
+    logs = frappe.get_all(
+        "WhatsApp Notification Log",
+        filters={"template": "Webhook"},
+        fields=["meta_data"],
+        order_by="creation asc",
+        limit=limit,
+    )
+    payloads = []
+    for log in logs:
+        data = log.meta_data
+        if isinstance(data, str):
+            try:
+                data = json.loads(data)
+            except ValueError:
+                continue
+        if data and data.get("entry"):
+            payloads.append(("stored", data))
+    return payloads
+
+
+def _envelope(value, field="messages"):
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "bench-waba",
+            "changes": [{"field": field, "value": value}],
+        }],
+    }
+
+
+def _message_payload(kind, seq, sender):
+    message_id = f"{BENCH_MESSAGE_PREFIX}{seq}"
+    message = {
+        "from": sender,
+        "id": message_id,
+        "timestamp": str(int(time.time())),
+        "type": kind,
+    }
+    if kind == "text":
+        message["text"] = {"body": f"Benchmark message {seq}"}
+    elif kind == "reaction":
+        message["reaction"] = {"message_id": f"{BENCH_MESSAGE_PREFIX}{max(seq - 1, 0)}", "emoji": "\U0001F44D"}
+    elif kind == "interactive":
+        message["interactive"] = {
+            "type": "nfm_reply",
+            "nfm_reply": {"response_json": json.dumps({"seq": seq}), "body": "Sent"},
+        }
+    elif kind == "button":
+        message["button"] = {"text": "Yes", "payload": f"bench_{seq}"}
+    elif kind == "location":
+        message["location"] = {"latitude": 12.97, "longitude": 77.59}
+    elif kind in MEDIA_KINDS:
+        message[kind] = {"id": f"bench-media-{seq}", "mime_type": "image/jpeg"}
+
+    return _envelope({
+        "messaging_product": "whatsapp",
+        "metadata": {"display_phone_number": "15550000000", "phone_number_id": "bench-phone"},
+        "contacts": [{"profile": {"name": "Benchmark"}, "wa_id": sender}],
+        "messages": [message],
+    })
+
+
+def _status_payload(status, message_id, recipient):
+    return _envelope({
+        "messaging_product": "whatsapp",
+        "metadata": {"display_phone_number": "15550000000", "phone_number_id": "bench-phone"},
+        "statuses": [{
+            "id": message_id,
+            "status": status,
+            "timestamp": str(int(time.time())),
+            "recipient_id": recipient,
+            "conversation": {"id": f"bench-conversation-{message_id}"},
+        }],
+    })
+
+
+def seed_status_targets(count, recipient="15550001111"):
+    """Insert outgoing messages that synthetic status payloads can update."""
+    message_ids = []
+    for seq in range(count):
+        message_id = f"{BENCH_MESSAGE_PREFIX}out-{frappe.generate_hash(length=8)}-{seq}"
+        frappe.get_doc({
+            "doctype": "WhatsApp Message",
+            "type": "Outgoing",
+            "to": recipient,
+            "message_type": "Template",
+            "content_type": "text",
+            "message": "Benchmark seed",
+            "message_id": message_id,
+            "status": "Success",
+        }).insert(ignore_permissions=True)
+        message_ids.append(message_id)
+    frappe.db.commit()
+    return message_ids
+
+
+def build_synthetic_payloads(count, kinds=None, sender="15550001111"):
+    """Build ``count`` payloads cycling through ``kinds``."""
+    kinds = list(kinds or MESSAGE_KINDS + STATUS_KINDS)
+    status_kinds = [k for k in kinds if k in STATUS_KINDS]
+    status_total = sum(1 for i in range(count) if kinds[i % len(kinds)] in status_kinds)
+    targets = seed_status_targets(status_total, sender) if status_total else []
+
+    run_id = frappe.generate_hash(length=6)
+    payloads = []
+    for i in range(count):
+        kind = kinds[i % len(kinds)]
+        if kind in STATUS_KINDS:
+            payloads.append((kind, _status_payload(kind, targets.pop(), sender)))
+        else:
+            payloads.append((kind, _message_payload(kind, f"{run_id}-{i}", sender)))
+    return payloads
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(values)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def _count_queries(db):
+    """Wrap ``db.sql`` so every statement run by this connection is counted."""
+    counter = {"queries": 0}
+    original_sql = db.sql
+
+    def sql(*args, **kwargs):
+        counter["queries"] += 1
+        return original_sql(*args, **kwargs)
+
+    db.sql = sql
+    return counter
+
+
+def _ingest(payload):
+    """Run one payload through the webhook entry point like an HTTP POST."""
+    from frappe_whatsapp.utils.webhook import webhook
+
+    environ = EnvironBuilder(method="POST", json=payload).get_environ()
+    frappe.local.request = Request(environ)
+    frappe.local.form_dict = frappe._dict(json.loads(json.dumps(payload)))
+    webhook()
+
+
+def run_benchmark(site, payloads, rate=None, concurrency=1, rollback=False):
+    """Replay ``payloads`` and return the collected statistics.
+
+    :param rate: target payloads per second across all workers, unpaced when empty.
+    :param concurrency: number of worker threads, each with its own DB connection.
+    :param rollback: roll back each payload instead of committing it.
+    """
+    sites_path = frappe.local.sites_path
+    tasks = queue.SimpleQueue()
+    for index, (kind, payload) in enumerate(payloads):
+        tasks.put((index, kind, payload))
+    lock = threading.Lock()
+    results = []
+    started = time.perf_counter()
+
+    def work():
+        """Drain the task queue over one site connection, closed when done."""
+        frappe.init(site=site, sites_path=sites_path)
+        try:
+            frappe.connect()
+            frappe.set_user("Guest")
+            counter = _count_queries(frappe.local.db)
+            while True:
+                try:
+                    index, kind, payload = tasks.get_nowait()
+                except queue.Empty:
+                    return
+                process(counter, index, kind, payload)
+        finally:
+            frappe.destroy()
+
+    def process(counter, index, kind, payload):
+        if rate:
+            delay = started + index / float(rate) - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        counter["queries"] = 0
+        error = None
+        begin = time.perf_counter()
+        try:
+            _ingest(payload)
+            if rollback:
+                frappe.db.rollback()
+            else:
+                frappe.db.commit()
+        except Exception as e:
+            frappe.db.rollback()
+            error = f"{type(e).__name__}: {e}"
+        elapsed = time.perf_counter() - begin
+
+        with lock:
+            results.append({
+                "kind": kind,
+                "latency": elapsed,
+                "queries": counter["queries"],
+                "error": error,
+            })
+
+    workers = max(int(concurrency), 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(work) for _ in range(workers)]
+        for future in futures:
+            future.result()
+
+    return summarize(results, time.perf_counter() - started)
+
+
+def summarize(results, duration):
+    """Aggregate per-payload results into a report dict."""
+    latencies = sorted(r["latency"] for r in results)
+    by_kind = {}
+    for r in results:
+        stats = by_kind.setdefault(r["kind"], {"count": 0, "latency": [], "queries": 0, "errors": 0})
+        stats["count"] += 1
+        stats["latency"].append(r["latency"])
+        stats["queries"] += r["queries"]
+        stats["errors"] += 1 if r["error"] else 0
+
+    kinds = {}
+    for kind, stats in by_kind.items():
+        stats["latency"].sort()
+        kinds[kind] = {
+            "count": stats["count"],
+            "p50_ms": percentile(stats["latency"], 50) * 1000,
+            "p95_ms": percentile(stats["latency"], 95) * 1000,
+            "queries_per_payload": stats["queries"] / stats["count"],
+            "errors": stats["errors"],
+        }
+
+    total = len(results)
+    return {
+        "payloads": total,
+        "duration_s": duration,
+        "throughput_per_s": total / duration if duration else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": (latencies[-1] * 1000) if latencies else 0.0,
+        "queries_per_payload": (sum(r["queries"] for r in results) / total) if total else 0.0,
+        "errors": sum(1 for r in results if r["error"]),
+        "first_errors": [r["error"] for r in results if r["error"]][:5],
+        "kinds": kinds,
+    }
+
+
+def cleanup():
+    """Delete rows created by synthetic benchmark payloads."""
+    frappe.db.delete("WhatsApp Message", {"message_id": ["like", f"{BENCH_MESSAGE_PREFIX}%"]})
+    frappe.db.delete("WhatsApp Notification Log", {
+        "template": "Webhook",
+        "meta_data": ["like", f"%{BENCH_MESSAGE_PREFIX}%"],
+    })
+    frappe.db.commit()
+
+
+def format_report(report):
+    """Render a report dict as plain text."""
+    lines = [
+        f"Payloads:     {report['payloads']} in {report['duration_s']:.2f}s",
+        f"Throughput:   {report['throughput_per_s']:.1f} payloads/s",
+        "Latency (ms): p50 {p50_ms:.1f}  p90 {p90_ms:.1f}  p95 {p95_ms:.1f}  p99 {p99_ms:.1f}  max {max_ms:.1f}".format(**report),
+        f"DB queries:   {report['queries_per_payload']:.1f} per payload",
+        f"Errors:       {report['errors']}",
+        "",
+        f"{'kind':<12}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'queries':>10}{'errors':>8}",
+    ]
+    for kind, stats in sorted(report["kinds"].items()):
+        lines.append(
+            f"{kind:<12}{stats['count']:>8}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+            f"{stats['queries_per_payload']:>10.1f}{stats['errors']:>8}"
+        )
+    for error in report["first_errors"]:
+        lines.append(f"! {error}")
+    return "\n".join(lines)